@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_lib_helpers.py:
+Times the array helpers of ``desert_mirage_lib`` from 1e3 to 1e7 elements
+against the Python loops they replaced, and checks both give the same
+result: bit for bit, except for the blocked scan of ``example_col_math``,
+which must be within the rounding documented in ``linear_recurrence``
+(``RECURRENCE_ATOL``) and bit for bit with ``exact=True``. Loops are only
+timed up to ``--loop-rows`` elements. The index
+map looks up sqrt(n) values in a sorted column of sqrt(n), so its O(n*m)
+loop stays O(n).
+
+Example: python bench_lib_helpers.py --rows 1e3 1e4 1e5 1e6 1e7
+"""
+import os
+import sys
+import timeit
+import heapq
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_lib import (data_to_row_bins, eliminate_invalids,
+                               example_col_math, nth_largest,
+                               map_series1_index_to_kth_largest_in_series)
+
+BIN_POINTS = 20
+# Largest difference from the loop accepted for the blocked scan, for values
+# of order 1 and multipliers within [.5, 1).
+RECURRENCE_ATOL = 1e-13
+
+def loop_col_math(c1, c2, c3):
+    darray = [c1[0]]
+    for i in range(1, len(c2)):
+        darray.append(darray[i-1]*c2[i]+c3[i])
+    return np.array(darray)
+
+def loop_index_map(a, b):
+    return np.array([max([k for k in range(len(b)) if b[k] <= x] or [-1])
+                     for x in a])
+
+def loop_invalids(df, cols):
+    numdf = df.drop(cols, axis=1).join(df[cols].apply(pd.to_numeric,
+                                                      errors='coerce'))
+    return numdf[~numdf[cols].isnull().apply(np.any, axis=1)]
+
+def loop_nth_largest(n, values):
+    return heapq.nlargest(min(n, len(values)), values)[-1]
+
+def loop_row_bins(ar, npts):
+    X = np.lib.stride_tricks.as_strided(
+            ar, shape=(len(ar)-npts+1, npts), strides=ar.strides*2)
+    return X[:-npts], np.array([X[i+npts][-1] for i in range(len(X)-npts)])
+
+def cases(n, rng):
+    """(name, array call, loop call, tolerance or None for bit for bit) of
+    each helper on ``n`` elements."""
+    frame = pd.DataFrame({'A': rng.normal(size=n),
+                          'B': rng.uniform(.5, 1., n),
+                          'C': rng.normal(size=n)})
+    invalid = frame.astype(object)
+    invalid.iloc[::7, 1] = 'x'
+    series = rng.normal(size=n)
+    m = int(np.sqrt(n))
+    index_frame = pd.DataFrame({'a': rng.uniform(-.1, 1.1, m),
+                                'b': np.sort(rng.uniform(0., 1., m))})
+    values = list(series)
+    return [
+        ('example_col_math',
+         lambda: example_col_math(frame.copy(), 'A', 'B', 'C', 'D')['D'].values,
+         lambda: loop_col_math(frame.A.values, frame.B.values, frame.C.values),
+         RECURRENCE_ATOL),
+        ('col_math exact', lambda: example_col_math(
+                frame.copy(), 'A', 'B', 'C', 'D', exact=True)['D'].values,
+         lambda: loop_col_math(frame.A.values, frame.B.values, frame.C.values),
+         None),
+        ('map_series1_index', lambda: map_series1_index_to_kth_largest_in_series(
+                index_frame.copy(), 'a', 'b', 'k')['k'].values,
+         lambda: loop_index_map(index_frame.a.values, index_frame.b.values),
+         None),
+        ('eliminate_invalids',
+         lambda: eliminate_invalids(invalid, ['B', 'C']).index.values,
+         lambda: loop_invalids(invalid, ['B', 'C']).index.values, None),
+        ('nth_largest', lambda: nth_largest(n//2, values),
+         lambda: loop_nth_largest(n//2, values), None),
+        ('data_to_row_bins', lambda: data_to_row_bins(series, BIN_POINTS)[1],
+         lambda: loop_row_bins(series, BIN_POINTS)[1], None),
+    ]
+
+def run(row_counts=(10**3, 10**4, 10**5, 10**6, 10**7), loop_rows=10**5,
+        repeat=3, rseed=129):
+    rng = np.random.RandomState(rseed)
+    print('{:>20} {:>10} {:>12} {:>12} {:>9}'.format(
+            'helper', 'elements', 'loop (s)', 'array (s)', 'speedup'))
+    for n in row_counts:
+        for name, new, old, atol in cases(n, rng):
+            t_new = min(timeit.repeat(new, number=1, repeat=repeat))
+            t_old = float('nan')
+            if n <= loop_rows:
+                if atol is None:
+                    assert np.array_equal(new(), old()), name
+                else:
+                    assert np.allclose(new(), old(), rtol=0., atol=atol), name
+                t_old = min(timeit.repeat(old, number=1, repeat=1))
+            print('{:>20} {:>10} {:>12.4f} {:>12.4f} {:>8.1f}x'.format(
+                    name, n, t_old, t_new, t_old/t_new))
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the array helpers of '
+                                                 'desert_mirage_lib.')
+    parser.add_argument('--rows', type=float, nargs='+',
+                        default=[1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument('--loop-rows', type=float, default=1e5,
+                        help='Largest size the Python loops are timed at.')
+    parser.add_argument('--repeat', type=int, default=3)
+    _args = parser.parse_args()
+    run([int(n) for n in _args.rows], int(_args.loop_rows), _args.repeat)
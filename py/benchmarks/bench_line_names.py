@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_line_names.py:
+Times line name parsing on a 'Line' column, a million rows by default.
+Compares the former per-row parsing with ``parse_line_names`` over the
+unique names of a ``LineIndex`` and checks both give the same 'AM_PM' and
+'Date'.
+
+Example: python bench_line_names.py --rows 1e7 --lines 2400
+"""
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_main import (LineIndex, line_name_patterns,
+                                parse_date_from_string, parse_line_names)
+
+def synthetic_lines(nrows, nlines=240, rseed=129):
+    """'Line' column of ``nlines`` contiguous single-coil and towed-array
+    lines named after the sample data, e.g. 'Livs0125s2a', 'Livs0125a_01'."""
+    rng = np.random.RandomState(rseed)
+    names = []
+    for i in range(nlines):
+        mmdd = '{:02d}{:02d}'.format(rng.randint(1, 13), rng.randint(1, 29))
+        am_pm = 'ap'[i % 2]
+        if i % 3:
+            names.append('Livs{}s{}{}'.format(mmdd, i % 7, am_pm))
+        else:
+            names.append('Livs{}{}_{:02d}'.format(mmdd, am_pm, i % 3+1))
+    return pd.Series(np.repeat(names, -(-nrows//nlines))[:nrows], name='Line')
+
+def legacy_parse(lines):
+    """The per-row parsing: 'AM_PM' and 'Date' strings of every row."""
+    towed = lines.str.contains(r'_\d{2}$')
+    am_pm = lines.str[-1:].where(~towed, lines.str[-4:-3])
+    return (am_pm+'m').str.upper(), parse_date_from_string(lines, min_len=4)
+
+def indexed_parse(lines, patterns):
+    """'AM_PM' and 'Date' of every row from the unique line names."""
+    index = LineIndex(lines.values)
+    meta = parse_line_names(index.names, patterns)
+    return (meta['AM_PM'].values.astype(object)[index.codes],
+            meta['Date'].values[index.codes])
+
+def run(nrows=10**6, nlines=240, repeat=3):
+    lines = synthetic_lines(nrows, nlines)
+    patterns = line_name_patterns('ivs')
+    old_am_pm, old_date = legacy_parse(lines)
+    new_am_pm, new_date = indexed_parse(lines, patterns)
+    assert list(old_am_pm) == list(new_am_pm)
+    assert old_date == list(new_date)
+    t_old = min(timeit.repeat(lambda: legacy_parse(lines), number=1,
+                              repeat=repeat))
+    t_new = min(timeit.repeat(lambda: indexed_parse(lines, patterns),
+                              number=1, repeat=repeat))
+    print('{:>10} {:>12} {:>12}'.format('rows', 'per-row (s)', 'unique (s)'))
+    print('{:>10} {:>12.4f} {:>12.4f}'.format(nrows, t_old, t_new))
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time line name parsing.')
+    parser.add_argument('--rows', type=float, default=1e6)
+    parser.add_argument('--lines', type=int, default=240,
+                        help='Number of distinct line names.')
+    parser.add_argument('--repeat', type=int, default=3)
+    _args = parser.parse_args()
+    run(int(_args.rows), _args.lines, _args.repeat)
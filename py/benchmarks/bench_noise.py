@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_noise.py:
+Times the windowed noise of all four channels of one long synthetic IVS
+line against the peak extraction of the same line, e.g. a million samples.
+The peak extraction is timed without its own noise step.
+
+Example: python bench_noise.py --rows 1e6
+"""
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import desert_mirage_main as dm
+from desert_mirage_lib import JsonDict, json_config
+from synthetic_survey import session_lines, write_survey_folder
+
+CHANNELS = ['Ch1', 'Ch2', 'Ch3', 'Ch4']
+
+def long_line(nrows, speed=1., run_in=5.):
+    """A single-coil line of about ``nrows`` samples over the seeds."""
+    seed_df = dm._csvSeedDF
+    length = 2*(seed_df.TrueX.max()-seed_df.TrueX.min()+2*run_in)
+    track = session_lines(seed_df, 's2', '0125', 'a',
+                          sample_rate=nrows*speed/length, speed=speed,
+                          run_in=run_in)
+    return track.drop(columns='Line')
+
+def run(nrows=10**6, repeat=3):
+    with tempfile.TemporaryDirectory() as folder:
+        config_path = write_survey_folder(folder, 1000, sensors=('s2',))
+        json_dict = json_config(jfile=config_path, jobj_hook=JsonDict)
+        dm.configure_run(json_dict,
+                         dm.import_seed_data_csv(json_dict.GUI.SeedFile))
+    track = long_line(nrows)
+    t_noise = min(timeit.repeat(lambda: dm.line_noise(track, CHANNELS),
+                                number=1, repeat=repeat))
+    line_noise = dm.line_noise
+    try:
+        # Peaks alone, their 'IVS_Noise' step left out.
+        dm.line_noise = lambda track, channels, seedloc=None: np.full(
+                len(channels), np.nan)
+        t_peaks = min(timeit.repeat(lambda: dm.line_peak_responses(track),
+                                    number=1, repeat=repeat))
+    finally:
+        dm.line_noise = line_noise
+    noise = pd.Series(dm.line_noise(track, CHANNELS), index=CHANNELS)
+    print('{:>10} {:>14} {:>14} {:>8}'.format('rows', 'noise (s)',
+                                              'peaks (s)', 'ratio'))
+    print('{:>10} {:>14.4f} {:>14.4f} {:>8.2f}'.format(
+            len(track.index), t_noise, t_peaks, t_noise/t_peaks))
+    print('Noise per channel (mV): {}'.format(noise.round(3).to_dict()))
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the line noise '
+                                                 'estimate.')
+    parser.add_argument('--rows', type=float, default=1e6)
+    parser.add_argument('--repeat', type=int, default=3)
+    _args = parser.parse_args()
+    run(int(_args.rows), _args.repeat)
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_pipeline.py:
+Times each stage of the IVS pipeline on synthetic surveys from
+``synthetic_survey`` at several sizes: ingest (streaming the csv into line
+tracks), line parsing, lane search, peak extraction, IVS tables and export.
+Each result is appended to a json lines file with the git commit and
+library versions, and compared with the previous result for the same size.
+
+Example: python bench_pipeline.py --rows 1e3 1e4 1e5 1e6 1e7 --data-dir /tmp/dm
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import desert_mirage_main as dm
+from desert_mirage_lib import JsonDict, json_config
+from synthetic_survey import write_survey_folder
+
+STAGES = ['ingest', 'line parsing', 'lane search', 'peak extraction',
+          'ivs tables', 'export']
+_results_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             'bench_pipeline.jsonl')
+
+def survey_config(data_dir, nrows):
+    """Config of the synthetic survey of ``nrows`` rows in ``data_dir``,
+    written on first use."""
+    folder = os.path.join(data_dir, 'survey_{}'.format(nrows))
+    config_path = os.path.join(folder, 'config.json')
+    if not os.path.isfile(config_path):
+        write_survey_folder(folder, nrows)
+    return config_path
+
+def time_stages(config_path, chunk_rows=dm.CHUNK_ROWS):
+    """Wall seconds of each of ``STAGES`` over every file of the survey."""
+    json_dict = json_config(jfile=config_path, jobj_hook=JsonDict)
+    dm.configure_run(json_dict, dm.import_seed_data_csv(json_dict.GUI.SeedFile))
+    sensors = dm.run_sensor_ids()
+    times = dict.fromkeys(STAGES, 0.)
+    nrows = 0
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        times[stage] += time.perf_counter()-start
+        return result
+
+    with tempfile.TemporaryDirectory() as access_folder, \
+            redirect_stdout(io.StringIO()):
+        dm._access_folder = access_folder
+        for ifile in dm.collect_files_in_directory(json_dict.GUI.DataFolder):
+            tracks = timed('ingest', lambda: list(dm.iter_line_tracks(
+                    ifile, chunk_rows)))
+            nrows += sum(len(track.index) for _, track in tracks)
+            dm._lineMetadata.clear()
+            metas = timed('line parsing', lambda: (
+                dm.update_line_metadata([line for line, _ in tracks]),
+                [dm.line_sensor_metadata(line, sensors) for line, _ in
+                 tracks])[1])
+            matched = [(track, meta) for (_, track), meta in
+                       zip(tracks, metas) if meta]
+            lanes = timed('lane search', lambda: [
+                dm.seeds_within_lanewidth(track, dm.LANE_WIDTH/2) for
+                track, _ in matched])
+            peaks = timed('peak extraction', lambda: [
+                dm.line_peak_responses(track) for track, _ in matched])
+            sensor_lines = {sid: [] for sid in sensors}
+            for (_, meta), lane, peak in zip(matched, lanes, peaks):
+                for sid, smeta in meta.items():
+                    sensor_lines[sid].append((smeta, lane, peak))
+            timed('ivs tables', lambda: [
+                dm.process_ivs_and_create_access_tables(sid, sensor_lines[sid])
+                for sid in sensors])
+        timed('export', dm.export_access_tables, dm._accessTables)
+    return nrows, times
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=os.path.dirname(os.path.realpath(__file__)),
+                stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def previous_results(results_path):
+    """Last stored result for each survey size."""
+    last = {}
+    if os.path.isfile(results_path):
+        with open(results_path) as f:
+            for record in map(json.loads, f):
+                last[record['survey_rows']] = record
+    return last
+
+def run(row_counts=(10**3, 10**4, 10**5, 10**6), data_dir=None, repeat=1,
+        results_path=_results_path, chunk_rows=dm.CHUNK_ROWS):
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(),
+                                        'desert_mirage_bench')
+    previous = previous_results(results_path)
+    print('{:>10} {:>16} {:>10} {:>10}'.format('rows', 'stage', 'wall (s)',
+                                               'vs last'))
+    for survey_rows in row_counts:
+        config_path = survey_config(data_dir, survey_rows)
+        runs = [time_stages(config_path, chunk_rows) for _ in range(repeat)]
+        times = {stage: min(t[stage] for _, t in runs) for stage in STAGES}
+        record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'commit': git_commit(), 'python': platform.python_version(),
+                  'numpy': np.__version__, 'pandas': pd.__version__,
+                  'survey_rows': survey_rows, 'rows': runs[0][0],
+                  'repeat': repeat, 'chunk_rows': chunk_rows, 'stages': times,
+                  'total': sum(times.values())}
+        last = previous.get(survey_rows)
+        for stage in STAGES+['total']:
+            wall = record['total'] if stage == 'total' else times[stage]
+            ratio = ''
+            if last:
+                before = last['total'] if stage == 'total' else \
+                    last['stages'].get(stage)
+                ratio = '{:.2f}x'.format(before/wall) if before and wall \
+                    else ''
+            print('{:>10} {:>16} {:>10.4f} {:>10}'.format(
+                    record['rows'], stage, wall, ratio))
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True)+'\n')
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the IVS pipeline '
+                                                 'stages on synthetic surveys.')
+    parser.add_argument('--rows', type=float, nargs='+',
+                        default=[1e3, 1e4, 1e5, 1e6])
+    parser.add_argument('--data-dir', default=None,
+                        help='Folder for the generated surveys, reused between '
+                             'runs (default: a folder in the temp directory).')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--results', default=_results_path,
+                        help='Json lines file the results are appended to.')
+    parser.add_argument('--chunk-rows', type=float, default=dm.CHUNK_ROWS,
+                        help='Rows per csv chunk of the ingest '
+                             '(default: %(default)d).')
+    _args = parser.parse_args()
+    run([int(n) for n in _args.rows], _args.data_dir, _args.repeat,
+        _args.results, int(_args.chunk_rows))
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_seed_index.py:
+Times the seed lane search against track length. Compares the original
+per-seed distance loop with ``PointGridIndex`` and checks both return the
+same seeds.
+
+Example: python bench_seed_index.py --points 1e3 1e5 1e7 --seeds 5000
+"""
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_lib import PointGridIndex
+
+_seed_csv = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__)))), 'data', 'gsv_seeds.csv')
+
+def legacy_seeds_within_lanewidth(sdf, tx, ty, thresh):
+    """The per-seed loop replaced by ``PointGridIndex.points_within``."""
+    slist = []
+    for i, (xt, yt) in enumerate(zip(sdf.TrueX.values, sdf.TrueY.values)):
+        dx = np.square(np.subtract(tx, xt))
+        dy = np.square(np.subtract(ty, yt))
+        count_data = np.count_nonzero(
+                [i for i in np.sqrt(dx+dy) if i < thresh])
+        if count_data:
+            slist.append(sdf.Test_Item_ID.values[i])
+    return slist
+
+def seed_frame(nseeds=None):
+    """The sample seeds, or ``nseeds`` seeds from copies of them side by side
+    along X."""
+    sdf = pd.read_csv(_seed_csv, header=0)
+    if not nseeds:
+        return sdf
+    span = sdf.TrueX.max()-sdf.TrueX.min()+1.
+    copies = []
+    for i in range(-(-nseeds//len(sdf.index))):
+        copy = sdf.copy()
+        copy['TrueX'] += i*span
+        copy['Test_Item_ID'] = copy.Test_Item_ID.astype(str)+'_{}'.format(i)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True).iloc[:nseeds]
+
+def synthetic_track(sdf, npts, rseed=129):
+    """Back-and-forth pass along X through the seed row at ``TrueY[0]``."""
+    rng = np.random.RandomState(rseed)
+    x0, x1 = sdf.TrueX.min()-2., sdf.TrueX.max()+2.
+    tx = np.concatenate([np.linspace(x0, x1, npts//2),
+                         np.linspace(x1, x0, npts-npts//2)])
+    ty = sdf.TrueY.values[0]+rng.normal(0., .2, npts)
+    return tx, ty
+
+def run(point_counts=(10**3, 10**4, 10**5, 10**6), nseeds=None, thresh=.45,
+        repeat=3, legacy_max=10**5):
+    sdf = seed_frame(nseeds)
+    index = PointGridIndex(sdf.TrueX.values, sdf.TrueY.values, thresh)
+    print('{} seeds'.format(len(sdf.index)))
+    print('{:>10} {:>12} {:>12}'.format('points', 'legacy (s)', 'index (s)'))
+    for npts in point_counts:
+        tx, ty = synthetic_track(sdf, npts)
+        hits = index.points_within(tx, ty, thresh)
+        new = list(sdf.Test_Item_ID.values[hits])
+        t_new = min(timeit.repeat(lambda: index.points_within(tx, ty, thresh),
+                                  number=1, repeat=repeat))
+        t_old = float('nan')
+        if npts <= legacy_max:
+            old = legacy_seeds_within_lanewidth(sdf, tx, ty, thresh)
+            assert old == new, (old, new)
+            t_old = min(timeit.repeat(
+                lambda: legacy_seeds_within_lanewidth(sdf, tx, ty, thresh),
+                number=1, repeat=repeat))
+        print('{:>10} {:>12.4f} {:>12.4f}'.format(npts, t_old, t_new))
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the seed lane search.')
+    parser.add_argument('--points', type=float, nargs='+',
+                        default=[1e3, 1e4, 1e5, 1e6])
+    parser.add_argument('--seeds', type=int, default=None,
+                        help='Number of seeds, copies of the sample seeds '
+                             '(default: the sample seeds).')
+    parser.add_argument('--thresh', type=float, default=.45)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max', type=float, default=1e5,
+                        help='Largest track also timed with the per-seed '
+                             'loop.')
+    _args = parser.parse_args()
+    run([int(n) for n in _args.points], _args.seeds, _args.thresh,
+        _args.repeat, int(_args.legacy_max))
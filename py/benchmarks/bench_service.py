@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_service.py:
+Times repeated runs of a synthetic survey as separate
+``desert_mirage_main.py`` processes and through the worker service client
+``desert_mirage_service.py``, and checks both write the same tables. The
+modules are copied to a temporary folder, with its own home folder for the
+service file, so neither the repository 'AccessTables' nor a running service
+are touched. The first service run includes starting the service.
+
+Example: python bench_service.py --rows 200000 --runs 5
+"""
+import os
+import sys
+import time
+import glob
+import shutil
+import filecmp
+import argparse
+import subprocess
+import tempfile
+
+_py_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, _py_dir)
+
+MODULES = ['desert_mirage_main.py', 'desert_mirage_lib.py',
+           'desert_mirage_base.py', 'desert_mirage_service.py']
+
+def timed_runs(cmd, runs, env, cwd):
+    """Wall seconds of each of ``runs`` runs of ``cmd``, starting with no
+    exported tables."""
+    times = []
+    for _ in range(runs):
+        shutil.rmtree(os.path.join(cwd, 'AccessTables'), ignore_errors=True)
+        start = time.perf_counter()
+        subprocess.check_call(cmd, stdout=subprocess.DEVNULL, env=env,
+                              cwd=cwd)
+        times.append(time.perf_counter()-start)
+    return times
+
+def run(nrows=200000, runs=5):
+    from synthetic_survey import write_survey_folder
+    with tempfile.TemporaryDirectory() as folder:
+        py_dir = os.path.join(folder, 'py')
+        os.makedirs(py_dir)
+        for name in MODULES:
+            shutil.copy2(os.path.join(_py_dir, name), py_dir)
+        config_path = write_survey_folder(os.path.join(folder, 'survey'),
+                                          nrows)
+        env = dict(os.environ, HOME=folder, USERPROFILE=folder)
+        tables = os.path.join(folder, 'AccessTables')
+        cli = timed_runs([sys.executable, os.path.join(
+                py_dir, 'desert_mirage_main.py'), config_path], runs, env,
+                folder)
+        cli_tables = sorted(glob.glob(os.path.join(tables, '*.csv')))
+        saved = os.path.join(folder, 'cli_tables')
+        shutil.copytree(tables, saved)
+        client = [sys.executable, os.path.join(py_dir,
+                                               'desert_mirage_service.py')]
+        try:
+            service = timed_runs(client+[config_path], runs, env, folder)
+        finally:
+            subprocess.call(client+['--stop'], stdout=subprocess.DEVNULL,
+                            env=env, cwd=folder)
+        service_tables = sorted(glob.glob(os.path.join(tables, '*.csv')))
+        same = [os.path.basename(p) for p in cli_tables] == [
+                os.path.basename(p) for p in service_tables] and all(
+                filecmp.cmp(os.path.join(saved, os.path.basename(p)), p,
+                            shallow=False) for p in service_tables)
+    print('{} rows, {} runs each'.format(nrows, runs))
+    print('{:>10} {:>10} {:>10} {:>10}'.format('', 'first (s)', 'best (s)',
+                                               'mean (s)'))
+    for name, times in [('process', cli), ('service', service)]:
+        print('{:>10} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                name, times[0], min(times[1:] or times),
+                sum(times)/len(times)))
+    print('tables: {}'.format('same' if same else 'DIFFERENT'))
+    return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time repeated runs with '
+                                                 'and without the worker '
+                                                 'service.')
+    parser.add_argument('--rows', type=float, default=2e5)
+    parser.add_argument('--runs', type=int, default=5)
+    _args = parser.parse_args()
+    sys.exit(0 if run(int(_args.rows), _args.runs) else 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+bench_startup.py:
+Times fresh interpreters for the steps that should start fast: importing
+``desert_mirage_main``, ``--help`` and ``--check`` (json validation and
+data file collection) on a small synthetic survey. Each must finish within
+a wall time budget and must not load numpy or pandas. Exits non-zero if a
+step is over budget or loads either.
+
+Example: python bench_startup.py --budget-ms 250
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+_py_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, _py_dir)
+
+HEAVY_MODULES = ['numpy', 'pandas']
+# Runs ``argv`` as the main script and prints the heavy modules it loaded
+# to stderr on exit, after ``--help`` and ``--check`` exit too.
+_probe = '''
+import sys, json, atexit, runpy
+sys.path.insert(0, {py_dir!r})
+from desert_mirage_base import module_loaded
+atexit.register(lambda: sys.stderr.write('LOADED '+json.dumps(
+        [m for m in {heavy!r} if module_loaded(m)])+'\\n'))
+sys.argv = {argv!r}
+if sys.argv[1:] == ['--import']:
+    import desert_mirage_main
+else:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+def time_command(cmd, repeat):
+    """Best wall seconds of ``repeat`` runs of ``cmd``, and its stderr."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, universal_newlines=True,
+                              cwd=_py_dir)
+        best = min(best, time.perf_counter()-start)
+    return best, proc.stderr
+
+def loaded_modules(stderr):
+    for line in stderr.splitlines():
+        if line.startswith('LOADED '):
+            return json.loads(line[len('LOADED '):])
+    return None
+
+def run(budget_ms=250., repeat=5):
+    from synthetic_survey import write_survey_folder
+    main_path = os.path.join(_py_dir, 'desert_mirage_main.py')
+    ok = True
+    with tempfile.TemporaryDirectory() as folder:
+        config_path = write_survey_folder(folder, 1000)
+        steps = [('import', [main_path, '--import']),
+                 ('--help', [main_path, '--help']),
+                 ('--check', [main_path, config_path, '--check'])]
+        # Interpreter alone, and a pandas import, for scale.
+        t_python, _ = time_command([sys.executable, '-c', 'pass'], repeat)
+        t_pandas, _ = time_command([sys.executable, '-c', 'import pandas'],
+                                   repeat)
+        print('{:>10} {:>10} {:>10}  {}'.format('step', 'wall (ms)',
+                                                'budget', 'heavy modules'))
+        print('{:>10} {:>10.1f} {:>10}'.format('python', t_python*1e3, ''))
+        print('{:>10} {:>10.1f} {:>10}'.format('pandas', t_pandas*1e3, ''))
+        for name, argv in steps:
+            probe = _probe.format(py_dir=_py_dir, heavy=HEAVY_MODULES,
+                                  argv=argv)
+            wall, stderr = time_command([sys.executable, '-c', probe], repeat)
+            loaded = loaded_modules(stderr)
+            passed = loaded == [] and wall*1e3 <= budget_ms
+            ok &= passed
+            print('{:>10} {:>10.1f} {:>10.0f}  {}{}'.format(
+                    name, wall*1e3, budget_ms,
+                    'none' if loaded == [] else loaded or stderr.strip(),
+                    '' if passed else '  FAIL'))
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the start up of the '
+                                                 'command-line steps.')
+    parser.add_argument('--budget-ms', type=float, default=250.,
+                        help='Largest wall time of each step in ms '
+                             '(default: 250).')
+    parser.add_argument('--repeat', type=int, default=5)
+    _args = parser.parse_args()
+    sys.exit(0 if run(_args.budget_ms, _args.repeat) else 1)
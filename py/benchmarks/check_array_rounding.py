@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+check_array_rounding.py:
+Property check of the array forms of ``dec_round`` and
+``euclidean_distance``: over random and edge-case values (decimal ties,
+negatives, -0.0, tiny and huge magnitudes, NaN and inf) every element of
+one array call must be bit-for-bit the result of the scalar call, with the
+scalar path as it was before arrays were accepted. Also times one array
+call against the scalar loop.
+
+Example: python check_array_rounding.py --cases 200000
+"""
+import os
+import sys
+import math
+import timeit
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_lib import dec_round, euclidean_distance
+
+def scalar_dec_round(num, dprec=4, rnd='down', rto_zero=False):
+    """``dec_round`` of one number before it accepted arrays."""
+    dprec = 10**dprec
+    if rnd == 'up' or (rnd == 'down' and rto_zero and num < 0.):
+        return np.ceil(num*dprec)/dprec
+    elif rnd == 'down' or (rnd == 'up' and rto_zero and num < 0.):
+        return np.floor(num*dprec)/dprec
+    return np.round(num, dprec)
+
+def scalar_euclidean_distance(x1, y1, x2, y2, prec_calc=2, prec_out=2):
+    """``euclidean_distance`` of one pair of points before it accepted
+    arrays."""
+    x1, y1 = float(x1), float(y1)
+    x2, y2 = float(x2), float(y2)
+    x_off = scalar_dec_round(math.fabs(x1-x2), prec_calc, 'down')
+    y_off = scalar_dec_round(math.fabs(y1-y2), prec_calc, 'down')
+    dist = math.sqrt((x_off**2)+(y_off**2))
+    return scalar_dec_round(dist, prec_out, 'down', True)
+
+def sample_values(n, rng):
+    """Random coordinates-like values mixed with values that stress the
+    truncation: exact and near decimal ties, signed zeros, extremes."""
+    ties = np.round(rng.uniform(-1e3, 1e3, n//4), 2)
+    near = ties+rng.choice([-1., 1.], len(ties))*np.spacing(ties)
+    edge = np.array([0., -0., 1e-300, -1e-300, 5e-324, 1e300, -1e300,
+                     np.nan, np.inf, -np.inf, .005, -.005, 2.675, -2.675,
+                     1.0000000000000002, .9999999999999999])
+    wide = rng.uniform(-1., 1., n//4)*10.**rng.randint(-12, 12, n//4)
+    utm = rng.uniform(3e5, 7e5, n-len(ties)-len(near)-len(edge)-len(wide))
+    values = np.concatenate([ties, near, edge, wide, utm])
+    return values[rng.permutation(len(values))]
+
+def same_bits(array_result, scalar_results):
+    """True if every element has the bits of the scalar result, any NaN
+    matching any NaN."""
+    got = np.asarray(array_result, dtype=np.float64)
+    expected = np.array(scalar_results, dtype=np.float64)
+    nan = np.isnan(expected)
+    return (got.shape == expected.shape and
+            np.array_equal(np.isnan(got), nan) and
+            np.array_equal(got[~nan].view(np.int64),
+                           expected[~nan].view(np.int64)))
+
+def check_dec_round(values):
+    failures = []
+    with np.errstate(all='ignore'):
+        for dprec in [0, 1, 2, 3, 4, 6]:
+            for rnd in ['up', 'down']:
+                for rto_zero in [False, True]:
+                    scalar = [scalar_dec_round(v, dprec, rnd, rto_zero)
+                              for v in values]
+                    if not same_bits(dec_round(values, dprec, rnd, rto_zero),
+                                     scalar):
+                        failures.append(('dec_round', dprec, rnd, rto_zero))
+    return failures
+
+def check_euclidean_distance(values, rng):
+    failures = []
+    x1, y1, x2, y2 = [values[rng.permutation(len(values))] for _ in range(4)]
+    # Also offsets of a few metres, as between a peak and its seed.
+    x2[::2] = x1[::2]+rng.normal(0., .3, len(x1[::2]))
+    y2[::2] = y1[::2]+rng.normal(0., .3, len(y1[::2]))
+    with np.errstate(all='ignore'):
+        for prec_calc, prec_out in [(2, 2), (4, 2), (3, 3), (0, 1)]:
+            scalar = [scalar_euclidean_distance(*p, prec_calc=prec_calc,
+                                                prec_out=prec_out)
+                      for p in zip(x1, y1, x2, y2)]
+            if not same_bits(euclidean_distance(x1, y1, x2, y2, prec_calc,
+                                                prec_out), scalar):
+                failures.append(('euclidean_distance', prec_calc, prec_out))
+        # Every point against every seed in one broadcast call.
+        px, py = x1[:200], y1[:200]
+        sx, sy = x2[:50, None], y2[:50, None]
+        grid = euclidean_distance(px, py, sx, sy, 4, 2)
+        scalar = [[scalar_euclidean_distance(a, b, c, d, 4, 2) for a, b in
+                   zip(px, py)] for c, d in zip(sx[:, 0], sy[:, 0])]
+        if not same_bits(grid, scalar):
+            failures.append(('euclidean_distance', 'broadcast'))
+    return failures
+
+def run(ncases=100000, rseed=129, repeat=3):
+    rng = np.random.RandomState(rseed)
+    values = sample_values(ncases, rng)
+    failures = check_dec_round(values)+check_euclidean_distance(values, rng)
+    print('{} values checked: {}'.format(
+            len(values), 'all bit-for-bit equal' if not failures else
+            'MISMATCH {}'.format(failures)))
+
+    x1, y1 = rng.uniform(3e5, 7e5, (2, ncases))
+    x2, y2 = x1+rng.normal(0., .3, ncases), y1+rng.normal(0., .3, ncases)
+    t_array = min(timeit.repeat(lambda: euclidean_distance(x1, y1, x2, y2,
+                                                           4, 2),
+                                number=1, repeat=repeat))
+    t_scalar = min(timeit.repeat(lambda: [
+            euclidean_distance(*p, prec_calc=4) for p in zip(x1, y1, x2, y2)],
+            number=1, repeat=1))
+    print('euclidean_distance of {} points: scalar loop {:.4f} s, array '
+          '{:.4f} s ({:.0f}x)'.format(ncases, t_scalar, t_array,
+                                      t_scalar/t_array))
+    return not failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the array rounding '
+                                                 'helpers against the scalar '
+                                                 'path.')
+    parser.add_argument('--cases', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=129)
+    _args = parser.parse_args()
+    sys.exit(0 if run(_args.cases, _args.seed) else 1)
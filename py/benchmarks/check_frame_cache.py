@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+check_frame_cache.py:
+Checks that a ``FileFrameCache`` hit is not copied: every numeric column and
+the categorical codes of the 'Line' column of a loaded synthetic survey file
+must share memory with the memory-mapped '.npy' file of its column, and the
+frame must equal the parsed csv. Also times a cache hit against
+``pd.read_csv`` of the same file.
+
+Example: python check_frame_cache.py --rows 1e6
+"""
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_lib import FileFrameCache
+from synthetic_survey import write_survey_folder
+
+def backing_memmap(values):
+    """The np.memmap at the base of ``values``, or None."""
+    while values is not None and not isinstance(values, np.memmap):
+        values = values.base
+    return values
+
+def uncopied_columns(df, entry):
+    """Columns of ``df`` that share memory with the memmap of their cached
+    '.npy' file in folder ``entry``."""
+    shared = []
+    for i, col in enumerate(df.columns):
+        values = df[col].values
+        if isinstance(values, pd.Categorical):
+            values = values.codes
+        mapped = backing_memmap(values)
+        if (mapped is not None and np.shares_memory(values, mapped) and
+                os.path.samefile(mapped.filename,
+                                 os.path.join(entry, '{}.npy'.format(i)))):
+            shared.append(col)
+    return shared
+
+def run(nrows=10**6, repeat=3):
+    with tempfile.TemporaryDirectory() as folder:
+        write_survey_folder(folder, nrows, sensors=('towed',))
+        path = os.path.join(folder, 'data', 'S1GSV.csv')
+        cache = FileFrameCache(os.path.join(folder, 'cache'))
+        parsed = pd.read_csv(path, header=0)
+        cache.store(path, parsed)
+        loaded = cache.load(path)
+        entry = os.path.join(cache.cache_dir, cache.key(path))
+        shared = uncopied_columns(loaded, entry)
+        same = loaded.astype({'Line': object}).equals(parsed)
+        t_csv = min(timeit.repeat(lambda: pd.read_csv(path, header=0),
+                                  number=1, repeat=repeat))
+        t_hit = min(timeit.repeat(lambda: cache.load(path), number=1,
+                                  repeat=repeat))
+        del loaded
+    copied = [col for col in parsed.columns if col not in shared]
+    print('{} rows: frame {}, columns {}'.format(
+            len(parsed.index), 'equal' if same else 'DIFFERENT',
+            'all memory-mapped' if not copied else
+            'COPIED {}'.format(copied)))
+    print('read_csv {:.4f} s, cache hit {:.4f} s ({:.0f}x)'.format(
+            t_csv, t_hit, t_csv/t_hit))
+    return same and not copied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that cached frames '
+                                                 'load without copies.')
+    parser.add_argument('--rows', type=float, default=1e6)
+    parser.add_argument('--repeat', type=int, default=3)
+    _args = parser.parse_args()
+    sys.exit(0 if run(int(_args.rows), _args.repeat) else 1)
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+check_pass_segments.py:
+Checks that ``pass_segments`` splits jittered out-and-back tracks from
+``synthetic_survey.pass_track`` into a forward and a back pass, turning at
+the far end, for several jitter levels. GPS jitter breaks a pass into many
+short runs in both directions, none of which travels the hysteresis. Also
+times the split of one long back-and-forth line.
+
+Example: python check_pass_segments.py --tracks 200 --jitter 0.03
+"""
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from desert_mirage_lib import pass_segments
+from synthetic_survey import pass_track
+
+# Seed window of the sample config, 2*SeedRadiusMask, as the hysteresis.
+HYSTERESIS = 2.2
+
+def check_tracks(ntracks, jitter, rng, step=.05, length=40.):
+    """Number of jittered tracks not split into two passes turning within
+    a few jitter widths of the far end."""
+    failures = 0
+    for _ in range(ntracks):
+        x, _ = pass_track(0., length, 0., step, rng, jitter=jitter)
+        starts, stops = pass_segments(x, HYSTERESIS)
+        if len(starts) != 2 or abs(x[stops[0]-1]-length) > 5*jitter+step:
+            failures += 1
+    return failures
+
+def run(ntracks=100, jitter=.03, rseed=129, nrows=10**6, repeat=3):
+    rng = np.random.RandomState(rseed)
+    failures = [(j, check_tracks(ntracks, j, rng)) for j in
+                sorted(set([0., .01, jitter, 2*jitter]))]
+    bad = [(j, n) for j, n in failures if n]
+    print('{} jittered tracks per jitter level {}: {}'.format(
+            ntracks, [j for j, _ in failures],
+            'all split into two passes' if not bad else
+            'NOT SPLIT (jitter, tracks) {}'.format(bad)))
+
+    x, _ = pass_track(0., 40., 0., .05, rng, jitter=jitter)
+    line = np.tile(x, nrows//len(x)+1)[:nrows]
+    t_split = min(timeit.repeat(lambda: pass_segments(line, HYSTERESIS),
+                                number=1, repeat=repeat))
+    print('pass_segments of {} rows, {} passes: {:.4f} s'.format(
+            nrows, len(pass_segments(line, HYSTERESIS)[0]), t_split))
+    return not bad
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the pass split of '
+                                                 'jittered tracks.')
+    parser.add_argument('--tracks', type=int, default=100)
+    parser.add_argument('--jitter', type=float, default=.03)
+    parser.add_argument('--seed', type=int, default=129)
+    parser.add_argument('--rows', type=float, default=1e6)
+    _args = parser.parse_args()
+    sys.exit(0 if run(_args.tracks, _args.jitter, _args.seed,
+                      int(_args.rows)) else 1)
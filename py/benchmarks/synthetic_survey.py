@@ -0,0 +1,298 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+synthetic_survey.py:
+Writes synthetic EM61-MK2 IVS surveys over a seed layout like
+'data/gsv_seeds.csv', for benchmarks at any size. Each test is a forward and
+a back pass along X over the seeds, sampled at ``sample_rate``, with a
+dipole-like response at every seed, per-line baseline drift and noise.
+Single-coil lines are named 'L[ivs][MMDD][SN][a]' and towed-array lines
+'L[ivs][MMDD][a]_[SN]' as in the sample data. Optional static test lines
+hold a test item over the stationary sensor between two backgrounds, and
+optional background lines record the stationary sensor alone.
+
+Example: python synthetic_survey.py /tmp/survey --rows 1000000
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+_data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__)))), 'data')
+_seed_csv = os.path.join(_data_dir, 'gsv_seeds.csv')
+_config_json = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__))), 'desert_mirage_config.json')
+
+# EM61-MK2 time gate decay of Ch1-Ch4 relative to Ch1.
+CHANNEL_DECAY = np.array([1., .6, .35, .15])
+# Towed array coil ids, lateral offsets from the array center in meters.
+TOWED_COILS = {'01': -.5, '02': 0., '03': .5}
+
+def pass_track(x0, x1, lane_y, step, rng, wander=.1, jitter=0.):
+    """X and Y of a forward pass from ``x0`` to ``x1`` and the pass back,
+    ``step`` apart, swaying up to ``wander`` around ``lane_y``. GPS jitter
+    with a standard deviation of ``jitter`` is added to X, if given."""
+    fwd = np.arange(x0, x1, step)
+    x = np.concatenate([fwd, fwd[::-1]])
+    if jitter:
+        x = x+rng.normal(0., jitter, len(x))
+    phase = rng.uniform(0., 2*np.pi)
+    y = lane_y+wander*np.sin(phase+x/7.)+rng.normal(0., .02, len(x))
+    return x, y
+
+def coil_response(x, y, seed_df, coil_height=.4, amplitude=150., rng=None):
+    """
+    Response of every channel to the seeds near a track, modeled as a
+    vertical dipole: ``amplitude*z**6/(r**2+z**2)**3`` with ``z`` the seed
+    depth plus ``coil_height``.
+
+    Returns
+    -------
+    np.array : shape (len(x), 4)
+    """
+    near = seed_df[np.abs(seed_df.TrueY.values-np.median(y)) < 3.]
+    rsp = np.zeros(len(x))
+    if len(near.index):
+        z2 = np.square(near.Depth.fillna(0.).values+coil_height)
+        gain = amplitude*(1. if rng is None else
+                          rng.uniform(.8, 1.2, len(near.index)))
+        r2 = np.square(x[:, None]-near.TrueX.values) + \
+            np.square(y[:, None]-near.TrueY.values)
+        rsp = np.sum(gain*np.power(z2/(r2+z2), 3), axis=1)
+    return rsp[:, None]*CHANNEL_DECAY
+
+def session_lines(seed_df, sensor_id, mmdd, am_pm, sample_rate=10., speed=1.,
+                  noise=.5, run_in=5., jitter=0., rng=None):
+    """
+    Lines of one IVS test by sensor ``sensor_id``: one line for a
+    single-coil id, or one per coil for a towed-array id in ``TOWED_COILS``.
+
+    Parameters
+    ----------
+    seed_df : pd.DataFrame
+    sensor_id : str
+    mmdd : str
+    am_pm : str
+        'a' or 'p'.
+    sample_rate : float (default: 10.)
+        Samples per second.
+    speed : float (default: 1.)
+        Meters per second.
+    noise : float (default: .5)
+        Standard deviation of the noise in mV.
+    run_in : float (default: 5.)
+        Meters before the first and after the last seed.
+    jitter : float (default: 0.)
+        Standard deviation of the GPS jitter along X in meters, see
+        ``pass_track``.
+    rng : np.random.RandomState
+
+    Returns
+    -------
+    pd.DataFrame : columns 'Line', 'X', 'Y', 'Ch1'-'Ch4'.
+    """
+    rng = rng or np.random.RandomState()
+    x0 = seed_df.TrueX.min()-run_in
+    x1 = seed_df.TrueX.max()+run_in
+    lane_y = float(np.median(seed_df.TrueY.values))
+    if sensor_id == 'towed':
+        coils = [('Livs{}{}_{}'.format(mmdd, am_pm, sn), offset)
+                 for sn, offset in sorted(TOWED_COILS.items())]
+    else:
+        coils = [('Livs{}{}{}'.format(mmdd, sensor_id, am_pm), 0.)]
+    lines = []
+    for name, offset in coils:
+        x, y = pass_track(x0, x1, lane_y+offset, speed/sample_rate, rng,
+                          jitter=jitter)
+        rsp = coil_response(x, y, seed_df, rng=rng)
+        drift = rng.normal(0., 5.)+np.linspace(0., rng.normal(0., 2.), len(x))
+        rsp += (drift[:, None]+rng.normal(0., noise, rsp.shape)) * \
+            CHANNEL_DECAY
+        line = pd.DataFrame(np.round(rsp, 2), columns=['Ch1', 'Ch2', 'Ch3',
+                                                       'Ch4'])
+        line.insert(0, 'Y', np.round(y, 2))
+        line.insert(0, 'X', np.round(x, 2))
+        line.insert(0, 'Line', name)
+        lines.append(line)
+    return pd.concat(lines, ignore_index=True)
+
+def static_lines(sensor_id, mmdd, am_pm, test_id='sta', sample_rate=10.,
+                 seconds=(30., 30., 30.), response=80., noise=.5, rng=None):
+    """
+    Lines of one static test by sensor ``sensor_id``, named like
+    ``session_lines`` with test id ``test_id``: a background, the test item
+    held over the sensor for a ``response`` mV spike on Ch1, and a
+    background again, lasting ``seconds``. The item is placed and removed
+    over one second.
+
+    Returns
+    -------
+    pd.DataFrame : columns 'Line', 'X', 'Y', 'Ch1'-'Ch4'.
+    """
+    rng = rng or np.random.RandomState()
+    if sensor_id == 'towed':
+        names = ['L{}{}{}_{}'.format(test_id, mmdd, am_pm, sn) for sn in
+                 sorted(TOWED_COILS)]
+    else:
+        names = ['L{}{}{}{}'.format(test_id, mmdd, sensor_id, am_pm)]
+    bkg, spike, _ = [int(t*sample_rate) for t in seconds]
+    ramp = int(sample_rate)
+    n = int(sum(seconds)*sample_rate)
+    level = np.zeros(n)
+    level[bkg:bkg+spike] = 1.
+    level[bkg:bkg+ramp] = np.linspace(0., 1., ramp)
+    level[bkg+spike-ramp:bkg+spike] = np.linspace(1., 0., ramp)
+    lines = []
+    for name in names:
+        rsp = (rng.normal(0., 5.)+response*rng.uniform(.9, 1.1)*level)[:, None]
+        rsp = (rsp+rng.normal(0., noise, (n, 4)))*CHANNEL_DECAY
+        line = pd.DataFrame(np.round(rsp, 2), columns=['Ch1', 'Ch2', 'Ch3',
+                                                       'Ch4'])
+        line.insert(0, 'Y', np.round(rng.normal(0., .01, n), 2))
+        line.insert(0, 'X', np.round(rng.normal(0., .01, n), 2))
+        line.insert(0, 'Line', name)
+        lines.append(line)
+    return pd.concat(lines, ignore_index=True)
+
+def background_lines(sensor_id, mmdd, am_pm, test_id='bkg', sample_rate=10.,
+                     seconds=300., noise=.5, spikes=0, rng=None):
+    """
+    Lines of one background test by sensor ``sensor_id``, named like
+    ``session_lines`` with test id ``test_id``: ``seconds`` of the
+    stationary sensor with a baseline, noise and ``spikes`` single-sample
+    spikes of 20 to 50 mV.
+
+    Returns
+    -------
+    pd.DataFrame : columns 'Line', 'X', 'Y', 'Ch1'-'Ch4'.
+    """
+    rng = rng or np.random.RandomState()
+    if sensor_id == 'towed':
+        names = ['L{}{}{}_{}'.format(test_id, mmdd, am_pm, sn) for sn in
+                 sorted(TOWED_COILS)]
+    else:
+        names = ['L{}{}{}{}'.format(test_id, mmdd, sensor_id, am_pm)]
+    n = int(seconds*sample_rate)
+    lines = []
+    for name in names:
+        rsp = rng.normal(0., 5.)+rng.normal(0., noise, (n, 4))
+        rows = rng.randint(0, n, spikes)
+        rsp[rows] += rng.uniform(20., 50., (spikes, 1))
+        line = pd.DataFrame(np.round(rsp*CHANNEL_DECAY, 2),
+                            columns=['Ch1', 'Ch2', 'Ch3', 'Ch4'])
+        line.insert(0, 'Y', np.round(rng.normal(0., .01, n), 2))
+        line.insert(0, 'X', np.round(rng.normal(0., .01, n), 2))
+        line.insert(0, 'Line', name)
+        lines.append(line)
+    return pd.concat(lines, ignore_index=True)
+
+def write_survey(path, seed_df, nrows, sensor_id='s2', start=date(2017, 1, 25),
+                 rseed=0, static_id=None, background_id=None, **kwargs):
+    """
+    Write a survey csv of at least ``nrows`` rows to ``path``: morning and
+    afternoon tests on consecutive days from ``start``, each followed by a
+    static test with test id ``static_id`` and a background test with test
+    id ``background_id`` if given. Other keyword arguments go to
+    ``session_lines``.
+
+    Returns
+    -------
+    int : rows written.
+    """
+    rng = np.random.RandomState(rseed)
+    rows = 0
+    day = 0
+    header = True
+    with open(path, 'w', newline='') as f:
+        while rows < nrows:
+            mmdd = (start+timedelta(days=day)).strftime('%m%d')
+            blocks = []
+            for am_pm in 'ap':
+                blocks.append(session_lines(seed_df, sensor_id, mmdd, am_pm,
+                                            rng=rng, **kwargs))
+                if static_id:
+                    blocks.append(static_lines(sensor_id, mmdd, am_pm,
+                                               static_id, rng=rng))
+                if background_id:
+                    blocks.append(background_lines(sensor_id, mmdd, am_pm,
+                                                   background_id, rng=rng))
+            block = pd.concat(blocks, ignore_index=True)
+            block.to_csv(f, index=False, header=header, float_format='%.2f')
+            header = False
+            rows += len(block.index)
+            day += 1
+    return rows
+
+def write_survey_folder(folder, nrows, seed_csv=None, sensors=('towed', 's2'),
+                        static_id=None, background_id=None, **kwargs):
+    """
+    Write one survey file per sensor in ``sensors`` ('towed' for a towed
+    array) to '``folder``/data', about ``nrows`` rows in all, and a json
+    config for it at '``folder``/config.json'. Static tests with test id
+    ``static_id`` and background tests with test id ``background_id`` are
+    added if given, as json 'StaticID1' and 'BackgroundID'.
+
+    Returns
+    -------
+    str : config path.
+    """
+    seed_csv = os.path.abspath(seed_csv or _seed_csv)
+    seed_df = pd.read_csv(seed_csv, header=0)
+    data_folder = os.path.join(folder, 'data')
+    if not os.path.exists(data_folder):
+        os.makedirs(data_folder)
+    for i, sid in enumerate(sensors):
+        write_survey(os.path.join(data_folder, 'S{}GSV.csv'.format(i+1)),
+                     seed_df, nrows//len(sensors), sid, rseed=i,
+                     static_id=static_id, background_id=background_id,
+                     **kwargs)
+    with open(_config_json) as f:
+        config = json.load(f)
+    single = [sid for sid in sensors if sid != 'towed']
+    config['GUI'].update({
+        'SurveyType': ('Mixed' if 'towed' in sensors else 'Single Coil')
+        if single else 'Towed Array',
+        'SingleCoilSensorID': ', '.join(single),
+        'SeedFile': seed_csv, 'DataFolder': os.path.abspath(data_folder)})
+    if static_id:
+        config['GUI']['StaticID1'] = static_id
+    if background_id:
+        config['GUI']['BackgroundID'] = background_id
+    config_path = os.path.join(folder, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    return config_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic IVS survey.')
+    parser.add_argument('folder')
+    parser.add_argument('--rows', type=float, default=1e5)
+    parser.add_argument('--seeds', default=None,
+                        help='Seed csv (default: data/gsv_seeds.csv).')
+    parser.add_argument('--sensors', default='towed,s2',
+                        help="Comma separated sensor ids, 'towed' for a "
+                             "towed array (default: towed,s2).")
+    parser.add_argument('--sample-rate', type=float, default=10.)
+    parser.add_argument('--speed', type=float, default=1.)
+    parser.add_argument('--noise', type=float, default=.5)
+    parser.add_argument('--jitter', type=float, default=0.,
+                        help='GPS jitter along X in meters (default: 0).')
+    parser.add_argument('--static-id', default=None,
+                        help="Add static tests with this test id, e.g. 'sta'.")
+    parser.add_argument('--background-id', default=None,
+                        help="Add background tests with this test id, e.g. "
+                             "'bkg'.")
+    _args = parser.parse_args()
+    print(write_survey_folder(_args.folder, int(_args.rows), _args.seeds,
+                              _args.sensors.split(','), _args.static_id,
+                              _args.background_id,
+                              sample_rate=_args.sample_rate,
+                              speed=_args.speed, noise=_args.noise,
+                              jitter=_args.jitter))
+    sys.exit(0)
@@ -0,0 +1,409 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+desert_mirage_base.py:
+Functions and classes of the desert mirage module that need only the
+standard library: json config, file collection, folder watching and run
+instrumentation. Checking a config or listing data files imports this
+module alone, and ``lazy_import`` defers numpy and pandas to first use.
+Everything here is also available from ``desert_mirage_lib``.
+"""
+
+import sys
+import os
+import json as json
+import hashlib
+import time
+import select
+import importlib.util
+from functools import partial, wraps
+from contextlib import contextmanager
+from glob import glob
+
+# Lazy imports
+def lazy_import(name):
+    """
+    Module ``name``, executed on the first attribute access instead of now,
+    with ``importlib.util.LazyLoader``. Modules already imported are
+    returned as they are.
+
+    Parameters
+    ----------
+    name : str
+        Top-level module name, e.g. 'pandas'.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError('No module named {!r}'.format(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def module_loaded(name):
+    """True if module ``name`` has been imported and executed, not just set
+    up by ``lazy_import``."""
+    module = sys.modules.get(name)
+    # Any attribute access would load a lazy module, so check its type.
+    return module is not None and \
+        type(module) is not importlib.util._LazyModule
+
+# JSON utilities.
+def json_config(jfile, jobj_hook=None, jwrite_obj=None, jappend=None):
+    """
+    Simple interface to json library functions. Reads JSON data into object
+    dictionary or appends json data to existing file.
+    See the json library documentation for  more info.
+    `json <https://docs.python.org/3/library/json.html>`_
+
+    Parameters
+    ----------
+    jfile : str
+        json file path.
+    jobj_hook : function (default: None)
+        Decoder. If None, decodes to dict.
+    jwrite_obj : obj (default: None)
+        Obj to write to existing json file ``jfile``. 
+        Evaluated before ``jappend``.
+    jappend : obj (default: None)
+        New data to append to existing json file ``jfile``.
+    """
+    # write if file does not exist.
+    if jwrite_obj is not None:
+        # Write `jwrite_obj` if file does not exist.
+        if not any([os.path.isfile(jfile),
+                    os.path.isfile(os.path.abspath(jfile)),
+                    jwrite_obj]):
+            print('writing `jwrite_obj` to new json `jfile`.')
+            with open(jfile, 'w') as f:
+                json.dump(jwrite_obj, f, sort_keys=True, ensure_ascii=False)
+        else:
+            print('No json in path provided.')
+        return
+    if jappend is not None:
+        with open(jfile, 'r+') as f:
+            json_dict = json.load(f, object_hook=None)
+            json_dict.update(jappend)
+            f.seek(0)
+            f.truncate()  # todo: Improve to only truncate if needed.
+            # print(len(f.readlines()))
+            json.dump(json_dict, f, sort_keys=True, indent=4)
+            f.close()
+        return
+    with open(jfile) as f:
+        if jobj_hook is not None:
+            return json.load(f, object_hook=jobj_hook)
+        return json.load(f)
+
+class JsonDict(object):
+    """
+    Contains object hook for ``json_config`` for reading object in as dictionary.
+    """
+    def __init__(self, json_obj):
+        self.__dict__ = json_obj
+    
+    def items_(self):
+        for key in self.__dict__:
+            setattr(self, key, self.__dict__[key])
+    
+    def __repr__(self):
+        return "<JsonDict: %s>"%self.__dict__
+
+class DictAsObject(object):
+    """
+    Converts a dictionary to an object with items as attributes.
+    """
+    
+    def __init__(self, dictionary):
+        for key in dictionary:
+            if not key.startswith('__'):
+                setattr(self, key, dictionary[key])
+    
+    def __repr__(self):
+        return "<DictAsObject: %s>"%self.__dict__
+
+
+def file_to_string_w_replace(afile, old, new=', ', occurrence=None):
+    """
+    Notes
+    -----
+    Adopted and/or modified from reference(s):
+    http://stackoverflow.com/questions/2556108/
+    """
+    with open(afile, 'r+') as afl:
+        fs = afl.read().replace('\n', '')
+    if occurrence is not None:
+        news = fs.rsplit(old, occurrence)
+        return new.join(news)
+    news = fs.rsplit(old)
+    return new.join(news)
+
+# File hashing
+def file_md5(path):
+    """Hex md5 of the content of file ``path``, read in 1 MB blocks."""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(partial(f.read, 1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+def file_signature(path):
+    """(absolute path, size, mtime_ns) of file ``path``, which changes when
+    the file is rewritten."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+# Watching a folder
+class FolderWatcher(object):
+    """
+    Watches ``folder`` for files matching glob ``pattern`` that are new,
+    modified or removed. Changes are found by comparing the size and mtime
+    of every file, and a file is reported only once both have been steady for
+    ``settle`` seconds, so files still being written are not picked up. On
+    Linux the watcher sleeps on inotify events, otherwise it polls every
+    ``interval`` seconds.
+
+    Parameters
+    ----------
+    folder : str
+    pattern : str (default: '**/*.csv')
+    interval : float (default: 1.)
+        Seconds between checks without inotify, and the longest wait with it.
+    settle : float (default: 2.)
+    """
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+    # IN_DELETE
+    inotify_mask = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+    def __init__(self, folder, pattern='**/*.csv', interval=1., settle=2.):
+        self.folder = folder
+        self.pattern = pattern
+        self.interval = interval
+        self.settle = settle
+        self.pending = {}  # Settling path to ((size, mtime_ns), since).
+        self.watched = set()
+        self._libc = None
+        self._fd = None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK)
+            if fd >= 0:
+                self._libc, self._fd = libc, fd
+        except (ImportError, OSError, AttributeError, TypeError):
+            pass
+        self.seen = self.snapshot()
+
+    def __repr__(self):
+        return "<FolderWatcher: %s%s>"%(
+            self.folder, '' if self._fd is not None else ' (polling)')
+
+    def snapshot(self):
+        """Dict of matching file path to (size, mtime_ns). Also adds inotify
+        watches on new sub-folders."""
+        if self._fd is not None:
+            for root, _, _ in os.walk(self.folder):
+                if root not in self.watched:
+                    self._libc.inotify_add_watch(
+                        self._fd, os.fsencode(root), self.inotify_mask)
+                    self.watched.add(root)
+        files = {}
+        for path in glob(os.path.join(self.folder, self.pattern),
+                         recursive=True):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.normpath(path)] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def wait(self, timeout):
+        """Sleep ``timeout`` seconds, or until an inotify event."""
+        if self._fd is None:
+            time.sleep(timeout)
+            return
+        if select.select([self._fd], [], [], timeout)[0]:
+            try:
+                while os.read(self._fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+        return
+
+    def changes(self):
+        """
+        Generator of the paths changed since the last batch, once they have
+        settled.
+
+        Returns
+        -------
+        generator : (list of new or modified paths, list of removed paths)
+        """
+        while True:
+            self.wait(self.interval if not self.pending else
+                      min(self.interval, self.settle))
+            now = time.time()
+            current = self.snapshot()
+            for path, sig in current.items():
+                if self.seen.get(path) == sig:
+                    self.pending.pop(path, None)
+                elif self.pending.get(path, (None,))[0] != sig:
+                    # New or still growing, restart its settle time.
+                    self.pending[path] = (sig, now)
+            ready = sorted(path for path, (sig, since) in self.pending.items()
+                           if now-since >= self.settle and
+                           current.get(path) == sig)
+            removed = sorted(set(self.seen)-set(current))
+            for path in removed:
+                del self.seen[path]
+            for path in list(self.pending):
+                if path not in current:
+                    del self.pending[path]
+            for path in ready:
+                self.seen[path] = self.pending.pop(path)[0]
+            if ready or removed:
+                yield ready, removed
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        return
+
+# Instrumentation
+class RunStats(object):
+    """
+    Wall and CPU timers and counters for a machine-readable run report.
+    Disabled by default, when a timer or counter costs one attribute check.
+    Timers accumulate the calls, wall seconds and process CPU seconds of each
+    name, counters an integer total.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def __repr__(self):
+        return "<RunStats: %d timers, %d counters%s>"%(
+            len(self.timers), len(self.counters),
+            '' if self.enabled else ', disabled')
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        return
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        return
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager timing its block under ``name``."""
+        if not self.enabled:
+            yield
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            t = self.timers.setdefault(name, [0, 0., 0.])
+            t[0] += 1
+            t[1] += time.perf_counter()-wall
+            t[2] += time.process_time()-cpu
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function under ``name``, by
+        default the function name."""
+        def decorator(func):
+            label = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        """Add ``n`` to counter ``name``."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0)+int(n)
+        return
+
+    def snapshot(self):
+        """Timers and counters as plain dicts, e.g. to return from a pool
+        worker."""
+        return {'timers': {k: list(v) for k, v in self.timers.items()},
+                'counters': dict(self.counters)}
+
+    def merge(self, snapshot):
+        """Add the timers and counters of a ``snapshot``."""
+        for name, (calls, wall, cpu) in snapshot['timers'].items():
+            t = self.timers.setdefault(name, [0, 0., 0.])
+            t[0] += calls
+            t[1] += wall
+            t[2] += cpu
+        for name, n in snapshot['counters'].items():
+            self.counters[name] = self.counters.get(name, 0)+n
+        return
+
+    def report(self, **run_info):
+        """Dict of ``run_info`` with the 'timers' and 'counters'."""
+        report = dict(run_info)
+        report['timers'] = {name: {'calls': calls, 'wall_s': wall,
+                                   'cpu_s': cpu} for name, (calls, wall, cpu)
+                            in sorted(self.timers.items())}
+        report['counters'] = dict(sorted(self.counters.items()))
+        return report
+
+    def write_report(self, path, **run_info):
+        """Write ``report`` as json to ``path``."""
+        with open(path, 'w') as f:
+            json.dump(self.report(**run_info), f, indent=2)
+        return
+
+# Timers and counters of the current run, see ``RunStats``.
+run_stats = RunStats()
+
+# OS utilities
+def prevent_file_collision(fullpath, cnt=None):
+    f_dir, nameext = os.path.split(fullpath)
+    name, ext = os.path.splitext(nameext)
+    if not cnt:
+        cnt = 1
+    new_path = fullpath
+    while os.path.isfile(new_path):
+        cnt += 1
+        new_name = name+'({}){}'.format(cnt, ext)
+        new_path = os.path.join(f_dir, new_name)
+        print('Export file collision. Renaming file.')
+        print('Export file is now: ', os.path.basename(new_path))
+    return new_path
+
+# Collecting files in OS path
+def dict_of_files_in_path(fpath, string1, string2):
+    """
+    Recursive search for all '.txt' files in ``fpath`` and split 
+    into two lists if file base name contains ``string1`` or ``string2``.
+    """
+    string1_list = list()
+    string2_list = list()
+    for file in glob(os.path.join(fpath, '**/*.txt'),
+                     recursive=True):
+        file_base = os.path.basename(file)
+        # Check if 'string1' in basename.
+        if string1 in file_base:
+            string1_list.append(file)
+        # Check if 'string2' in basename.
+        elif string2 in file_base:
+            string2_list.append(file)
+    return {'{}'.format(string1): string1_list,
+            '{}'.format(string2): string2_list}
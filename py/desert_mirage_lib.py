@@ -10,122 +10,197 @@ Copyright (c) Jan 2017 Nicholas Valentour
 from sys import exit
 import os
 import json as json
-import numpy as np
-import pandas as pd
-from functools import partial
+import hashlib
+import shutil
+import tempfile
+import time
+import warnings
+from functools import partial, wraps
+from collections import OrderedDict
+from contextlib import contextmanager
 from glob import glob
 import math
-import heapq
-import random
-from numpy import random
 import string
 from datetime import timedelta as td
 from datetime import date
 import re
+from desert_mirage_base import *
 
-# JSON utilities.
-def json_config(jfile, jobj_hook=None, jwrite_obj=None, jappend=None):
+# numpy and pandas are loaded on first use, see ``lazy_import``.
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Pandas utilities.
+def ungroupby(df, idx_label):
+    # ungroup the pandas groupby object.
+    idx_list = df[idx_label].values.tolist()
+    new_range = np.arange(idx_list)
+    return df.reset_index(drop=True).reindex(new_range).fillna(method='ffill')
+
+class TableBuilder(object):
     """
-    Simple interface to json library functions. Reads JSON data into object
-    dictionary or appends json data to existing file.
-    See the json library documentation for  more info.
-    `json <https://docs.python.org/3/library/json.html>`_
+    Accumulates rows of a fixed-schema table in one typed, preallocated
+    buffer per column and materializes the DataFrame once with ``to_frame``.
+    Buffers grow by doubling, so appending ``n`` rows costs ``O(n)`` overall.
 
     Parameters
     ----------
-    jfile : str
-        json file path.
-    jobj_hook : function (default: None)
-        Decoder. If None, decodes to dict.
-    jwrite_obj : obj (default: None)
-        Obj to write to existing json file ``jfile``. 
-        Evaluated before ``jappend``.
-    jappend : obj (default: None)
-        New data to append to existing json file ``jfile``.
-    """
-    # write if file does not exist.
-    if jwrite_obj is not None:
-        # Write `jwrite_obj` if file does not exist.
-        if not any([os.path.isfile(jfile),
-                    os.path.isfile(os.path.abspath(jfile)),
-                    jwrite_obj]):
-            print('writing `jwrite_obj` to new json `jfile`.')
-            with open(jfile, 'w') as f:
-                json.dump(jwrite_obj, f, sort_keys=True, ensure_ascii=False)
+    columns: list
+        Column names in output order. Values for other columns are ignored,
+        missing values are NaN.
+    capacity: int (default: 256)
+        Initial number of rows allocated per column.
+    """
+    def __init__(self, columns, capacity=256):
+        self.columns = list(columns)
+        self._capacity = max(int(capacity), 1)
+        self._buffers = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return "<TableBuilder: %d rows x %d cols>"%(self._size,
+                                                    len(self.columns))
+
+    @staticmethod
+    def _buffer_dtype(values):
+        if values.dtype.kind in 'iuf':
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    def _allocate(self, dtype, size):
+        buf = np.empty(self._capacity, dtype=dtype)
+        buf[:size] = np.nan
+        return buf
+
+    def _reserve(self, nrows):
+        need = self._size+nrows
+        if need <= self._capacity:
+            return
+        self._capacity = max(need, 2*self._capacity)
+        for col, buf in self._buffers.items():
+            grown = np.empty(self._capacity, dtype=buf.dtype)
+            grown[:self._size] = buf[:self._size]
+            self._buffers[col] = grown
+
+    def append_rows(self, data):
+        """
+        Append a block of rows.
+
+        Parameters
+        ----------
+        data: pd.DataFrame or dict
+            Columns of equal length. Dict values may be scalars, which are
+            repeated for every row.
+        """
+        if isinstance(data, pd.DataFrame):
+            nrows = len(data.index)
         else:
-            print('No json in path provided.')
+            lengths = [len(v) for v in data.values() if np.ndim(v)]
+            nrows = lengths[0] if lengths else 1
+        if not nrows:
+            return
+        self._reserve(nrows)
+        start, stop = self._size, self._size+nrows
+        for col in self.columns:
+            if col in data:
+                values = np.asarray(data[col])
+                buf = self._buffers.get(col)
+                dtype = self._buffer_dtype(values)
+                if buf is None:
+                    buf = self._allocate(dtype, start)
+                elif buf.dtype != dtype and buf.dtype != object:
+                    buf = buf.astype(object)
+                buf[start:stop] = values
+                self._buffers[col] = buf
+            elif col in self._buffers:
+                self._buffers[col][start:stop] = np.nan
+        self._size = stop
         return
-    if jappend is not None:
-        with open(jfile, 'r+') as f:
-            json_dict = json.load(f, object_hook=None)
-            json_dict.update(jappend)
-            f.seek(0)
-            f.truncate()  # todo: Improve to only truncate if needed.
-            # print(len(f.readlines()))
-            json.dump(json_dict, f, sort_keys=True, indent=4)
-            f.close()
+
+    def append_row(self, row):
+        """Append a single row from dict ``row``."""
+        self.append_rows({key: [value] for key, value in row.items()})
         return
-    with open(jfile) as f:
-        if jobj_hook is not None:
-            return json.load(f, object_hook=jobj_hook)
-        return json.load(f)
 
-class JsonDict(object):
-    """
-    Contains object hook for ``json_config`` for reading object in as dictionary.
-    """
-    def __init__(self, json_obj):
-        self.__dict__ = json_obj
-    
-    def items_(self):
-        for key in self.__dict__:
-            setattr(self, key, self.__dict__[key])
-    
-    def __repr__(self):
-        return "<JsonDict: %s>"%self.__dict__
+    def to_frame(self):
+        """Return the accumulated rows as a DataFrame in schema order."""
+        data = {}
+        for col in self.columns:
+            if col in self._buffers:
+                data[col] = self._buffers[col][:self._size]
+            else:
+                data[col] = np.full(self._size, np.nan, dtype=object)
+        return pd.DataFrame(data, columns=self.columns,
+                            index=np.arange(self._size))
 
-class DictAsObject(object):
+def linear_recurrence(scale, shift, block=16, exact=False):
     """
-    Converts a dictionary to an object with items as attributes.
-    """
-    
-    def __init__(self, dictionary):
-        for key in dictionary:
-            if not key.startswith('__'):
-                setattr(self, key, dictionary[key])
-    
-    def __repr__(self):
-        return "<DictAsObject: %s>"%self.__dict__
+    ``y[i] = y[i-1]*scale[i]+shift[i]`` from ``y[0] = shift[0]`` without a
+    Python step per element. Each step is an affine map: the maps within
+    blocks of ``block`` points are composed as a prefix scan in
+    ``log2(block)`` whole-array passes, and the values carried between
+    blocks are the same recurrence, ``block`` times shorter.
 
+    The composed maps round differently from the step by step loop, so
+    values are not bit for bit those of the loop: with ``|scale| <= 1`` they
+    differ by a few units in the last place of the largest ``|y|`` nearby
+    (about 3e-15 absolute for values near 1 over 1e6 steps), more where
+    ``|scale| > 1`` amplifies the rounding. ``exact`` runs the loop instead,
+    one Python step per element, for results that must match it exactly.
 
-def file_to_string_w_replace(afile, old, new=', ', occurrence=None):
-    """
-    Notes
-    -----
-    Adopted and/or modified from reference(s):
-    http://stackoverflow.com/questions/2556108/
-    """
-    with open(afile, 'r+') as afl:
-        fs = afl.read().replace('\n', '')
-    if occurrence is not None:
-        news = fs.rsplit(old, occurrence)
-        return new.join(news)
-    news = fs.rsplit(old)
-    return new.join(news)
-
+    Parameters
+    ----------
+    scale: np.array
+        1-D multipliers, ``scale[0]`` is not used.
+    shift: np.array
+        1-D addends.
+    block: int (default: 16)
+        Points per block.
+    exact: bool (default: False)
+        Sequential loop with its exact rounding.
 
-# Pandas utilities.
-def ungroupby(df, idx_label):
-    # ungroup the pandas groupby object.
-    idx_list = df[idx_label].values.tolist()
-    new_range = np.arange(idx_list)
-    return df.reset_index(drop=True).reindex(new_range).fillna(method='ffill')
+    Returns
+    -------
+    np.array : float64 array, same length as ``shift``.
+    """
+    if exact:
+        y = np.array(shift, dtype=np.float64)
+        a = np.asarray(scale, dtype=np.float64).tolist()
+        b = y.tolist()
+        for i in range(1, len(b)):
+            b[i] = b[i-1]*a[i]+b[i]
+        y[:] = b
+        return y
+    n = len(shift)
+    nblocks = -(-n//block)
+    pad = nblocks*block-n
+    a = np.concatenate([np.asarray(scale, dtype=np.float64),
+                        np.ones(pad)]).reshape(nblocks, block)
+    b = np.concatenate([np.asarray(shift, dtype=np.float64),
+                        np.zeros(pad)]).reshape(nblocks, block)
+    span = 1
+    with np.errstate(invalid='ignore', over='ignore'):
+        while span < block:
+            # Compose each map with the map ``span`` points before it.
+            b[:, span:] = b[:, :-span]*a[:, span:]+b[:, span:]
+            a[:, span:] = a[:, :-span]*a[:, span:]
+            span *= 2
+        if nblocks > 1:
+            carry = linear_recurrence(a[:, -1], b[:, -1], block)
+            b[1:] += a[1:]*carry[:-1, np.newaxis]
+    return b.ravel()[:n]
 
-def example_col_math(df, col1, col2, col3, new_col):
-    darray = [df[col1].values[0]]
-    for i in range(1, len(df.index)):
-        darray.append(darray[i-1]*df[col2].values[i]+df[col3].values[i])
-    df[new_col] = darray
+def example_col_math(df, col1, col2, col3, new_col, exact=False):
+    """Adds the recurrence ``new[i] = new[i-1]*col2[i]+col3[i]``, from
+    ``new[0] = col1[0]``, as column ``new_col`` of ``df``, see
+    ``linear_recurrence`` for the rounding and ``exact``."""
+    shift = df[col3].values.astype(np.float64)
+    if len(shift):
+        shift[0] = df[col1].values[0]
+    df[new_col] = linear_recurrence(df[col2].values, shift, exact=exact)
     return df
 
 def example_df(nrows, ncols, inc_id_col=None, bool_cols=None,
@@ -151,11 +226,11 @@ def example_df(nrows, ncols, inc_id_col=None, bool_cols=None,
     pd.DataFrame : pd.DataFrame
         Shape nrow x ncols with column names as an alphabetic sequence.
     """
-    random.seed(rseed)
+    np.random.seed(rseed)
     # Create alphabetic list in uppercase.
     alphabet_cols = list(string.ascii_uppercase)[:ncols]
-    df = pd.DataFrame(random.randint(nrows,
-                                     size=(nrows, ncols)),
+    df = pd.DataFrame(np.random.randint(nrows,
+                                        size=(nrows, ncols)),
                       columns=alphabet_cols)
     
     # Create ID-like column A.
@@ -166,8 +241,8 @@ def example_df(nrows, ncols, inc_id_col=None, bool_cols=None,
     
     # Populate boolean values for the ncol-1 right-most columns.
     if bool_cols:
-        df[df.columns[-ncols+1:]] = random.randint(2, nrows,
-                                                   len(df.columns[-ncols+1:]))
+        df[df.columns[-ncols+1:]] = np.random.randint(
+                2, nrows, len(df.columns[-ncols+1:]))
         df.sort_values(by='ID', inplace=True)
         df.reset_index(inplace=True, drop=True)
     
@@ -182,7 +257,7 @@ def eliminate_invalids(df, cols):
     """Eliminate invalid data in ``cols`` of ``df``."""
     numdf = df.drop(cols, axis=1).join(df[cols].apply(pd.to_numeric,
                                                       errors='coerce'))
-    numdf = numdf[~numdf[cols].isnull().apply(np.any, axis=1)]
+    numdf = numdf[~numdf[cols].isnull().values.any(axis=1)]
     return numdf
 
 def df_cols_by_type(df):
@@ -259,15 +334,137 @@ def data_to_row_bins(ar, npts=1):
     Returns
     -------
     X: np.array
-        m x npts array where each row contains a bin of data with 'npts'.
+        m x npts array where each row contains a bin of data with 'npts', a
+        read-only view of ``ar``, see ``strided_windows``.
     y: np.array
-        The target values for each row of X.
+        The target values for each row of X, the point ``npts`` after the
+        end of the row.
+    """
+    X = strided_windows(ar, npts)
+    y = ar[2*npts-1:].copy()
+    return X[:len(y)], y
+
+def strided_windows(ar, npts, step=1):
+    """
+    Windows of ``npts`` points along the last axis of ``ar``, one every
+    ``step`` points, as a read-only np.strides view (no copy). Trailing
+    points that do not fill a window are left out.
+
+    Parameters
+    ----------
+    ar: np.array
+        Series along the last axis, e.g. (channels, samples).
+    npts: int
+        Number of points in each window.
+    step: int (default: 1)
+        Points between window starts, ``npts`` for non-overlapping bins.
+
+    Returns
+    -------
+    np.array : shaped ar.shape[:-1]+(windows, npts).
+    """
+    nwin = max((ar.shape[-1]-npts)//step+1, 0)
+    ashape = ar.shape[:-1]+(nwin, npts)
+    astrides = ar.strides[:-1]+(ar.strides[-1]*step, ar.strides[-1])
+    return np.lib.stride_tricks.as_strided(ar, shape=ashape, strides=astrides,
+                                           writeable=False)
+
+def windowed_noise(bins, method='std'):
     """
-    ashape = ar.shape[:-1]+(ar.shape[-1]-npts+1, npts)
-    astrides = ar.strides+(ar.strides[-1],)
-    X = np.lib.stride_tricks.as_strided(ar, shape=ashape, strides=astrides)
-    y = np.array([X[i+npts][-1] for i in range(len(X)-npts)])
-    return X[:-npts], y
+    Noise level of windowed series, e.g. from ``strided_windows``: the
+    median over the windows of the spread within each window, so a slow
+    baseline drift does not count as noise.
+
+    Parameters
+    ----------
+    bins: np.array
+        Windows shaped (..., windows, npts).
+    method: str (default: 'std')
+        'std' for the window standard deviation, 'mad' for the window median
+        absolute deviation scaled by 1.4826 to match the std of normal noise.
+
+    Returns
+    -------
+    np.array : shaped bins.shape[:-2], NaN where there are no windows.
+    """
+    bins = np.asarray(bins, dtype=np.float64)
+    if not bins.shape[-2]:
+        return np.full(bins.shape[:-2], np.nan)
+    npts = bins.shape[-1]
+    if method == 'mad':
+        dev = np.abs(bins-np.median(bins, axis=-1, keepdims=True))
+        spread = 1.4826*np.median(dev, axis=-1)
+    else:
+        # Faster than bins.std(axis=-1) over short windows.
+        dev = bins-np.einsum('...i->...', bins)[..., None]/npts
+        spread = np.sqrt(np.einsum('...i,...i->...', dev, dev)/npts)
+    with warnings.catch_warnings():
+        # Windows with missing samples are NaN; all NaN gives NaN.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(spread, axis=-1)
+
+def binned_noise(ar, npts, keep=None):
+    """
+    ``windowed_noise`` of the non-overlapping bins of ``npts`` points along
+    the last axis of ``ar``: the median over the bins of the bin standard
+    deviation. The standard deviation comes from the bin sums of the values
+    and of their squares, so each point is read once and the bins are never
+    copied.
+
+    Parameters
+    ----------
+    ar: np.array
+        Series along the last axis, e.g. (channels, samples).
+    npts: int
+        Number of points in each bin, trailing points are left out.
+    keep: np.array (default: None)
+        Bool mask of the bins to use, shaped (bins,).
+
+    Returns
+    -------
+    np.array : shaped ar.shape[:-1], NaN where there are no bins.
+    """
+    bins = strided_windows(np.asarray(ar, dtype=np.float64), npts, npts)
+    s1 = np.einsum('...i->...', bins)
+    s2 = np.einsum('...i,...i->...', bins, bins)
+    # Bins with missing samples are NaN.
+    spread = np.sqrt(np.maximum(s2-s1*s1/npts, 0.)/npts)
+    if keep is not None:
+        spread = spread[..., keep]
+    if not spread.shape[-1]:
+        return np.full(spread.shape[:-1], np.nan)
+    with warnings.catch_warnings():
+        # All NaN gives NaN.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(spread, axis=-1)
+
+def symmetric_trim_count(sorted_ar, thr):
+    """
+    Points to trim from each end of ``sorted_ar`` so the peak to peak of the
+    rest is at most ``thr``, as if the max and min were popped in pairs until
+    it is. One sort instead of a ``ptp`` per pop: the peak to peak after
+    trimming ``k`` points from each end is ``sorted_ar[n-1-k]-sorted_ar[k]``
+    and never grows with ``k``. At least one point is kept.
+
+    Parameters
+    ----------
+    sorted_ar: np.array
+        Values sorted along axis 0, one series per column if 2-D.
+    thr: float or np.array
+        Peak to peak threshold, one per column if an array.
+
+    Returns
+    -------
+    np.array : int64 count per column, shaped sorted_ar.shape[1:].
+    """
+    n = sorted_ar.shape[0]
+    half = (n+1)//2
+    if not half:
+        return np.zeros(sorted_ar.shape[1:], dtype=np.int64)
+    k = np.arange(half)
+    within = sorted_ar[n-1-k]-sorted_ar[k] <= thr
+    return np.where(within.any(axis=0), within.argmax(axis=0),
+                    half-1).astype(np.int64)
 
 def df_info(df):
     print('Shape: \n', df.shape)
@@ -279,10 +476,11 @@ def df_info(df):
 
 def map_series1_index_to_kth_largest_in_series(df, c1, c2, new_col_str):
     """
-    Returns list of kth indexes in ``c2`` where the kth value of ``c2`` is
-    greater than the *ith* largest value in ``c1``.
-    The criteria uses the following logic:
-    ``(c2[k] >= c1[i] and c2[k+1] < c1[i])``, for all ``i`` in ``c1``.
+    Adds column ``new_col_str``, the index ``k`` in ascending ``c2`` of the
+    largest value of ``c2`` not above each value of ``c1``:
+    ``(c2[k] <= c1[i] and c2[k+1] > c1[i])``, the last index for values from
+    ``max(c2)`` up and -1 for values below ``c2[0]``. A binary search per
+    value with ``np.searchsorted``.
 
     Parameters
     ----------
@@ -295,29 +493,20 @@ def map_series1_index_to_kth_largest_in_series(df, c1, c2, new_col_str):
     new_col_str: str
         New column name.
     """
-    mapd = None
-    try:
-        A = df.c1.values
-        B = df.c2.values
-        mapd = [k for k in range(0, len(B)-1) for a in A if
-                (B[k] <= a) & (B[k+1] > a) or (a > max(B))]
-    except AttributeError:
-        A = df.c1.values.tolist()
-        B = df.c2.values.tolist()
-        mapd = [k for k in range(0, len(B)-1) for a in A if
-                (B[k] <= a) & (B[k+1] > a) or (a > max(B))]
-    if mapd is not None:
-        df[new_col_str] = mapd
+    df[new_col_str] = np.searchsorted(df[c2].values, df[c1].values,
+                                      side='right')-1
     return df
 
 # Simple stats/math
 def dec_round(num, dprec=4, rnd='down', rto_zero=False):
     """
-    Round up/down numeric ``num`` at specified decimal ``dprec``.
+    Round up/down numeric ``num`` at specified decimal ``dprec``. Arrays are
+    rounded elementwise with the same operations, so each element is
+    bit-for-bit the value of the scalar call.
 
     Parameters
     ----------
-    num: float
+    num: float or np.array
     dprec: int
         Decimal position for truncation.
     rnd: str (default: 'down')
@@ -327,92 +516,615 @@ def dec_round(num, dprec=4, rnd='down', rto_zero=False):
 
     Returns
     ----------
-    float (default: rounded-up)
+    float or np.array (default: rounded-up)
     """
     dprec = 10**dprec
-    if rnd == 'up' or (rnd == 'down' and rto_zero and num < 0.):
+    num = np.asarray(num)
+    if rnd == 'up':
         return np.ceil(num*dprec)/dprec
-    elif rnd == 'down' or (rnd == 'up' and rto_zero and num < 0.):
+    elif rnd == 'down':
+        if rto_zero:
+            # Negative values are rounded up, towards zero.
+            return np.where(num < 0., np.ceil(num*dprec),
+                            np.floor(num*dprec))[()]/dprec
         return np.floor(num*dprec)/dprec
     return np.round(num, dprec)
 
 def euclidean_distance(x1, y1, x2, y2, prec_calc=2, prec_out=2):
     """
     Calculates euclidean distance between a pair of cartesian points.
-    Includes parameter to apply a cutoff precision.
+    Includes parameter to apply a cutoff precision. The coordinates may be
+    arrays that broadcast together, e.g. every point against every seed,
+    and give bit-for-bit the distances of the scalar calls: the offsets are
+    truncated at ``prec_calc`` before ``sqrt`` and the distance rounded
+    towards zero at ``prec_out``, which ``np.hypot`` would not match.
 
     Parameters
     ----------
-    x1, y1: float coordinates of first point.
-    x2, y2: float coordinates of second point.
+    x1, y1: float or np.array coordinates of first point.
+    x2, y2: float or np.array coordinates of second point.
     prec_calc: int (default: 3)
         decimal precision for calculations.
     prec_out: int (default: 2)
         output decimal precision.
     """
-    x1, y1 = float(x1), float(y1)
-    x2, y2 = float(x2), float(y2)
-    x_off = dec_round(math.fabs(x1-x2), prec_calc, 'down')
-    y_off = dec_round(math.fabs(y1-y2), prec_calc, 'down')
-    dist = math.sqrt((x_off**2)+(y_off**2))
+    x1, y1, x2, y2 = [np.asarray(v, dtype=np.float64) for v in
+                      [x1, y1, x2, y2]]
+    x_off = dec_round(np.abs(x1-x2), prec_calc, 'down')
+    y_off = dec_round(np.abs(y1-y2), prec_calc, 'down')
+    dist = np.sqrt((x_off**2)+(y_off**2))
     return dec_round(dist, prec_out, 'down', True)
 
 def nth_largest(n, iter_list):
-    """``O(nlogn)`` time if ``n`` is median. 
-    Better if largest or smallest.
-    
+    """``n`` th largest value of ``iter_list``, the smallest if ``n`` is past
+    the end. ``O(n)`` time for any ``n`` with ``np.partition``.
+
     Notes
     -----
     Adopted and/or modified from reference(s):
     FogleBird on stackoverflow.com/questions/1034846/
     """
-    length = len(iter_list)
-    if n >= length:
-        return heapq.nlargest(length, iter_list)[-1]
-    return heapq.nlargest(n, iter_list)[-1]
-
-# OS utilities
-def prevent_file_collision(fullpath, cnt=None):
-    f_dir, nameext = os.path.split(fullpath)
-    name, ext = os.path.splitext(nameext)
-    if not cnt:
-        cnt = 1
-    new_path = fullpath
-    while os.path.isfile(new_path):
-        cnt += 1
-        new_name = name+'({}){}'.format(cnt, ext)
-        new_path = os.path.join(f_dir, new_name)
-        print('Export file collision. Renaming file.')
-        print('Export file is now: ', os.path.basename(new_path))
-    return new_path
-
-# Collecting files in OS path
-def dict_of_files_in_path(fpath, string1, string2):
-    """
-    Recursive search for all '.txt' files in ``fpath`` and split 
-    into two lists if file base name contains ``string1`` or ``string2``.
-    """
-    string1_list = list()
-    string2_list = list()
-    for file in glob(os.path.join(fpath, '**/*.txt'),
-                     recursive=True):
-        file_base = os.path.basename(file)
-        # Check if 'string1' in basename.
-        if string1 in file_base:
-            string1_list.append(file)
-        # Check if 'string2' in basename.
-        elif string2 in file_base:
-            string2_list.append(file)
-    return {'{}'.format(string1): string1_list,
-            '{}'.format(string2): string2_list}
+    ar = np.asarray(iter_list)
+    kth = len(ar)-min(n, len(ar))
+    value = np.partition(ar, kth)[kth]
+    return value.item() if isinstance(value, np.generic) else value
+
+def windowed_argmax(ar, starts, stops, order=None):
+    """
+    Index of the maximum of ``ar`` in many windows at once. Windows are the
+    slices ``[starts[k]:stops[k]]`` of ``ar[order]`` (or of ``ar`` if
+    ``order`` is None) and may overlap. NaNs are skipped and ties resolve to
+    the smallest index into ``ar``, matching ``pd.Series.idxmax``. A 2-D
+    ``ar`` is searched column by column in the same pass.
+
+    Parameters
+    ----------
+    ar: np.array
+        1-D values, or 2-D values with one series per column.
+    starts, stops: array-like
+        Window bounds, e.g. from ``np.searchsorted`` on a sorted key.
+    order: np.array (default: None)
+        Permutation of ``ar`` the windows index into, e.g. an argsort.
+
+    Returns
+    -------
+    np.array : int64 indexes into ``ar``, -1 for empty or all-NaN windows,
+        shaped (windows,) or (windows, columns) for a 2-D ``ar``.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.clip(np.asarray(stops, dtype=np.int64)-starts, 0, None)
+    out = np.full((len(starts),)+ar.shape[1:], -1, dtype=np.int64)
+    full = np.flatnonzero(lengths)
+    if not len(full):
+        return out
+    lens = lengths[full]
+    offsets = np.cumsum(lens)-lens
+    # Expand every window to its element positions in one array.
+    idx = np.repeat(starts[full]-offsets, lens)+np.arange(lens.sum())
+    if order is not None:
+        idx = np.asarray(order)[idx]
+    vals = ar[idx]
+    wmax = np.fmax.reduceat(vals, offsets, axis=0)
+    is_max = vals == np.repeat(wmax, lens, axis=0)
+    pos = idx.reshape((-1,)+(1,)*(ar.ndim-1))
+    first = np.minimum.reduceat(np.where(is_max, pos, len(ar)), offsets,
+                                axis=0)
+    out[full] = np.where(first < len(ar), first, -1)
+    return out
+
+def pass_segments(values, hysteresis, block=1024):
+    """
+    Split a back-and-forth track into passes at its turnarounds. Like a
+    Schmitt trigger, the track keeps its direction until the position comes
+    back ``hysteresis`` from the running extreme of the pass, so GPS jitter
+    and stops shorter than that do not split a pass however many short runs
+    they make. Each pass ends at the extreme position, which starts the
+    next pass in the other direction.
+
+    Parameters
+    ----------
+    values : np.array
+        Positions along the axis of travel.
+    hysteresis : float
+        Distance a track must travel back before a turnaround counts.
+    block : int (default: 1024)
+        Rows searched at a time for the next turnaround, doubled until one
+        is found, so each row is scanned about once.
+
+    Returns
+    -------
+    tuple : (starts, stops) arrays of the row range of each pass, in order,
+        for zero-copy slices ``values[start:stop]``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    # The first direction is the first to move ``hysteresis`` (or at all,
+    # if not positive) from the running extreme in the other direction.
+    with np.errstate(invalid='ignore'):
+        rise = values-np.fmin.accumulate(values)
+        fall = np.fmax.accumulate(values)-values
+    up, down = [np.flatnonzero((d >= hysteresis) & (d > 0.))[:1]
+                for d in (rise, fall)]
+    if not len(up) and not len(down):
+        return np.array([0]), np.array([n])
+    sign = 1. if len(up) and (not len(down) or up[0] < down[0]) else -1.
+    stops = []
+    first = 0
+    while True:
+        # Running extreme of the pass from ``first``, carried across blocks.
+        best, best_i = sign*values[first], first
+        pos, size, turn = first, block, None
+        while pos < n and turn is None:
+            seg = sign*values[pos:pos+size]
+            run = np.fmax.accumulate(np.r_[best, seg])[1:]
+            with np.errstate(invalid='ignore'):
+                back = run-seg
+                hit = np.flatnonzero((back >= hysteresis) & (back > 0.))
+            stop = hit[0]+1 if len(hit) else len(seg)
+            ext = np.nanargmax(seg[:stop]) if np.isfinite(
+                    seg[:stop]).any() else 0
+            if seg[ext] > best:
+                best, best_i = seg[ext], pos+ext
+            if len(hit):
+                turn = best_i
+            pos += size
+            size *= 2
+        if turn is None:
+            break
+        stops.append(turn+1)
+        first = turn
+        sign = -sign
+    starts = np.r_[0, stops].astype(np.int64)
+    return starts, np.r_[stops, n].astype(np.int64)
+
+class RunningMoments(object):
+    """
+    Count, mean, sum of squared deviations (M2), min and max of several
+    variables, updated one block of rows at a time. Each block is reduced
+    with numpy and merged with the parallel form of Welford's algorithm
+    (Chan et al.), so a long recording never needs to be held in memory.
+    NaNs are skipped.
+
+    Parameters
+    ----------
+    nvars: int
+        Number of variables, one per column of the updates.
+    """
+    def __init__(self, nvars):
+        self.count = np.zeros(nvars)
+        self.mean = np.zeros(nvars)
+        self.m2 = np.zeros(nvars)
+        self.min = np.full(nvars, np.nan)
+        self.max = np.full(nvars, np.nan)
+
+    def __repr__(self):
+        return "<RunningMoments: %d vars, %d max count>"%(
+            len(self.count), self.count.max() if len(self.count) else 0)
+
+    def update(self, values):
+        """Add the rows of 2-D ``values``, one column per variable."""
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        count = finite.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(finite, values, 0.).sum(axis=0)/count
+            dev = np.where(finite, values-mean, 0.)
+        other = RunningMoments(len(count))
+        other.count = count
+        other.mean = np.where(count > 0, mean, 0.)
+        other.m2 = np.einsum('ij,ij->j', dev, dev)
+        with warnings.catch_warnings():
+            # All-NaN columns give NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            other.min = np.nanmin(values, axis=0) if len(values) else \
+                other.min
+            other.max = np.nanmax(values, axis=0) if len(values) else \
+                other.max
+        self.merge(other)
+        return
+
+    def merge(self, other):
+        """Combine with the moments of ``other`` in place."""
+        count = self.count+other.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = other.mean-self.mean
+            ratio = np.where(count > 0, other.count/count, 0.)
+        self.mean = self.mean+delta*ratio
+        self.m2 = self.m2+other.m2+delta*delta*self.count*ratio
+        self.count = count
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return
+
+    def remove(self, other):
+        """Take out the moments of ``other``, merged earlier, in place. The
+        min and max are left as they were."""
+        count = self.count-other.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, (self.count*self.mean -
+                                        other.count*other.mean)/count, 0.)
+            delta = other.mean-mean
+            m2 = self.m2-other.m2-delta*delta*count*other.count/self.count
+        self.count = count
+        self.mean = mean
+        # Clip the rounding left when every value is taken out.
+        self.m2 = np.where(count > 1, np.maximum(m2, 0.), 0.)
+        return
+
+    def variance(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > ddof, self.m2/(self.count-ddof),
+                            np.nan)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with relative accuracy ``rel_accuracy``, in
+    the style of DDSketch. Values are counted in logarithmic buckets
+    ``ceil(log(|x|)/log(gamma))`` on each side of zero, so any quantile is
+    within ``rel_accuracy`` of a true value in the data. Memory grows with
+    the log of the value range, not with the number of values.
+
+    Parameters
+    ----------
+    rel_accuracy: float (default: 0.005)
+    """
+    def __init__(self, rel_accuracy=.005):
+        self.rel_accuracy = rel_accuracy
+        self.gamma = (1.+rel_accuracy)/(1.-rel_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # Smallest magnitude with its own bucket, smaller counts as zero.
+        self.min_value = 1e-9
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def __repr__(self):
+        return "<QuantileSketch: %d values, %d buckets>"%(
+            self.count, len(self.positive)+len(self.negative)+1)
+
+    def update(self, values):
+        """Add the finite values of ``values``."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        mag = np.abs(values)
+        small = mag < self.min_value
+        self.zero += int(np.count_nonzero(small))
+        for store, side in [(self.positive, values > 0.),
+                            (self.negative, values < 0.)]:
+            side &= ~small
+            keys, counts = np.unique(np.ceil(np.log(mag[side]) /
+                                             self._log_gamma).astype(np.int64),
+                                     return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0)+count
+        self.count += len(values)
+        return
+
+    def merge(self, other):
+        """Add the counts of ``other``, a sketch of the same accuracy."""
+        for store, other_store in [(self.positive, other.positive),
+                                   (self.negative, other.negative)]:
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0)+count
+        self.zero += other.zero
+        self.count += other.count
+        return
+
+    def buckets(self):
+        """(values, counts) of every bucket in ascending value order."""
+        neg = sorted(self.negative, reverse=True)
+        pos = sorted(self.positive)
+        keys = np.array(neg+pos, dtype=np.float64)
+        values = 2.*np.power(self.gamma, keys)/(self.gamma+1.)
+        values[:len(neg)] *= -1.
+        counts = np.array([self.negative[k] for k in neg]+[self.positive[k]
+                                                           for k in pos],
+                          dtype=np.int64)
+        # Zero bucket between the negative and positive buckets.
+        values = np.insert(values, len(neg), 0.)
+        counts = np.insert(counts, len(neg), self.zero)
+        return values, counts
+
+    def quantile(self, q):
+        """Value at quantile ``q`` (scalar or array in [0, 1]), NaN if
+        empty."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.count:
+            return np.full(q.shape, np.nan)
+        values, counts = self.buckets()
+        rank = np.floor(q*(self.count-1))
+        return values[np.searchsorted(np.cumsum(counts), rank, side='right')]
+
+    def count_outside(self, low, high):
+        """Number of values below ``low`` or above ``high``."""
+        values, counts = self.buckets()
+        return int(counts[(values < low) | (values > high)].sum())
+
+# Spatial indexing
+class PointGridIndex(object):
+    """
+    Uniform grid index over a fixed set of 2-D points, e.g. the IVS seeds.
+    Built once, then queried with whole tracks of survey points.
+
+    Parameters
+    ----------
+    x, y: array-like
+        Coordinates of the indexed points.
+    cell_size: float
+        Grid cell edge length. Queries are cheapest when the search radius
+        is close to ``cell_size``. A size that is not positive, e.g. from a
+        lane width of 0, makes one cell over all the points.
+    """
+    def __init__(self, x, y, cell_size):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.valid = np.isfinite(self.x) & np.isfinite(self.y)
+        self._x0 = np.min(self.x[self.valid]) if self.valid.any() else 0.
+        self._y0 = np.min(self.y[self.valid]) if self.valid.any() else 0.
+        self.cell_size = float(cell_size)
+        if not self.cell_size > 0.:
+            extent = [np.ptp(v[self.valid]) for v in (self.x, self.y)
+                      if self.valid.any()]
+            self.cell_size = max(extent+[1.])
+        self._ix = np.zeros(len(self.x), dtype=np.int64)
+        self._iy = np.zeros(len(self.y), dtype=np.int64)
+        self._ix[self.valid] = self._cells(self.x[self.valid], self._x0)
+        self._iy[self.valid] = self._cells(self.y[self.valid], self._y0)
+        self._nx = int(self._ix.max())+1 if len(self.x) else 1
+        self._ny = int(self._iy.max())+1 if len(self.y) else 1
+
+    def _cells(self, v, v0):
+        with np.errstate(invalid='ignore'):
+            return np.floor((v-v0)/self.cell_size).astype(np.int64)
+
+    def points_within(self, qx, qy, radius):
+        """
+        Flag indexed points with at least one query point at a distance
+        ``0 < d < radius``. Distances are computed exactly as
+        ``sqrt((qx-x)**2+(qy-y)**2)``, so only candidates from neighbouring
+        cells are measured.
+
+        Parameters
+        ----------
+        qx, qy: np.array
+            Query point coordinates, e.g. a full survey track.
+        radius: float
+            Search radius.
+
+        Returns
+        -------
+        np.array : boolean mask aligned with the indexed points.
+        """
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        hits = np.zeros(len(self.x), dtype=bool)
+        if not len(qx) or not self.valid.any():
+            return hits
+        reach = int(math.ceil(radius/self.cell_size))
+        # Clip query cells to one cell beyond the reach of any indexed point
+        # so the keys stay bounded; clipped cells never match a neighbour.
+        lo = -reach-1
+        qix = np.clip(self._cells(qx, self._x0), lo, self._nx+reach)
+        qiy = np.clip(self._cells(qy, self._y0), lo, self._ny+reach)
+        width = self._ny+2*reach+2
+        keys = (qix-lo)*width+(qiy-lo)
+        order = np.argsort(keys, kind='mergesort')
+        skeys = keys[order]
+        for i in np.flatnonzero(self.valid):
+            # Neighbouring cells along y are contiguous keys for each column.
+            cols = np.arange(self._ix[i]-reach, self._ix[i]+reach+1)-lo
+            first = cols*width+(self._iy[i]-reach-lo)
+            start = np.searchsorted(skeys, first, side='left')
+            stop = np.searchsorted(skeys, first+2*reach, side='right')
+            near = np.concatenate([order[a:b] for a, b in zip(start, stop)])
+            if not len(near):
+                continue
+            dx = np.square(np.subtract(qx[near], self.x[i]))
+            dy = np.square(np.subtract(qy[near], self.y[i]))
+            dist = np.sqrt(dx+dy)
+            hits[i] = np.any((dist < radius) & (dist != 0.))
+        return hits
+
+# File caching
+class FileFrameCache(object):
+    """
+    On-disk cache of DataFrames parsed from files, so unchanged files are
+    loaded again without parsing. Each entry is a folder of '.npy' column
+    arrays, loaded memory-mapped and not copied, with text columns stored
+    as integer categorical codes and their names and loaded as
+    ``pd.Categorical``. Entries are keyed by absolute path,
+    size and mtime, and optionally an md5 of the file. Least recently used
+    entries are removed while the cache is larger than ``max_bytes``.
+
+    Parameters
+    ----------
+    cache_dir : str
+    max_bytes : int (default: None, no size cap)
+    content_hash : bool (default: False)
+        Add an md5 of the file to the key, so a file rewritten with the same
+        size and mtime is not loaded stale.
+    """
+    meta_name = 'columns.json'
+
+    def __init__(self, cache_dir, max_bytes=None, content_hash=False):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.evict()
+
+    def __repr__(self):
+        return "<FileFrameCache: %s>"%self.cache_dir
+
+    def key(self, path):
+        """Cache key of file ``path`` as it is on disk now."""
+        stat = os.stat(path)
+        parts = [os.path.abspath(path), str(stat.st_size),
+                 str(stat.st_mtime_ns)]
+        if self.content_hash:
+            parts.append(file_md5(path))
+        return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def load(self, path):
+        """DataFrame parsed from ``path`` if cached, otherwise None."""
+        entry = os.path.join(self.cache_dir, self.key(path))
+        meta_path = os.path.join(entry, self.meta_name)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            columns = {}
+            for i, col in enumerate(meta['columns']):
+                values = np.load(os.path.join(entry, '{}.npy'.format(i)),
+                                 mmap_mode='r')
+                names = meta['categories'].get(str(i))
+                if names is not None:
+                    # Code -1 is missing. The codes stay memory-mapped.
+                    values = pd.Categorical.from_codes(values, names)
+                columns[col] = values
+            os.utime(meta_path)  # Mark the entry as recently used.
+        except (OSError, ValueError, KeyError):
+            return None
+        # Not copied into one consolidated block, so the numeric columns
+        # stay backed by the memory-mapped files.
+        return pd.DataFrame(columns, columns=meta['columns'], copy=False)
+
+    def store(self, path, df):
+        """Cache DataFrame ``df`` parsed from ``path``, then evict entries
+        over the size cap. Returns False if ``df`` could not be stored."""
+        entry = os.path.join(self.cache_dir, self.key(path))
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        meta = {'path': os.path.abspath(path), 'columns': list(df.columns),
+                'categories': {}}
+        try:
+            for i in range(len(df.columns)):
+                values = df.iloc[:, i].values
+                if values.dtype == object:
+                    codes, names = pd.factorize(values, sort=False)
+                    meta['categories'][str(i)] = names.tolist()
+                    # Codes in the dtype ``pd.Categorical`` uses, so loading
+                    # does not convert them.
+                    values = pd.Categorical.from_codes(codes, names).codes
+                np.save(os.path.join(tmp, '{}.npy'.format(i)), values)
+            with open(os.path.join(tmp, self.meta_name), 'w') as f:
+                json.dump(meta, f)
+            # Publish the entry whole, so readers never see a partial one.
+            os.rename(tmp, entry)
+        except (OSError, TypeError, ValueError):
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """List of (last use time, bytes, folder) of every entry."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                used = os.stat(os.path.join(entry, self.meta_name)).st_mtime
+                size = sum(e.stat().st_size for e in os.scandir(entry))
+            except OSError:
+                continue
+            entries.append((used, size, entry))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until within ``max_bytes``."""
+        if self.max_bytes is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        return
+
+class MemoryFrameCache(object):
+    """
+    In-memory cache of DataFrames parsed from files, for a process that
+    runs many times such as the worker service. Entries are keyed by
+    ``file_signature``, or by the key of the ``backing`` FileFrameCache,
+    which files not in memory are loaded from and stored to. Least recently
+    used entries are dropped while the frames take more than ``max_bytes``.
+    Pickled copies, e.g. for pool workers, are empty.
+
+    Parameters
+    ----------
+    max_bytes : int
+    backing : FileFrameCache (default: None)
+    """
+    def __init__(self, max_bytes, backing=None):
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self.frames = OrderedDict()  # Key to (DataFrame, bytes).
+        self.nbytes = 0
+
+    def __repr__(self):
+        return "<MemoryFrameCache: %d frames, %d bytes%s>"%(
+            len(self.frames), self.nbytes,
+            '' if self.backing is None else ', %s'%self.backing.cache_dir)
+
+    def __getstate__(self):
+        return {'max_bytes': self.max_bytes, 'backing': self.backing,
+                'frames': OrderedDict(), 'nbytes': 0}
+
+    def key(self, path):
+        if self.backing is not None:
+            return self.backing.key(path)
+        return file_signature(path)
+
+    def load(self, path):
+        """DataFrame parsed from ``path`` if cached, otherwise None."""
+        key = self.key(path)
+        if key in self.frames:
+            self.frames.move_to_end(key)
+            return self.frames[key][0].copy(deep=False)
+        df = None if self.backing is None else self.backing.load(path)
+        if df is not None:
+            self.keep(key, df)
+        return df
+
+    def store(self, path, df):
+        """Cache DataFrame ``df`` parsed from ``path``, in memory and in the
+        backing cache. Returns False if the backing cache could not."""
+        self.keep(self.key(path), df)
+        return self.backing is None or self.backing.store(path, df)
+
+    def keep(self, key, df):
+        """Keep a shallow copy of ``df`` under ``key``, so columns added to
+        ``df`` later are not cached, then drop entries over the cap."""
+        nbytes = int(df.memory_usage(index=True, deep=False).sum())
+        if key in self.frames:
+            self.nbytes -= self.frames.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return
+        self.frames[key] = (df.copy(deep=False), nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self.frames.popitem(last=False)[1][1]
+        return
 
 # Settings
-np.set_printoptions(edgeitems=3, infstr='inf', linewidth=78,
-                    nanstr='nan', precision=4, suppress=False,
-                    threshold=50, formatter=None)
-pd.set_option('expand_frame_repr', True, 'max_seq_items', 40,
-              'max_colwidth', 80, 'precision', 4, 'display.float_format',
-              lambda x: '%.4f'%x)
+def set_display_options():
+    """numpy and pandas console display settings of a command-line run. Not
+    applied on import, so importing the module does not load them."""
+    np.set_printoptions(edgeitems=4, infstr='inf', linewidth=79,
+                        nanstr='nan', precision=4, suppress=False,
+                        threshold=40, formatter=None)
+    pd.set_option('display.expand_frame_repr', True,
+                  'display.max_seq_items', 40, 'display.max_colwidth', 60,
+                  'display.precision', 4,
+                  'display.float_format', lambda x: '%.4f'%x,
+                  'display.max_rows', 10, 'display.chop_threshold', 0.0001)
+    return
 
 if __name__ == '__main__':
     exit(0)
@@ -9,16 +9,14 @@ Copyright (c) Jan 2017 Nicholas Valentour
 """
 import sys
 import os
+import argparse
+import hashlib
+import io
+import time
+import sqlite3
+import threading
 from desert_mirage_lib import *
 
-np.set_printoptions(edgeitems=4, infstr='inf', linewidth=79,
-                    nanstr='nan', precision=4, suppress=False,
-                    threshold=40, formatter=None)
-pd.set_option('expand_frame_repr', True, 'max_seq_items', 40,
-              'max_colwidth', 60, 'precision', 4, 'display.float_format',
-              lambda x: '%.4f'%x, 'display.max_rows', 10,
-              'chop_threshold', 0.0001)
-
 # String parsing functions.
 def parse_date_from_string(list_o_str, min_len=3):
     """Parses 4-digit date by filtering on consecutive numerics of length
@@ -35,23 +33,21 @@ def parse_date_from_string(list_o_str, min_len=3):
         digit_list.append(ds)
     return digit_list
 
-def parse_line_name(pdf, sensor):
+def parse_line_name(line, sensor):
     """
-    Extract rows from DataFrame ``pdf`` with the substring sensor ID ``sensor``
-    present in the column label "Line". Must contain column "Line" in ``pdf``.
+    Metadata of the line named ``line`` for the sensor ID ``sensor``.
 
     Parameters
     ----------
-    pdf : pd.DataFrame
-        DataFrame containing a column 'Line' of line name strings.
+    line : str
+        Line name.
     sensor : str
-        Substring ID for inclusive filtering rows in ``pdf``.
+        Sensor ID the line was matched to, see ``sensor_line_match``.
 
     Returns
     -------
-    pd.DataFrame : pd.DataFrame
-        ``pdf`` with additional columns 'Sensor_ID', 'FileName', 'TestID',
-        'AM_PM', and 'Date'.
+    dict : dict
+        Keys 'Sensor_ID', 'Filename', 'TestID', 'AM_PM', and 'Date'.
 
     Notes
     -----
@@ -68,25 +64,85 @@ def parse_line_name(pdf, sensor):
     #. `a` - Alpha char to distinguish opening/closing or am/pm tests, [ap]{1}.
     #. `SN` - Sensor ID `sensor`. Differs by array type.
     """
-    df1 = pdf.copy()
-    # Only Towed Array lines can end in a numeric.
-    if any(df1.Line.str.endswith(
-            sensor)) and _jGUI.SurveyType != 'Single Coil':
-        print('Identified towed array line data.')
-        df1['Sensor_ID'] = ['{}'.format(sensor)]*len(df1.index)
-        df1['FileName'] = df1['Line']
-        df1['TestID'] = [_jGUI.IvsID]*len(df1.index)
-        df1['AM_PM'] = pd.Series(df1.Line.str[-4:-3]+'m').str.upper()
-        df1['Date'] = parse_date_from_string(df1.Line.values, min_len=4)
-        return df1
-
-    print('Identified single coil line data.')
-    df1['Sensor_ID'] = [sensor]*len(df1.index)
-    df1['Filename'] = df1['Line']
-    df1['TestID'] = [_jGUI.IvsID]*len(df1.index)
-    df1['AM_PM'] = pd.Series(df1.Line.str[-1:]+'m').str.upper()
-    df1['Date'] = parse_date_from_string(df1.Line.values, min_len=4)
-    return df1
+    if line not in _lineMetadata:
+        update_line_metadata([line])
+    meta = _lineMetadata[line]
+    return {'Sensor_ID': sensor, 'Filename': line, 'TestID': _jGUI.IvsID,
+            'AM_PM': meta['AM_PM'], 'Date': meta['Date']}
+
+def line_name_patterns(test_id):
+    """
+    Precompiled regexes of the line name conventions in ``parse_line_name``
+    for the test id regex ``test_id`` (json 'IvsID').
+
+    Returns
+    -------
+    dict : 'Towed Array' and 'Single Coil' to compiled pattern. Named groups
+        'Head' and 'Tail' are the [*] slots, 'AmPm' is `a`, 'MMDD' the
+        single-coil date and 'SN' the towed-array sensor id.
+    """
+    return {'Towed Array': re.compile(
+                r'^L(?P<Head>\w*?)(?:{})(?P<Tail>\w*?)(?P<AmPm>[A-Za-z])_'
+                r'(?P<SN>\d{{2}})$'.format(test_id)),
+            'Single Coil': re.compile(
+                r'^L(?P<Head>\w*?)(?:{})(?P<MMDD>\d{{4}})(?P<Tail>\w*?)'
+                r'(?P<AmPm>[A-Za-z])$'.format(test_id))}
+
+def parse_line_names(names, patterns=None):
+    """
+    Metadata of every unique line name in ``names``, parsed with
+    ``str.extract`` once per name rather than once per row.
+
+    Parameters
+    ----------
+    names : iterable
+        Line names, e.g. ``LineIndex.names``.
+    patterns : dict (default: run patterns from ``line_name_patterns``)
+
+    Returns
+    -------
+    pd.DataFrame : one row per unique name with columns 'Line', 'Array'
+        (convention matched, '' if none), 'SN', 'AM_PM', 'Date' ('MM/DD'),
+        'Month' and 'Day'.
+
+    Notes
+    -----
+    Names matching neither convention keep the former rules: `a` is the last
+    character and the date is the last 4 digits of the first run of at least
+    4 digits.
+    """
+    if patterns is None:
+        patterns = _linePatterns
+    lines = pd.Series(pd.unique(np.asarray(names, dtype=object)),
+                      dtype=object).astype(str)
+    towed = lines.str.extract(patterns['Towed Array'])
+    single = lines.str.extract(patterns['Single Coil'])
+    is_towed = towed['SN'].notna()
+    is_single = single['AmPm'].notna() & ~is_towed
+    am_pm = towed['AmPm'].where(is_towed, single['AmPm'])
+    am_pm = am_pm.fillna(lines.str[-1:])
+    mmdd = single['MMDD'].where(is_single, lines.str.extract(
+            r'(\d{4,})', expand=False).str[-4:])
+    return pd.DataFrame({
+            'Line': lines,
+            'Array': pd.Categorical(np.select(
+                    [is_towed, is_single], ['Towed Array', 'Single Coil'], ''),
+                    categories=['', 'Single Coil', 'Towed Array']),
+            'SN': towed['SN'],
+            'AM_PM': (am_pm+'m').str.upper().astype('category'),
+            'Date': mmdd.str[:2]+'/'+mmdd.str[2:],
+            'Month': pd.to_numeric(mmdd.str[:2]).astype('Int8'),
+            'Day': pd.to_numeric(mmdd.str[2:]).astype('Int8')})
+
+def update_line_metadata(names):
+    """Parse the line ``names`` not yet in ``_lineMetadata`` and add them."""
+    new = [name for name in pd.unique(np.asarray(names, dtype=object))
+           if name not in _lineMetadata]
+    if new:
+        meta = parse_line_names(new)
+        meta.index = new
+        _lineMetadata.update(meta.to_dict('index'))
+    return
 
 def subset_col_ending_id_string(unique_col_entries, id_string=None):
     """
@@ -122,143 +178,490 @@ def subset_col_ending_id_string(unique_col_entries, id_string=None):
 
 # Basic stats
 def static_test_ptp(ch, thr):
-    """Static test peak to peak.
+    """Static test peak to peak. The max and min of ``ch`` are trimmed in
+    pairs until its peak to peak is within threshold ``thr``, counted from
+    one sort with ``symmetric_trim_count``.
+
     Returns
     -------
-    float : Percent of values in `ch` exceeding threshold `thr`.
+    float : One minus the trimmed values over the values left.
     """
-    exceedances = 0.
-    if np.ptp(ch)[0] > thr:
-        while np.ptp(ch)[0] > thr:
-            ch.pop(ch.max())
-            exceedances += 1.
-            ch.pop(ch.min())
-            exceedances += 1.
-        exceedances /= len(ch.values)
-        return 1.-exceedances
-    return 1.
+    values = np.sort(np.asarray(ch, dtype=np.float64).ravel())
+    trimmed = 2*int(symmetric_trim_count(values, thr))
+    if not trimmed:
+        return 1.
+    return 1.-trimmed/(len(values)-trimmed)
+
+def trimmed_mean_std(values, thr):
+    """Mean and standard deviation of each column of ``values`` after
+    trimming the max and min in pairs until the peak to peak is within
+    ``thr``, see ``symmetric_trim_count``.
+
+    Parameters
+    ----------
+    values : np.array
+        2-D values, one series per column.
+    thr : np.array
+        Peak to peak threshold of each column.
+
+    Returns
+    -------
+    tuple : (mean, std) arrays, NaN for columns without enough values.
+    """
+    srt = np.sort(values, axis=0)
+    n = len(srt)
+    k = symmetric_trim_count(srt, thr)
+    rank = np.arange(n)[:, None]
+    keep = (rank >= k) & (rank < n-k)
+    count = n-2*k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(keep, srt, 0.).sum(axis=0)/count
+        dev = np.where(keep, srt-mean, 0.)
+        std = np.sqrt(np.einsum('ij,ij->j', dev, dev)/(count-1))
+    return mean, std
 
 
 # IVS data processing functions
-def dynamic_response_dict(track, first_pass_bool, aseed_series):
-    """Process ``track`` data for the seed described by ``aseed_series``. If this
-    is the first pass the string '_fwd' will be appended to the output line,
-    otherwise '_bck' will be appended.
+def track_pass_peaks(axis_values, rsp_values, seed_locs, radius):
+    """Peak response of one track pass for every seed at once. The pass is
+    sorted once along the major axis and each seed window
+    ``[seedloc-radius, seedloc+radius]`` is found with ``np.searchsorted``.
+
+    Parameters
+    ----------
+    axis_values : np.array
+        Major axis positions of the pass.
+    rsp_values : np.array
+        Response channel values of the pass, one column per channel if 2-D.
+    seed_locs : np.array
+        Seed positions along the major axis.
+    radius : float
+        Mask radius around each seed.
+
+    Returns
+    -------
+    np.array : position of the peak in the pass for each seed (and channel),
+        -1 if the seed window holds no data.
+    """
+    order = np.argsort(axis_values, kind='mergesort')
+    sorted_axis = axis_values[order]
+    starts = np.searchsorted(sorted_axis, seed_locs-radius, side='left')
+    stops = np.searchsorted(sorted_axis, seed_locs+radius, side='right')
+    return windowed_argmax(rsp_values, starts, stops, order)
+
+def relative_diff(num1, num2):
+    """Defined as absolute difference divided by maximum absolute value.
+
+    Parameters
+    ----------
+    num1 : numeric or np.array
+    num2 : numeric or np.array
+    """
+    return np.abs(np.abs(num1)-np.abs(num2))/np.maximum(np.abs(num1),
+                                                        np.abs(num2))
+
+def ivs_acceptance_masks(fwd_rsp, bck_rsp, single_coil):
+    """Select the fwd and bck peaks to report for arrays of paired passes.
+
+    Parameters
+    ----------
+    fwd_rsp : np.array
+    bck_rsp : np.array
+    single_coil : bool
+
+    Returns
+    -------
+    tuple : boolean masks (fwd, bck) shaped like ``fwd_rsp``.
+    """
+    # Check for tracks that do not pass the same test item on each pass.
+    # Threshold logic is hard-coded. Relative diff 50% and min resp 20mV.
+    # TODO: 2. Add rel diff and min resp fields to json.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        both = (relative_diff(fwd_rsp, bck_rsp) < .5) & (fwd_rsp > 20) \
+               & (bck_rsp > 20)
+    if single_coil:
+        return both, both.copy()
+    # If Towed Array then geometry flips on backward track.
+    fwd_only = ~both & (fwd_rsp > bck_rsp) & (fwd_rsp > 20)
+    bck_only = ~both & (bck_rsp > fwd_rsp) & (bck_rsp > 20)
+    return both | fwd_only, both | bck_only
+
+@run_stats.timed()
+def line_peak_responses(track):
+    """Peak response of every pass of one IVS line for every seed in the
+    seed csv. The line is split into passes at its turnarounds along the
+    major axis with ``pass_segments``, with a hysteresis of the seed window
+    width ``2*MASK_RADIUS``, and each pass is searched as a slice of the
+    line arrays. The response channels are searched together as one 2-D
+    block.
 
     Parameters
     ----------
     track : pd.DataFrame
-        A pass of the ivs line.
-    first_pass_bool : bool
-        True if first pass of seed item (fwd), False if not (bck).
-    aseed_series : pd.Series
+        All rows of one line.
 
     Returns
     -------
-    ivs table dict : dict
-        keys as USACE MS Access table column names and items as values.
+    dict : arrays shaped (channels, seeds, passes) for the keys
+        'IVS_Response', 'IVS_X', 'IVS_Y', 'Offset' and 'IVS_Noise', with
+        channels in ``_responseChannels`` order. Passes alternate fwd and
+        bck, padded with an empty pass to an even number. Passes without
+        data near a seed have a zero response and NaN position and offset.
+        'IVS_Noise' is the ``line_noise`` of each channel.
     """
-    seed_name = aseed_series.Test_Item_ID.values[0]
-    truex = aseed_series.TrueX.values[0]
-    truey = aseed_series.TrueY.values[0]
+    seedx = _csvSeedDF.TrueX.values
+    seedy = _csvSeedDF.TrueY.values
 
     # Set IVS Major Axis and measurement system.
-    seedloc = truey
+    seedloc = seedy
     if _jGUI.MajorAxis == 'X':
-        seedloc = truex
-
-    # Mask data outside radius from true seed along major axis.
-    distal_mask = (track[_jGUI.MajorAxis] >= seedloc-MASK_RADIUS) \
-                  & (track[_jGUI.MajorAxis] <= seedloc+MASK_RADIUS)
-    proximal_data = track.loc[distal_mask, :]
+        seedloc = seedx
+    axis_values = track[_jGUI.MajorAxis].values.astype(np.float64)
+    # Response channel block shaped (rows, channels).
+    rsp_values = np.stack([track[ch].values for ch in _responseChannels],
+                          axis=1).astype(np.float64)
+    nchannels = rsp_values.shape[1]
+
+    # Peak row positions in ``track`` shaped (channels, seeds, passes).
+    starts, stops = pass_segments(axis_values, 2*MASK_RADIUS)
+    peaks = np.full((nchannels, len(seedloc), len(starts)+len(starts) % 2),
+                    -1, np.int64)
+    for k, (first, last) in enumerate(zip(starts, stops)):
+        if last > first:
+            peak = track_pass_peaks(axis_values[first:last],
+                                    rsp_values[first:last], seedloc,
+                                    MASK_RADIUS)
+            peaks[..., k] = np.where(peak >= 0, peak+first, -1).T
 
     # Max amplitude near seed info.
-    peak_index = proximal_data[_jGUI.ResponseChannel].idxmax()
-    peak_row = proximal_data.loc[peak_index]
-    peak_rsp = peak_row[_jGUI.ResponseChannel].max()
-    peak_x = peak_row.loc['X']
-    peak_y = peak_row.loc['Y']
+    found = peaks >= 0
+    pos = np.where(found, peaks, 0)
+    channel = np.arange(nchannels)[:, None, None]
+    peak_rsp = np.where(found, rsp_values[pos, channel], 0.)
+    peak_x = np.where(found, track.X.values[pos], np.nan)
+    peak_y = np.where(found, track.Y.values[pos], np.nan)
 
     # Calc the peak response euclid_offset and distance from known seed item.
-    euclid_offset = euclidean_distance(peak_x, peak_y, truex, truey, 4, 2)
-    if euclid_offset >= MASK_RADIUS:
-        peak_rsp = 0.
-    # Additional line info to report.
+    euclid_offset = np.where(found, euclidean_distance(
+            peak_x, peak_y, seedx[:, None], seedy[:, None], 4, 2), np.nan)
+    peak_rsp[euclid_offset >= MASK_RADIUS] = 0.
+
+    # Background noise of the line, the same for every seed and pass.
+    noise = line_noise(track, _responseChannels, seedloc)
+    return {'IVS_Response': peak_rsp, 'IVS_X': peak_x, 'IVS_Y': peak_y,
+            'Offset': euclid_offset,
+            'IVS_Noise': np.broadcast_to(np.round(noise, 3)[:, None, None],
+                                         peaks.shape)}
+
+@run_stats.timed()
+def line_noise(track, channels, seedloc=None):
+    """Background noise of ``channels`` in one line track with
+    ``binned_noise`` over consecutive windows of ``NOISE_WINDOW_ROWS`` rows
+    along the whole line. Windows whose span along the major axis comes
+    closer than ``MASK_RADIUS`` to a seed are left out so seed responses do
+    not count as noise.
+
+    Parameters
+    ----------
+    track : pd.DataFrame
+        All rows of one line.
+    channels : list
+        Data columns, e.g. ['Ch1', 'Ch2', 'Ch3', 'Ch4'].
+    seedloc : np.array (default: None)
+        Seed positions along the major axis, all seeds if None.
+
+    Returns
+    -------
+    np.array : noise of each channel, NaN if the line has no window clear
+        of the seeds.
+    """
+    if seedloc is None:
+        seedloc = _csvSeedDF['True'+_jGUI.MajorAxis].values
+    axis_bins = strided_windows(
+            np.asarray(track[_jGUI.MajorAxis].values, dtype=np.float64),
+            NOISE_WINDOW_ROWS, NOISE_WINDOW_ROWS)
+    locs = np.sort(seedloc[np.isfinite(seedloc)])
+    # A window reaches a seed window if more seed windows start before its
+    # far end than end before its near end.
+    clear = np.searchsorted(locs-MASK_RADIUS, axis_bins.max(axis=-1),
+                            'right') <= \
+        np.searchsorted(locs+MASK_RADIUS, axis_bins.min(axis=-1), 'left')
+    # One channel at a time, with no copy of the track columns.
+    return np.array([binned_noise(track[ch].values, NOISE_WINDOW_ROWS, clear)
+                     for ch in channels])
+
+@run_stats.timed()
+def process_dynamic_response(sensor_lines, seed_mask, channel=None):
+    """Report the dynamic response of the seed items in ``seed_mask`` for the
+    lines of one sensor in one response channel.
+
+    Parameters
+    ----------
+    sensor_lines : list
+        (line metadata, lane mask, line peaks) per line in file order, see
+        ``process_line_track``.
+    seed_mask : np.array
+        Boolean mask of the seed csv rows to report.
+    channel : str (default: None)
+        One of ``_responseChannels``, the first if None.
+
+    Returns
+    -------
+    table dataframe : pd.DataFrame
+        Columns from MS Access Table 'IVS_daily_results_Table'. Rows are
+        ordered by seed, then line, then pass.
+    """
+    seed_names = _csvSeedDF.Test_Item_ID.values[seed_mask]
+    unique_lines = [meta['Filename'] for meta, _, _ in sensor_lines]
+    channel = channel or _responseChannels[0]
+    ci = _responseChannels.index(channel)
+    print('Processing {} in {} ({})'.format(list(seed_names), unique_lines,
+                                            channel))
+
+    # Peak arrays shaped (seeds, fwd and bck pass pairs of every line, 2).
+    nseeds = np.count_nonzero(seed_mask)
+    peak_cols = {key: np.concatenate([
+            peaks[key][ci][seed_mask].reshape(nseeds, -1, 2) for _, _, peaks
+            in sensor_lines], axis=1)
+                 for key in ['IVS_Response', 'IVS_X', 'IVS_Y', 'Offset',
+                             'IVS_Noise']}
+    pair_counts = [peaks['IVS_Response'].shape[-1]//2 for _, _, peaks in
+                   sensor_lines]
+    pair_line = np.repeat(np.arange(len(sensor_lines)), pair_counts)
+    pair_num = np.concatenate([np.arange(n) for n in pair_counts])
+    peak_rsp = peak_cols['IVS_Response']
+    keep = np.stack(ivs_acceptance_masks(peak_rsp[..., 0], peak_rsp[..., 1],
+                                         _jGUI.SurveyType == 'Single Coil'),
+                    axis=-1)
+
+    # Populate Access DB table in seed, line, pass order.
     # TODO: 1. Add ivs track suffix field to json.
-    track_pass = 'bck'
-    if first_pass_bool:
-        track_pass = 'fwd'
-    filename_str = peak_row.loc['Line']+'_'+track_pass
-
-    # Populate dict for Access DB table
-    access_dict = [0, filename_str, peak_row['Date'], peak_row['AM_PM'],
-                   seed_name, peak_row['Sensor_ID'], peak_rsp, peak_x,
-                   peak_y, '', '', euclid_offset, _jGUI.ResponseChannel]
-    dict_keys = _jAccess.IVSDailyResultsTable.Columns
-    return dict(zip(dict_keys, access_dict))
+    si, pi, ki = np.nonzero(keep)
+    li = pair_line[pi]
+    # Passes after the first pair are numbered, e.g. 'fwd2', 'bck2'.
+    track_pass = [('fwd', 'bck')[k]+(str(n+1) if n else '') for k, n in
+                  zip(ki, pair_num[pi])]
+    line_meta = {key: np.array([meta[key] for meta, _, _ in sensor_lines],
+                               dtype=object)[li]
+                 for key in ['Filename', 'Date', 'AM_PM', 'Sensor_ID']}
+    filename_str = [l+'_'+p for l, p in zip(line_meta['Filename'],
+                                            track_pass)]
+    access_cols = [0, filename_str, line_meta['Date'], line_meta['AM_PM'],
+                   seed_names[si], line_meta['Sensor_ID'], peak_rsp[keep],
+                   peak_cols['IVS_X'][keep], peak_cols['IVS_Y'][keep],
+                   peak_cols['IVS_Noise'][keep], '', peak_cols['Offset'][keep],
+                   channel]
+    cols = _jAccess.IVSDailyResultsTable.Columns
+    return pd.DataFrame(dict(zip(cols, access_cols)), columns=cols,
+                        index=np.arange(len(si)))
+
+
+# Static test processing functions
+def static_channels():
+    """(table suffix, data column) of every channel in the json
+    'StaticRepeatabilityTable' columns, e.g. ('CH1', 'Ch1')."""
+    suffixes = [m.group(1) for m in map(
+            re.compile(r'^Static_Response_(CH\d+)$').match,
+            _jAccess.StaticRepeatabilityTable.Columns) if m]
+    return [(sfx, sfx.capitalize()) for sfx in suffixes]
+
+@run_stats.timed()
+def static_line_stats(track, channels):
+    """Background and spike statistics of one static test line. The line is
+    split at the midpoint of the 5th and 95th percentiles of the first
+    response channel, if they are more than ``STATIC_SPIKE_SIGMA`` times the
+    ``windowed_noise`` apart: rows above are the spike, the rest the
+    background. Each segment is trimmed per channel with
+    ``trimmed_mean_std`` to a peak to peak of ``2*STATIC_TRIM_SIGMA`` times
+    the channel noise, dropping the item placement and removal.
 
-def relative_diff(num1, num2):
-    """Defined as absolute difference divided by maximum absolute value.
+    Parameters
+    ----------
+    track : pd.DataFrame
+        All rows of one line.
+    channels : list
+        Data columns, e.g. ['Ch1', 'Ch2', 'Ch3'].
+
+    Returns
+    -------
+    dict : arrays per channel for the keys 'Bkg_Mean', 'Bkg_StdDev',
+        'Spike_Mean' and 'Spike_StdDev', NaN for channels not in ``track``
+        and spike values if no spike was found, and 'Spike' (bool).
+    """
+    found = [ch for ch in channels if ch in track.columns]
+    cols = list(dict.fromkeys([_responseChannels[0]]+found))
+    values = np.stack([track[ch].values for ch in cols],
+                      axis=1).astype(np.float64)
+    values = values[np.isfinite(values).all(axis=1)]
+    noise = windowed_noise(strided_windows(values.T, NOISE_WINDOW_ROWS,
+                                           NOISE_WINDOW_ROWS))
+    level = values[:, 0]
+    spike = np.zeros(len(level), dtype=bool)
+    if len(level):
+        low, high = np.percentile(level, [5., 95.])
+        if high-low > STATIC_SPIKE_SIGMA*noise[0]:
+            spike = level > (low+high)/2.
+    thr = np.nan_to_num(2*STATIC_TRIM_SIGMA*noise, nan=np.inf)
+    out = dict((key, np.full(len(channels), np.nan)) for key in
+               ['Bkg_Mean', 'Bkg_StdDev', 'Spike_Mean', 'Spike_StdDev'])
+    pos = [channels.index(ch) for ch in cols]
+    out['Bkg_Mean'][pos], out['Bkg_StdDev'][pos] = trimmed_mean_std(
+            values[~spike], thr)
+    if spike.any():
+        out['Spike_Mean'][pos], out['Spike_StdDev'][pos] = trimmed_mean_std(
+                values[spike], thr)
+    out['Spike'] = spike.any()
+    return out
+
+@run_stats.timed()
+def process_static_repeatability(static_lines):
+    """Add the 'Static_Repeatability' rows of the static lines of one file
+    in one block. The response is the spike mean less the background mean,
+    and 'Static_Test_Item' is the json static test id the line matched. The
+    percent difference and QC status are left for ``StaticReference.fill``,
+    which compares the response with a fixed expected response once the
+    files of a run are merged.
 
     Parameters
     ----------
-    num1 : numeric
-    num2 : numeric
+    static_lines : list
+        (line metadata, ``static_line_stats``) per static line in file
+        order, see ``process_line_track``.
+
+    Returns
+    -------
+    None : None
     """
-    return abs(abs(num1)-abs(num2))/max(abs(num1), abs(num2))
+    if not static_lines:
+        return
+    suffixes = [sfx for sfx, _ in static_channels()]
+    stats = {key: np.array([line_stats[key] for _, line_stats in
+                            static_lines])
+             for key in ['Bkg_Mean', 'Bkg_StdDev', 'Spike_Mean',
+                         'Spike_StdDev', 'Spike']}
+    meta = {key: np.array([line_meta[key] for line_meta, _ in static_lines],
+                          dtype=object)
+            for key in ['Filename', 'DatasetType', 'Date', 'AM_PM',
+                        'Sensor_ID']}
+    response = stats['Spike_Mean']-stats['Bkg_Mean']
+    rows = {'Filename': meta['Filename'], 'DatasetType': meta['DatasetType'],
+            'Date': meta['Date'], 'AM_PM': meta['AM_PM'],
+            'Static_Test_Item': np.array([line_meta['TestID'] for line_meta,
+                                          _ in static_lines], dtype=object),
+            'Static_Sensor_ID': meta['Sensor_ID'], 'Static_Map_ID': '',
+            'QCStatus': '',
+            'Comment': np.where(stats['Spike'], '', 'No spike found')}
+    for j, sfx in enumerate(suffixes):
+        for key in ['Bkg_Mean', 'Bkg_StdDev', 'Spike_Mean', 'Spike_StdDev']:
+            rows['Static_{}_{}'.format(key, sfx)] = np.round(
+                    stats[key][:, j], 4)
+        rows['Static_Response_'+sfx] = np.round(response[:, j], 4)
+        rows['Static_Response_%Difference_'+sfx] = np.nan
+    _accessTables[_jAccess.StaticRepeatabilityTable.TName].append_rows(rows)
+    print('Static lines processed: {}\n'.format(list(meta['Filename'])))
+    return
+
 
-def process_dynamic_response(ivs_df, seed_series):
-    """Process dynamic response related lines in ``ivs_df`` for seed item data in
-    ``seed_item_series``.
+# Background and cable shake test functions
+def data_channels(track):
+    """Instrument channel columns of ``track``, e.g. ['Ch1', ..., 'Ch4']."""
+    return [col for col in track.columns if re.match(r'^Ch\d+$', col)]
+
+class StreamingChannelStats(object):
+    """
+    Statistics of the channels of one long stationary recording, updated
+    one piece at a time as the file is read: ``RunningMoments`` for the
+    mean, variance, min and max, and a ``QuantileSketch`` per channel for
+    percentiles and spike counts.
 
     Parameters
     ----------
-    ivs_df : pd.DataFrame
-    seed_series : pd.Series
+    channels : list
+        Data columns, e.g. ['Ch1', 'Ch2', 'Ch3', 'Ch4'].
+    """
+    def __init__(self, channels):
+        self.channels = list(channels)
+        self.moments = RunningMoments(len(self.channels))
+        self.sketches = [QuantileSketch() for _ in self.channels]
+
+    def __repr__(self):
+        return "<StreamingChannelStats: %s>"%self.channels
+
+    def update(self, track):
+        """Add the rows of DataFrame ``track``."""
+        values = np.stack([track[ch].values for ch in self.channels],
+                          axis=1).astype(np.float64)
+        self.moments.update(values)
+        for sketch, column in zip(self.sketches, values.T):
+            sketch.update(column)
+        return
+
+    def merge(self, other):
+        """Combine with ``other``, of the same channels, in place."""
+        self.moments.merge(other.moments)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return
+
+    def summary(self, spike_sigma):
+        """
+        Returns
+        -------
+        dict : arrays per channel for the keys 'Samples', 'Mean',
+            'Variance', 'StdDev', 'Min', 'Max', 'P05', 'P50', 'P95' and
+            'Spike_Count', the values further than ``spike_sigma`` standard
+            deviations from the mean.
+        """
+        std = self.moments.std()
+        pct = np.array([sketch.quantile([.05, .5, .95]) for sketch in
+                        self.sketches]).reshape(-1, 3)
+        spikes = [sketch.count_outside(mean-spike_sigma*sd,
+                                       mean+spike_sigma*sd)
+                  for sketch, mean, sd in zip(self.sketches,
+                                              self.moments.mean, std)]
+        return {'Samples': self.moments.count.astype(np.int64),
+                'Mean': self.moments.mean, 'Variance': self.moments.variance(),
+                'StdDev': std, 'Min': self.moments.min,
+                'Max': self.moments.max, 'P05': pct[:, 0], 'P50': pct[:, 1],
+                'P95': pct[:, 2], 'Spike_Count': np.array(spikes)}
+
+@run_stats.timed()
+def process_background_qc(stream_lines):
+    """Add the 'Background_QC' rows of the background and cable shake lines
+    of one file in one block, one row per line, sensor and channel. Lines
+    pass QC without any spike further than ``STREAM_SPIKE_SIGMA`` standard
+    deviations from the channel mean.
+
+    Parameters
+    ----------
+    stream_lines : dict
+        Line name to (sensor metadata, ``StreamingChannelStats``), see
+        ``process_line_track``.
 
     Returns
     -------
-    table dataframe : pd.DataFrame
-        Columns from MS Access Table 'IVS_daily_results_Table'.
+    None : None
     """
-    unique_lines = [i for i in ivs_df.Line.unique()]
-    print('Processing {} in {}'.format(seed_series.Test_Item_ID.values[0],
-                                       unique_lines))
-    df_grp = ivs_df.groupby(['Line'])
-    # Initialize Access database formatted table.
-    cols = _jAccess.IVSDailyResultsTable.Columns
-    access_table = pd.DataFrame(columns=cols)
-    for test_line in unique_lines:
-        test_grp = df_grp.get_group(test_line)
-        midpoint_index = math.floor(len(test_grp.index)/2)
-        fwd_track = test_grp.copy().iloc[:midpoint_index]
-        bck_track = test_grp.copy().iloc[midpoint_index:]
-        fwd_dict = dynamic_response_dict(fwd_track, True, seed_series)
-        bck_dict = dynamic_response_dict(bck_track, False, seed_series)
-        fwd_rsp = fwd_dict['IVS_Response']
-        bck_rsp = bck_dict['IVS_Response']
-        # Check for tracks that do not pass the same test item on each pass.
-        # Threshold logic is hard-coded. Relative diff 50% and min resp 20mV.
-        # TODO: 2. Add rel diff and min resp fields to json.
-        if relative_diff(fwd_rsp, bck_rsp) < .5 and fwd_rsp > 20 \
-                and bck_rsp > 20:
-            access_table = access_table.append(other=fwd_dict,
-                                               ignore_index=True)
-            access_table = access_table.append(other=bck_dict,
-                                               ignore_index=True)
-            continue
-        if _jGUI.SurveyType == 'Single Coil':
-            continue
-        # If Towed Array then geometry flips on backward track.
-        if fwd_rsp > bck_rsp and fwd_rsp > 20:
-            access_table = access_table.append(other=fwd_dict,
-                                               ignore_index=True)
-            continue
-        if bck_rsp > fwd_rsp and bck_rsp > 20:
-            access_table = access_table.append(other=bck_dict,
-                                               ignore_index=True)
-            continue
-    return access_table
+    blocks = []
+    for line, (sensor_meta, line_stats) in stream_lines.items():
+        summary = line_stats.summary(STREAM_SPIKE_SIGMA)
+        for meta in sensor_meta.values():
+            block = {key: np.round(values, 4) for key, values in
+                     summary.items()}
+            block.update(Filename=line, DatasetType=meta['DatasetType'],
+                         Date=meta['Date'], AM_PM=meta['AM_PM'],
+                         Sensor_ID=meta['Sensor_ID'],
+                         Channel=line_stats.channels)
+            blocks.append(pd.DataFrame(block))
+    if not blocks:
+        return
+    qc_table = pd.concat(blocks, ignore_index=True)
+    qc_table['QCStatus'] = np.where(qc_table['Spike_Count'] > 0, 'Fail',
+                                    'Pass')
+    _accessTables[_jAccessQC.TName].append_rows(qc_table)
+    print('Background and cable shake lines processed: {}\n'.format(
+            list(stream_lines)))
+    return
 
 
 # Seed item functions.
@@ -329,18 +732,25 @@ def set_ivs_seed_geometry(seed_table):
             seed_table.at[i, 'Inclination'] = 0
         return seed_table
 
+@run_stats.timed()
 def seeds_within_lanewidth(atrack, thresh):
-    xtrue = _csvSeedDF.TrueX.values
-    ytrue = _csvSeedDF.TrueY.values
-    slist = []
-    for i, (xt, yt) in enumerate(zip(xtrue, ytrue)):
-        dx = np.square(np.subtract(atrack.X.values, xt))
-        dy = np.square(np.subtract(atrack.Y.values, yt))
-        count_data = np.count_nonzero(
-                [i for i in np.sqrt(dx+dy) if i < thresh])
-        if count_data:
-            slist.append(_csvSeedDF.Test_Item_ID.values[i])
-    return slist
+    """Seeds with any ``atrack`` point closer than ``thresh``.
+
+    Parameters
+    ----------
+    atrack : pd.DataFrame
+        Track data with columns 'X' and 'Y'.
+    thresh : float
+        Lane half-width.
+
+    Returns
+    -------
+    np.array : boolean mask of the seed csv rows.
+    """
+    lane = _seedIndex.points_within(atrack.X.values, atrack.Y.values, thresh)
+    run_stats.count('seeds evaluated', len(lane))
+    run_stats.count('seeds in lane', np.count_nonzero(lane))
+    return lane
 
 
 # File collection and exporting.
@@ -356,11 +766,57 @@ def collect_files_in_directory(dfolder=None, fpattern=None):
     print('Processing files: {} \n'.format(base_name_list))
     return file_list
 
-def export_access_table(tbl_df, atable_name):
+def access_table_keys(atable_name):
+    """
+    Duplicate-check columns and key column of a supported Access table.
+
+    Returns
+    -------
+    tuple : (chk_cols, id_col, id_start)
+        ``chk_cols`` is a list of columns, None for all columns, or an empty
+        list if the table is not deduplicated. ``id_col`` is numbered from
+        ``id_start`` in row order, or None.
+    """
+    if all([item in atable_name for item in ['Standard', 'Values']]):
+        return ['Test_Item_ID', 'Sensor_ID', 'Primary_Analysis_Channel'], \
+            'Project_ID', 2000.
+    if all([item in atable_name for item in ['daily', 'result']]):
+        return ['Filename', 'Date', 'AM_PM', 'Test_Item_ID', 'Sensor_ID',
+                'Primary_Analysis_Channel'], 'OID', 1000.
+    if all([item in atable_name for item in ['Seed', 'Test', 'Item']]):
+        return None, None, None
+    if 'Static' in atable_name:
+        return ['Filename', 'Date', 'AM_PM', 'Static_Sensor_ID'], 'OID', 3000.
+    if 'QC' in atable_name:
+        return ['Filename', 'Date', 'AM_PM', 'Sensor_ID', 'Channel'], 'OID', \
+            4000.
+    return [], None, None
+
+def access_table_replaces(atable_name):
+    """True if rows of table ``atable_name`` replace exported rows with the
+    same duplicate-check columns, instead of being dropped as duplicates."""
+    return all([item in atable_name for item in ['Standard', 'Values']])
+
+def access_table_dir():
+    """Create if needed and return the 'AccessTables' export folder."""
+    access_dir = os.path.join(_access_folder, "AccessTables")
+    if not os.path.exists(access_dir):
+        os.makedirs(access_dir)
+    return access_dir
+
+@run_stats.timed()
+def export_access_table(tbl_df, atable_name, retract_rows=None,
+                        restore_rows=None, drop_keys=None):
     """
     Exports the ``tbl_df`` as a csv formatted to match USACE MS Access tables.
     Export location is a new folder in the local directory one level above the
     location of this file. See global script variable '_access_folder'.
+    Existing rows whose ``access_row_texts`` are in set ``retract_rows`` are
+    removed first, and rows in list ``restore_rows`` are added back before
+    ``tbl_df``, in case the removed rows were duplicates of them. Existing
+    rows whose duplicate-check column texts are in set ``drop_keys`` are
+    removed as well. Rows of tables in ``access_table_replaces`` take the
+    place of the existing row with the same keys.
 
     Supported tables include:
 
@@ -370,126 +826,1387 @@ def export_access_table(tbl_df, atable_name):
     """
 
     def drop_duplicates_create_keys(adf, tbl_name):
-        if all([item in tbl_name for item in ['Standard', 'Values']]):
-            chk_cols = ['Test_Item_ID', 'Sensor_ID']
+        chk_cols, id_col, id_start = access_table_keys(tbl_name)
+        if chk_cols and access_table_replaces(tbl_name):
+            # Last values of each key, in the place of the first.
+            adf = adf.drop_duplicates(subset=chk_cols)[chk_cols].merge(
+                    adf.drop_duplicates(subset=chk_cols, keep='last'),
+                    on=chk_cols, how='left')[list(adf)]
+        elif chk_cols is None or chk_cols:
             adf.drop_duplicates(subset=chk_cols, inplace=True)
-            adf['Project_ID'] = [2000.+i for i in range(len(adf.index))]
-
-        if all([item in tbl_name for item in ['daily', 'result']]):
-            chk_cols = ['Filename', 'Date', 'AM_PM', 'Test_Item_ID',
-                        'Sensor_ID']
-            adf.drop_duplicates(subset=chk_cols, inplace=True)
-            adf['OID'] = [1000.+i for i in range(len(adf.index))]
-
-        if all([item in tbl_name for item in ['Seed', 'Test', 'Item']]):
-            adf.drop_duplicates(inplace=True)
+        if id_col:
+            adf[id_col] = [id_start+i for i in range(len(adf.index))]
         return adf
 
-    access_dir = os.path.join(_access_folder, "AccessTables")
-    if not os.path.exists(access_dir):
-        os.makedirs(access_dir)
-
+    access_dir = access_table_dir()
     atable_path = os.path.join(access_dir, atable_name)
     print('Writing table: {}'.format(atable_name))
     print('    Directory: {}'.format(access_dir))
     if os.path.isfile(atable_path):
-        orig_table = pd.read_csv(atable_path, header=0)
-        tbl_df = orig_table.append(tbl_df, True, False)
+        # Round-trip floats, so rewritten rows keep their exact text.
+        orig_table = pd.read_csv(atable_path, header=0,
+                                 float_precision='round_trip')
+        if retract_rows:
+            texts = access_row_texts(pd.read_csv(atable_path, dtype=str,
+                                                 keep_default_na=False),
+                                     atable_name)
+            keep = np.array([tuple(r) not in retract_rows for r in texts],
+                            dtype=bool)
+            print('    {} rows of changed files retracted.'
+                  .format(len(keep)-np.count_nonzero(keep)))
+            orig_table = orig_table.loc[keep]
+        if drop_keys:
+            chk_cols, _, _ = access_table_keys(atable_name)
+            texts = csv_text_frame(orig_table[chk_cols])
+            keep = np.array([r not in drop_keys for r in zip(
+                    *[texts[c].values for c in chk_cols])], dtype=bool)
+            print('    {} rows with no data left removed.'
+                  .format(len(keep)-np.count_nonzero(keep)))
+            orig_table = orig_table.loc[keep]
+        if restore_rows:
+            _, id_col, _ = access_table_keys(atable_name)
+            restored = pd.DataFrame(restore_rows, columns=[
+                    c for c in access_table_columns(atable_name)
+                    if c != id_col])
+            # Parse the csv text like the table read above.
+            orig_table = pd.concat([orig_table, pd.read_csv(
+                    io.StringIO(restored.to_csv(index=False)),
+                    float_precision='round_trip')], ignore_index=True,
+                    sort=False)
+        tbl_df = pd.concat([orig_table, tbl_df], ignore_index=True,
+                           sort=False)
         print('    An existing table was appended with unique entries only.')
     new_df = drop_duplicates_create_keys(tbl_df, atable_name)
     new_df.to_csv(atable_path, index=False)
+    run_stats.count('rows exported', len(new_df.index))
+    run_stats.count('bytes written', os.path.getsize(atable_path))
+    return
+
+def csv_text_frame(tbl_df):
+    """``tbl_df`` as the csv text it is exported as, every column a str."""
+    buf = io.StringIO()
+    tbl_df.to_csv(buf, index=False)
+    buf.seek(0)
+    return pd.read_csv(buf, dtype=str, keep_default_na=False)
+
+def text_row_keys(text_df, cols):
+    """md5 hash of the csv text in columns ``cols`` of each row of
+    ``text_df``, see ``csv_text_frame``."""
+    rows = zip(*[text_df[c].values for c in cols])
+    return [hashlib.md5('\x1f'.join(r).encode('utf-8')).hexdigest()
+            for r in rows]
+
+class AccessTableIndex(object):
+    """
+    Sidecar index of an exported Access table for append-only exports. Keeps
+    a hash of the csv text of each row's duplicate-check columns (see
+    ``access_table_keys``) in '<table>.keys', one per line, and the row count
+    and table size in '<table>.json', both in the '.index' folder next to
+    the table. The index is rebuilt from the table if the table size does
+    not match, e.g. after a full export.
+
+    Parameters
+    ----------
+    access_dir : str
+    atable_name : str
+    """
+    def __init__(self, access_dir, atable_name):
+        self.table_path = os.path.join(access_dir, atable_name)
+        index_dir = os.path.join(access_dir, '.index')
+        if not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.keys_path = os.path.join(index_dir, atable_name+'.keys')
+        self.meta_path = os.path.join(index_dir, atable_name+'.json')
+        self.chk_cols, self.id_col, self.id_start = \
+            access_table_keys(atable_name)
+        self.rows = 0
+        self.keys = set()
+        self.header = None
+        if os.path.isfile(self.table_path):
+            self.header = list(pd.read_csv(self.table_path, nrows=0))
+        meta = {}
+        if os.path.isfile(self.meta_path):
+            meta = json_config(self.meta_path)
+        if meta.get('table_bytes') != self._table_bytes():
+            self.rebuild()
+            return
+        self.rows = meta['rows']
+        self.table_bytes = meta['table_bytes']
+        with open(self.keys_path) as f:
+            self.keys = set(f.read().split())
+
+    def _table_bytes(self):
+        if os.path.isfile(self.table_path):
+            return os.path.getsize(self.table_path)
+        return 0
+
+    def row_keys(self, text_df):
+        """Key hash of each row of ``text_df``, a table read as csv text."""
+        if self.chk_cols is None:
+            cols = list(text_df)
+        else:
+            cols = [c for c in self.chk_cols if c in text_df]
+        if not cols:
+            return [None]*len(text_df.index)
+        return text_row_keys(text_df, cols)
+
+    def rebuild(self):
+        """Read the keys of every row from the table csv once."""
+        self.keys = set()
+        self.rows = 0
+        if os.path.isfile(self.table_path):
+            print('    Indexing existing table: {}'
+                  .format(os.path.basename(self.table_path)))
+            text_df = pd.read_csv(self.table_path, dtype=str,
+                                  keep_default_na=False)
+            self.rows = len(text_df.index)
+            self.keys = set(k for k in self.row_keys(text_df) if k)
+        with open(self.keys_path, 'w') as f:
+            f.write(''.join(k+'\n' for k in sorted(self.keys)))
+        self.save()
+        return
+
+    def is_current(self):
+        """True if the table is unchanged since the index was saved."""
+        return self.table_bytes == self._table_bytes()
+
+    def save(self):
+        self.table_bytes = self._table_bytes()
+        json_meta = {'rows': self.rows, 'table_bytes': self.table_bytes}
+        with open(self.meta_path, 'w') as f:
+            json.dump(json_meta, f, sort_keys=True)
+        return
+
+    def append(self, tbl_df):
+        """
+        Append the rows of ``tbl_df`` whose keys are new to the table csv.
+        Neither the table nor the key file is read or rewritten.
+
+        Returns
+        -------
+        int : number of rows appended.
+        """
+        if self.header is not None:
+            tbl_df = tbl_df.reindex(columns=self.header)
+        # Compare keys on the exact text the rows are written as.
+        keys = self.row_keys(csv_text_frame(tbl_df))
+        new_mask = []
+        new_keys = []
+        for k in keys:
+            is_new = k is None or k not in self.keys
+            new_mask.append(is_new)
+            if is_new and k is not None:
+                self.keys.add(k)
+                new_keys.append(k)
+        new_rows = tbl_df.loc[np.array(new_mask, dtype=bool)].copy()
+        if self.id_col:
+            new_rows[self.id_col] = self.id_start+self.rows+np.arange(
+                    len(new_rows.index), dtype=np.float64)
+        new_rows.to_csv(self.table_path, mode='a', index=False,
+                        header=self.header is None)
+        with open(self.keys_path, 'a') as f:
+            f.write(''.join(k+'\n' for k in new_keys))
+        self.rows += len(new_rows.index)
+        self.header = list(new_rows)
+        self.save()
+        return len(new_rows.index)
+
+@run_stats.timed()
+def append_access_table(tbl_df, atable_name):
+    """
+    Append-only version of ``export_access_table``. Rows of ``tbl_df`` not
+    already in the exported table are appended and numbered after the
+    existing rows, using an ``AccessTableIndex`` instead of reading the
+    table.
+    """
+    access_dir = access_table_dir()
+    print('Appending table: {}'.format(atable_name))
+    print('    Directory: {}'.format(access_dir))
+    # Reuse the index of an earlier run in this process if still current.
+    index = _tableIndexes.get(atable_name)
+    if index is None or not index.is_current():
+        index = AccessTableIndex(access_dir, atable_name)
+        _tableIndexes[atable_name] = index
+    table_bytes = index.table_bytes
+    nrows = index.append(tbl_df)
+    run_stats.count('rows exported', nrows)
+    run_stats.count('bytes written', index.table_bytes-table_bytes)
+    print('    {} new rows appended.'.format(nrows))
+    return
+
+def sqlite_value(value):
+    """Python value of a table cell for sqlite3; NaN becomes NULL."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class SQLiteAccessDatabase(object):
+    """
+    Local SQLite stand-in for the project MS Access database. Creates a table
+    for every schema in the json 'AccessDatabase' object, named after its csv
+    without the extension. Duplicate-check columns from ``access_table_keys``
+    get a unique index, with NULLs compared as equal like
+    ``drop_duplicates``, and key columns are INTEGER PRIMARY KEYs.
+
+    Parameters
+    ----------
+    db_path : str
+    access_db : JsonDict
+        The json 'AccessDatabase' object.
+    """
+    def __init__(self, db_path, access_db):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.columns = {}
+        for atable in access_db.__dict__.values():
+            if hasattr(atable, 'TName') and hasattr(atable, 'Columns'):
+                self.create_table(atable.TName, atable.Columns)
+
+    def __repr__(self):
+        return "<SQLiteAccessDatabase: %s>"%self.db_path
+
+    @staticmethod
+    def table_name(atable_name):
+        return os.path.splitext(atable_name)[0]
+
+    def create_table(self, atable_name, columns):
+        """Create table ``atable_name`` and its key index if missing, and add
+        any ``columns`` missing from an existing table."""
+        tname = self.table_name(atable_name)
+        chk_cols, id_col, _ = access_table_keys(atable_name)
+        col_defs = ['"{}"{}'.format(c, ' INTEGER PRIMARY KEY' if
+                                    c == id_col else '') for c in columns]
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'
+                              .format(tname, ', '.join(col_defs)))
+            existing = [row[1] for row in self.conn.execute(
+                    'PRAGMA table_info("{}")'.format(tname))]
+            for c in columns:
+                if c not in existing:
+                    self.conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                                      .format(tname, c))
+            if chk_cols is None or chk_cols:
+                key_cols = columns if chk_cols is None else chk_cols
+                self.conn.execute(
+                        'CREATE UNIQUE INDEX IF NOT EXISTS "{0}_keys" ON '
+                        '"{0}" ({1})'.format(tname, ', '.join(
+                                'IFNULL("{}", \'\')'.format(c)
+                                for c in key_cols)))
+        self.columns[atable_name] = list(columns)
+        return
+
+    def insert_tables(self, tables):
+        """
+        Insert the rows of every DataFrame in dict ``tables`` (keyed by table
+        csv name) in one transaction with ``executemany``. Rows whose keys
+        already exist are skipped, keeping the first row like the csv export,
+        or update the existing row for tables in ``access_table_replaces``,
+        which keeps its key like the csv export.
+
+        Returns
+        -------
+        dict : table csv name to (rows inserted, rows updated).
+        """
+        inserted = {}
+        with self.conn:
+            for atable_name, tbl_df in tables.items():
+                tname = self.table_name(atable_name)
+                chk_cols, id_col, id_start = access_table_keys(atable_name)
+                cols = [c for c in self.columns[atable_name] if c != id_col]
+                values = '?'*len(cols)
+                sql_cols = ', '.join('"{}"'.format(c) for c in cols)
+                sql_values = ', '.join(values)
+                if id_col:
+                    # Number new rows after the current maximum key.
+                    sql_cols = '"{}", '.format(id_col)+sql_cols
+                    sql_values = '(SELECT IFNULL(MAX("{0}")+1, {1}) FROM ' \
+                                 '"{2}"), '.format(id_col, int(id_start),
+                                                   tname)+sql_values
+                rows = ([sqlite_value(v) for v in row] for row in
+                        tbl_df.reindex(columns=cols).itertuples(index=False))
+                count_sql = 'SELECT COUNT(*) FROM "{}"'.format(tname)
+                nrows = None
+                conflict = 'OR IGNORE '
+                upsert = ''
+                if access_table_replaces(atable_name) and chk_cols:
+                    # Upserts change existing rows without adding any, so
+                    # new rows are counted. These tables are small.
+                    nrows = self.conn.execute(count_sql).fetchone()[0]
+                    # Target the key index, so the key column is kept.
+                    conflict = ''
+                    upsert = ' ON CONFLICT ({}) DO UPDATE SET {}'.format(
+                            ', '.join('IFNULL("{}", \'\')'.format(c)
+                                      for c in chk_cols),
+                            ', '.join('"{0}" = excluded."{0}"'.format(c)
+                                      for c in cols))
+                before = self.conn.total_changes
+                self.conn.executemany('INSERT {}INTO "{}" ({}) VALUES ({}){}'
+                                      .format(conflict, tname, sql_cols,
+                                              sql_values, upsert), rows)
+                changes = self.conn.total_changes-before
+                new = changes if nrows is None else \
+                    self.conn.execute(count_sql).fetchone()[0]-nrows
+                inserted[atable_name] = (new, changes-new)
+        return inserted
+
+    def close(self):
+        self.conn.close()
+        return
+
+def sqlite_db_path(db_path=None):
+    """``db_path``, or by default the 'AccessDatabaseName' with a '.sqlite'
+    extension in the 'AccessTables' folder."""
+    if not db_path:
+        db_path = os.path.join(access_table_dir(), os.path.splitext(
+                _jAccess.AccessDatabaseName)[0]+'.sqlite')
+    return db_path
+
+@run_stats.timed()
+def export_sqlite_tables(tables, db_path=None):
+    """Insert every non-empty table built by ``new_access_tables`` into the
+    SQLite database ``db_path``, see ``sqlite_db_path``."""
+    db_path = sqlite_db_path(db_path)
+    print('Writing database: {}'.format(db_path))
+    database = SQLiteAccessDatabase(db_path, _jAccess)
+    inserted = database.insert_tables({name: builder.to_frame() for
+                                       name, builder in tables.items()
+                                       if len(builder)})
+    database.close()
+    run_stats.count('rows exported', sum(new for new, _ in
+                                         inserted.values()))
+    for atable_name, (new, updated) in inserted.items():
+        print('    {}: {} new, {} updated.'.format(
+                SQLiteAccessDatabase.table_name(atable_name), new, updated))
+    return
+
+def new_access_tables():
+    """Empty ``TableBuilder`` for each supported Access table, keyed by the
+    table csv name."""
+    return {atable.TName: TableBuilder(atable.Columns) for atable in
+            [_jAccess.IVSDailyResultsTable, _jAccess.SeedTestItemTable,
+             _jAccess.IVSStandardValuesTable,
+             _jAccess.StaticRepeatabilityTable, _jAccessQC]}
+
+def export_access_tables(tables, append_only=False, retract=None,
+                         restore=None, drop=None):
+    """Export every non-empty table built by ``new_access_tables``, or append
+    it with ``append_access_table`` if ``append_only``. Tables with rows to
+    remove in dict ``retract`` (table name to set of ``access_row_texts``
+    tuples) are always rewritten, adding back the rows in dict ``restore``,
+    see ``RunManifest``, as are tables with keys to remove in dict ``drop``
+    and tables in ``access_table_replaces``."""
+    export = append_access_table if append_only else export_access_table
+    retract = retract or {}
+    restore = restore or {}
+    drop = drop or {}
+    for atable_name, builder in tables.items():
+        if (retract.get(atable_name) or drop.get(atable_name) or
+                (len(builder) and access_table_replaces(atable_name))):
+            export_access_table(builder.to_frame(), atable_name,
+                                retract.get(atable_name),
+                                restore.get(atable_name),
+                                drop.get(atable_name))
+        elif len(builder):
+            export(builder.to_frame(), atable_name)
     return
 
+def access_row_texts(tbl_df, atable_name):
+    """
+    Csv text of every column but the key column of each row of ``tbl_df``,
+    as the row is exported. Unlike the duplicate-check keys, identifies the
+    exact row a data file contributed to a table.
+
+    Parameters
+    ----------
+    tbl_df : pd.DataFrame
+        Table rows, or a table csv read with ``dtype=str`` and
+        ``keep_default_na=False``.
+    atable_name : str
+
+    Returns
+    -------
+    list : list of str for each row.
+    """
+    _, id_col, _ = access_table_keys(atable_name)
+    cols = [c for c in access_table_columns(atable_name) if c != id_col]
+    text_df = tbl_df if all(t == object for t in tbl_df.dtypes) else \
+        csv_text_frame(tbl_df)
+    return text_df.reindex(columns=cols, fill_value='').values.tolist()
+
+def access_table_columns(atable_name):
+    """Json 'Columns' of the Access table named ``atable_name``, including
+    the default 'Background_QC' table."""
+    return [atable.Columns for atable in list(_jAccess.__dict__.values()) +
+            [_jAccessQC] if getattr(atable, 'TName', None) == atable_name][0]
+
+def table_lengths(tables):
+    """Rows in each table built by ``new_access_tables``."""
+    return {atable_name: len(builder) for atable_name, builder in
+            tables.items()}
+
+class RunManifest(object):
+    """
+    Record of the data files already exported to the Access tables, kept in
+    '.manifest.json' in the 'AccessTables' folder. For each file it holds the
+    size, mtime and md5 of the file and hashes of the json config and the
+    seed file used. The ``access_row_texts`` of the rows each file
+    contributed to each table are kept in a sidecar json per file in the
+    '.manifest' folder, read only when the file changes or is removed.
+    Files unchanged since they were recorded are skipped. Rows of changed or
+    removed files are retracted from the tables and changed files are
+    processed again, and rows of unchanged files dropped as duplicates of
+    retracted rows are restored. Tables in ``access_table_replaces`` are
+    rebuilt every run and not recorded.
+
+    Parameters
+    ----------
+    access_dir : str
+    config_hash : str
+    seed_hash : str
+    """
+    def __init__(self, access_dir, config_hash, seed_hash):
+        self.path = os.path.join(access_dir, '.manifest.json')
+        self.rows_dir = os.path.join(access_dir, '.manifest')
+        self.config_hash = config_hash
+        self.seed_hash = seed_hash
+        self.files = {}
+        self.pending = {}
+        self.dropped = set()
+        if os.path.isfile(self.path):
+            self.files = json_config(self.path)['files']
+
+    def __repr__(self):
+        return "<RunManifest: %d files>"%len(self.files)
+
+    def rows_path(self, path):
+        """Sidecar json of the rows of the data file at ``path``."""
+        return os.path.join(self.rows_dir, hashlib.md5(
+                path.encode('utf-8')).hexdigest()+'.json')
+
+    def file_rows(self, path):
+        """Table name to ``access_row_texts`` rows recorded for the data
+        file at ``path``."""
+        entry = self.files[path]
+        if 'rows' in entry:
+            # Manifests written before the sidecars hold the rows inline.
+            return entry['rows']
+        rows_path = self.rows_path(path)
+        return json_config(rows_path) if os.path.isfile(rows_path) else {}
+
+    def is_current(self, ifile):
+        """True if ``ifile`` was recorded with the same content, config and
+        seed file."""
+        entry = self.files.get(os.path.abspath(ifile))
+        if (not entry or entry['config'] != self.config_hash or
+                entry['seeds'] != self.seed_hash):
+            return False
+        stat = os.stat(ifile)
+        if [entry['size'], entry['mtime_ns']] == [stat.st_size,
+                                                  stat.st_mtime_ns]:
+            return True
+        # Touched but maybe unchanged, compare content.
+        if entry['size'] == stat.st_size and entry['md5'] == file_md5(ifile):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            return True
+        return False
+
+    def plan(self, file_list, hold=None):
+        """
+        Split ``file_list`` into files to process and rows to retract. Only
+        the rows of changed or removed files are read, and those of
+        unchanged files only for deduplicated tables with retracted rows.
+        Recorded files in ``hold``, e.g. still being written, are neither
+        processed nor retracted and keep their recorded rows.
+
+        Returns
+        -------
+        tuple : (list of new or changed files, dict of table name to set of
+            ``access_row_texts`` tuples from changed or removed files, dict of
+            deduplicated table name to list of rows from unchanged files)
+        """
+        todo = [f for f in file_list if not self.is_current(f)]
+        keep = set(os.path.abspath(f) for f in file_list) - \
+            set(os.path.abspath(f) for f in todo)
+        keep.update(set(os.path.abspath(f) for f in hold or []).intersection(
+                self.files))
+        retract = {}
+        restore = {}
+        for path in sorted(set(self.files) - keep):
+            for atable_name, rows in self.file_rows(path).items():
+                if rows and not access_table_replaces(atable_name):
+                    retract.setdefault(atable_name, set()).update(
+                            tuple(r) for r in rows)
+        dedup = [atable_name for atable_name in retract if
+                 access_table_keys(atable_name)[0] != []]
+        if dedup:
+            for path in sorted(keep.intersection(self.files)):
+                file_rows = self.file_rows(path)
+                for atable_name in dedup:
+                    # Rows dropped as duplicates of retracted rows return.
+                    restore.setdefault(atable_name, []).extend(
+                            file_rows.get(atable_name, []))
+        for atable_name, rows in restore.items():
+            retract[atable_name].difference_update(tuple(r) for r in rows)
+        self.dropped.update(set(self.files) - keep)
+        self.files = {path: self.files[path] for path in keep}
+        return todo, retract, restore
+
+    def record(self, file_list, file_stops, tables):
+        """Add processed ``file_list`` with its rows, the ``tables`` rows up
+        to ``file_stops`` (``table_lengths`` after each file)."""
+        frames = {atable_name: builder.to_frame() for atable_name, builder
+                  in tables.items() if not access_table_replaces(atable_name)}
+        start = dict.fromkeys(tables, 0)
+        for ifile, stop in zip(file_list, file_stops):
+            stat = os.stat(ifile)
+            path = os.path.abspath(ifile)
+            self.files[path] = {
+                'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'md5': file_md5(ifile), 'config': self.config_hash,
+                'seeds': self.seed_hash}
+            self.pending[path] = {atable_name: access_row_texts(
+                    frame.iloc[start[atable_name]:stop[atable_name]],
+                    atable_name) for atable_name, frame in frames.items()
+                if stop[atable_name] > start[atable_name]}
+            self.dropped.discard(path)
+            start = stop
+        return
+
+    def save(self):
+        """Write the sidecars of the files recorded since the last save and
+        remove those of dropped files, then the manifest, replacing the
+        previous one whole."""
+        if not os.path.exists(self.rows_dir):
+            os.makedirs(self.rows_dir)
+        for path, rows in self.pending.items():
+            tmp_path = self.rows_path(path)+'.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(rows, f, sort_keys=True)
+            os.replace(tmp_path, self.rows_path(path))
+        for path in self.dropped:
+            if os.path.isfile(self.rows_path(path)):
+                os.remove(self.rows_path(path))
+        self.pending = {}
+        self.dropped = set()
+        tmp_path = self.path+'.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.files}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        return
+
+class StandardValuesStats(object):
+    """
+    Running count, mean and M2 of the IVS response and offset ('Comment')
+    of each sensor, seed item and channel of the daily results, kept in a
+    json file between runs, see ``RunningMoments``. Only the moments are
+    kept, so a new day updates its keys without reading the daily results
+    again. The rows to merge or take out are those a run adds to or
+    retracts from the exported table, one per daily duplicate-check key,
+    whether or not it is a ``RunManifest`` run; ``exported_keys`` holds the
+    keys of the exported rows, set by ``standard_values_stats``.
+
+    Parameters
+    ----------
+    path : str
+        Json file of the statistics.
+    reset : bool (default: False)
+        Start empty, e.g. when the daily results table does not exist.
+    """
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.moments = {}
+        self.touched = {}
+        self.exported_keys = None
+        self.loaded = False
+        if not reset and os.path.isfile(path):
+            state = json_config(path)
+            for entry in state['keys']:
+                moments = RunningMoments(2)
+                moments.count, moments.mean, moments.m2 = [
+                    np.array(entry[k], dtype=np.float64) for k in
+                    ['count', 'mean', 'm2']]
+                self.moments[tuple(entry['key'])] = moments
+            self.loaded = True
+
+    def __repr__(self):
+        return "<StandardValuesStats: %d keys>"%len(self.moments)
+
+    @staticmethod
+    def row_keys(daily_df):
+        """Hash of the duplicate-check columns of each daily row."""
+        chk_cols, _, _ = access_table_keys(_jAccessIVS.TName)
+        return text_row_keys(csv_text_frame(daily_df[chk_cols]), chk_cols)
+
+    def _update(self, daily_df, add, keys=None):
+        # First row of each daily key, of those in ``keys`` if given.
+        row_keys = pd.Series(self.row_keys(daily_df), dtype=object)
+        mask = ~row_keys.duplicated().values
+        if keys is not None:
+            mask &= row_keys.isin(keys).values
+        rows = daily_df.loc[mask]
+        values = rows[['IVS_Response', 'Comment']].values.astype(np.float64)
+        for key, index in rows.groupby(STANDARD_KEY_COLS,
+                                       sort=False).indices.items():
+            key = tuple(str(k) for k in key)
+            moments = RunningMoments(2)
+            moments.update(values[index])
+            if add:
+                self.moments.setdefault(key, RunningMoments(2)).merge(moments)
+            elif key in self.moments:
+                self.moments[key].remove(moments)
+            self.touched[key] = True
+        return int(mask.sum())
+
+    def add(self, daily_df, keys=None):
+        """Merge the first row of each key of ``daily_df``, of the
+        ``row_keys`` in set ``keys`` if given. Returns their number."""
+        return self._update(daily_df, True, keys)
+
+    def remove(self, daily_df):
+        """Take out the first row of each key of ``daily_df``. Returns their
+        number."""
+        return self._update(daily_df, False)
+
+    def table(self):
+        """
+        Standard values rows of the keys changed since the stats were
+        loaded or saved, in the order they changed. The value and mean
+        columns hold the running mean, and the halfwidth is
+        ``STANDARD_HALFWIDTH_SIGMA`` sample standard deviations.
+
+        Returns
+        -------
+        tuple : (pd.DataFrame of rows, set of ``STANDARD_KEY_COLS`` tuples of
+            keys with no rows left)
+        """
+        keys = [k for k in self.touched if
+                k in self.moments and self.moments[k].count.any()]
+        removed = set(self.touched).difference(keys)
+        mean = np.array([self.moments[k].mean for k in keys]).reshape(-1, 2)
+        std = np.array([self.moments[k].std() for k in keys]).reshape(-1, 2)
+        halfwidth = STANDARD_HALFWIDTH_SIGMA*std
+        table = pd.DataFrame(keys, columns=STANDARD_KEY_COLS)
+        for i, name in enumerate(['online', 'offset']):
+            table['IVS_Response_{}_value'.format(name)] = mean[:, i]
+            table['IVS_Response_{}_width'.format(name)] = 2*halfwidth[:, i]
+            table['IVS_Response_{}_halfwidth'.format(name)] = halfwidth[:, i]
+            table['Mean_Response_{}'.format(name)] = mean[:, i]
+        return table.round(4), removed
+
+    def save(self):
+        """Write the statistics, replacing the previous file whole."""
+        for key in [k for k, m in self.moments.items() if not m.count.any()]:
+            del self.moments[key]
+        state = {'keys': [{'key': list(k), 'count': m.count.tolist(),
+                           'mean': m.mean.tolist(), 'm2': m.m2.tolist()}
+                          for k, m in sorted(self.moments.items())]}
+        tmp_path = self.path+'.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.touched = {}
+        return
+
+def daily_results_frame(text_rows):
+    """Daily results ``access_row_texts`` rows (from a ``RunManifest``)
+    parsed like the exported csv table, keys as str."""
+    chk_cols, id_col, _ = access_table_keys(_jAccessIVS.TName)
+    text_df = pd.DataFrame(list(text_rows), columns=[
+            c for c in _jAccessIVS.Columns if c != id_col])
+    return pd.read_csv(io.StringIO(text_df.to_csv(index=False)),
+                       dtype={c: str for c in chk_cols},
+                       float_precision='round_trip')
+
+def standard_values_stats(args):
+    """
+    ``StandardValuesStats`` of the exported daily results, next to the csv
+    tables or the ``--sqlite`` database. Started empty if there is no daily
+    results table, and started from the exported daily results, once, if
+    the statistics file is missing. Its ``exported_keys`` are the
+    ``row_keys`` of the exported daily rows, which are merged already.
+    """
+    chk_cols, _, _ = access_table_keys(_jAccessIVS.TName)
+    daily_name = _jAccessIVS.TName
+    if args.sqlite is not None:
+        db_path = sqlite_db_path(args.sqlite)
+        stats_path = os.path.splitext(db_path)[0]+'.standard_values.json'
+
+        def read_daily(cols=None):
+            conn = sqlite3.connect(db_path)
+            try:
+                daily_df = pd.read_sql_query('SELECT {} FROM "{}"'.format(
+                        ', '.join('"{}"'.format(c) for c in cols)
+                        if cols else '*',
+                        SQLiteAccessDatabase.table_name(daily_name)), conn)
+            except pd.errors.DatabaseError:
+                return None
+            finally:
+                conn.close()
+            return daily_df.astype({c: str for c in chk_cols})
+
+        def read_keys():
+            daily_df = read_daily(chk_cols)
+            return set() if daily_df is None else \
+                set(StandardValuesStats.row_keys(daily_df))
+        exported = os.path.isfile(db_path)
+    else:
+        access_dir = access_table_dir()
+        stats_path = os.path.join(access_dir, '.standard_values.json')
+        daily_path = os.path.join(access_dir, daily_name)
+
+        def read_daily():
+            return pd.read_csv(daily_path, dtype={c: str for c in chk_cols},
+                               float_precision='round_trip')
+
+        def read_keys():
+            if args.append_only:
+                # The append index has the keys, and is reused to append.
+                index = _tableIndexes.get(daily_name)
+                if index is None or not index.is_current():
+                    index = AccessTableIndex(access_dir, daily_name)
+                    _tableIndexes[daily_name] = index
+                return index.keys
+            return set(text_row_keys(pd.read_csv(
+                    daily_path, usecols=chk_cols, dtype=str,
+                    keep_default_na=False), chk_cols))
+        exported = os.path.isfile(daily_path)
+    stats = StandardValuesStats(stats_path, reset=not exported)
+    if exported and not stats.loaded:
+        daily_df = read_daily()
+        if daily_df is not None:
+            print('Standard values started from {} exported daily rows.'
+                  .format(stats.add(daily_df)))
+    stats.exported_keys = read_keys() if exported else set()
+    return stats
+
+def standard_values_tables(stats, retract=None, restore=None):
+    """
+    Update ``stats`` with the daily results of this run, less the
+    ``retract`` rows (see ``RunManifest``). The ``restore`` rows are merged
+    back only for the keys of retracted rows, the others never left the
+    statistics. Like the export, which keeps the first row of each key, run
+    rows are merged only for keys not in ``stats.exported_keys`` and not
+    restored. Returns the run tables with the standard values rows of the
+    keys changed.
+
+    Returns
+    -------
+    tuple : (dict of table name to ``TableBuilder``, dict of table name to
+        set of keys to remove, for ``export_access_tables``)
+    """
+    daily_name = _jAccessIVS.TName
+    std_table = _jAccess.IVSStandardValuesTable
+    merged = stats.exported_keys or set()
+    retract_rows = (retract or {}).get(daily_name)
+    if retract_rows:
+        retract_df = daily_results_frame(retract_rows)
+        stats.remove(retract_df)
+        retracted = set(stats.row_keys(retract_df))
+        merged = merged.difference(retracted)
+        restore_rows = (restore or {}).get(daily_name)
+        if restore_rows:
+            restore_df = daily_results_frame(restore_rows)
+            stats.add(restore_df, retracted)
+            merged.update(retracted.intersection(stats.row_keys(restore_df)))
+    daily_df = _accessTables[daily_name].to_frame()
+    stats.add(daily_df, set(stats.row_keys(daily_df)).difference(merged))
+    table, removed = stats.table()
+    tables = dict(_accessTables)
+    tables[std_table.TName] = TableBuilder(std_table.Columns)
+    tables[std_table.TName].append_rows(table)
+    return tables, {std_table.TName: removed}
+
+class StaticReference(object):
+    """
+    Expected response of each static test item and sensor, against which
+    'Static_Repeatability' lines are compared. It is the json
+    'StaticResponse1' to 'StaticResponse3' entry of the static test (a comma
+    separated response per static channel), if set, and otherwise the first
+    static response recorded for the item and sensor. Recorded responses are
+    kept in a json file between runs, so every later line is compared with
+    the same response.
+
+    Parameters
+    ----------
+    path : str
+        Json file of the recorded responses.
+    reset : bool (default: False)
+        Start empty, e.g. when the static repeatability table does not
+        exist.
+    """
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.responses = {}
+        self.configured = {}
+        self.changed = False
+        nchannels = len(static_channels())
+        for field, dataset in STATIC_DATASETS:
+            entry = getattr(_jGUI, field.replace('ID', 'Response'), '')
+            if entry:
+                values = np.full(nchannels, np.nan)
+                given = [float(v) for v in response_channels(entry)]
+                values[:len(given)] = given[:nchannels]
+                self.configured[dataset] = values
+        if not reset and os.path.isfile(path):
+            self.responses = dict(
+                    (tuple(entry['key']), np.array(entry['response'],
+                                                   dtype=np.float64))
+                    for entry in json_config(path)['keys'])
+
+    def __repr__(self):
+        return "<StaticReference: %d recorded, %d configured>"%(
+                len(self.responses), len(self.configured))
+
+    def fill(self, static_df):
+        """
+        Set the percent differences, the ``relative_diff`` from the expected
+        response, and the QC status of the ``static_df`` rows with a spike,
+        recording the response of the first row of new items and sensors.
+        Rows pass QC if every channel is within
+        ``STATIC_RESPONSE_TOLERANCE`` percent.
+
+        Returns
+        -------
+        pd.DataFrame : ``static_df`` with the columns set.
+        """
+        suffixes = [sfx for sfx, _ in static_channels()]
+        response = static_df[['Static_Response_'+sfx for sfx in
+                               suffixes]].values.astype(np.float64)
+        spike = (static_df['Comment'] == '').values
+        expected = np.full(response.shape, np.nan)
+        keys = zip(static_df['Static_Test_Item'],
+                   static_df['Static_Sensor_ID'], static_df['DatasetType'])
+        for i, (item, sid, dataset) in enumerate(keys):
+            if dataset in self.configured:
+                expected[i] = self.configured[dataset]
+            elif spike[i]:
+                key = (str(item), str(sid))
+                if key not in self.responses:
+                    self.responses[key] = response[i]
+                    self.changed = True
+                expected[i] = self.responses[key]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pct_diff = 100.*relative_diff(response, expected)
+        passed = (pct_diff <= STATIC_RESPONSE_TOLERANCE).all(axis=1)
+        static_df = static_df.copy()
+        for j, sfx in enumerate(suffixes):
+            static_df['Static_Response_%Difference_'+sfx] = np.where(
+                    spike, np.round(pct_diff[:, j], 2), np.nan)
+        static_df['QCStatus'] = np.where(spike, np.where(passed, 'Pass',
+                                                         'Fail'), '')
+        return static_df
+
+    def save(self):
+        """Write the recorded responses if new ones were recorded,
+        replacing the previous file whole."""
+        if not self.changed:
+            return
+        state = {'keys': [{'key': list(k), 'response': v.tolist()}
+                          for k, v in sorted(self.responses.items())]}
+        tmp_path = self.path+'.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+        return
+
+def static_reference(args):
+    """``StaticReference`` next to the csv tables or the ``--sqlite``
+    database, started empty if nothing was exported there yet."""
+    if args.sqlite is not None:
+        db_path = sqlite_db_path(args.sqlite)
+        path = os.path.splitext(db_path)[0]+'.static_reference.json'
+        exported = os.path.isfile(db_path)
+    else:
+        access_dir = access_table_dir()
+        path = os.path.join(access_dir, '.static_reference.json')
+        exported = os.path.isfile(os.path.join(
+                access_dir, _jAccess.StaticRepeatabilityTable.TName))
+    return StaticReference(path, reset=not exported)
+
+def static_repeatability_table(reference):
+    """Fill the 'Static_Repeatability' rows of this run in
+    ``_accessTables`` from ``reference``, see ``StaticReference.fill``."""
+    atable = _jAccess.StaticRepeatabilityTable
+    if len(_accessTables[atable.TName]):
+        static_df = reference.fill(_accessTables[atable.TName].to_frame())
+        _accessTables[atable.TName] = TableBuilder(atable.Columns)
+        _accessTables[atable.TName].append_rows(static_df)
+    return
+
+
+# Progress events.
+class RunCancelled(Exception):
+    """The run was cancelled between data files, see ``set_progress``."""
+
+def set_progress(callback=None, cancelled=None):
+    """
+    Send the progress of a run to ``callback(event, info)`` and stop it
+    between data files, raising ``RunCancelled`` before any table is
+    exported, once ``cancelled()`` is true. None turns either off.
+
+    Events and their info dict keys:
+    'start' files, 'file' index files name, 'sensor' sensor seeds,
+    'file done' index files name rows seconds rows_per_s, 'export' tables,
+    'done' files.
+
+    Parameters
+    ----------
+    callback : function (default: None)
+    cancelled : function (default: None)
+    """
+    global _progress, _cancelled
+    _progress = callback
+    _cancelled = cancelled
+    return
+
+def report_progress(event, **info):
+    """Send ``event`` with ``info`` to the progress callback, if any."""
+    if _progress is not None:
+        _progress(event, info)
+    return
+
+def report_file_done(index, file_list, nrows, seconds):
+    """'file done' event of ``file_list[index]``, ``nrows`` rows processed
+    in ``seconds``."""
+    report_progress('file done', index=index, files=len(file_list),
+                    name=os.path.basename(file_list[index]), rows=int(nrows),
+                    seconds=round(seconds, 3),
+                    rows_per_s=round(nrows/seconds) if seconds > 0 else None)
+    return
+
+def check_cancelled():
+    """Raise ``RunCancelled`` if the run was cancelled."""
+    if _cancelled is not None and _cancelled():
+        raise RunCancelled('Run cancelled.')
+    return
+
+class EventStream(object):
+    """
+    Json lines events on ``stream`` for a parent process such as the Tk GUI,
+    one object per line with an 'event' key. Text written to it, i.e.
+    ``print`` output once it replaces ``sys.stdout``, is sent as 'log'
+    events with a 'text' key. A 'cancel' line on ``commands`` sets
+    ``cancel``. With ``send``, each event dict is passed to it instead of
+    being written to ``stream``.
+
+    Parameters
+    ----------
+    stream : file
+    commands : file (default: None)
+    send : function (default: None)
+    """
+    def __init__(self, stream, commands=None, send=None):
+        self.stream = stream
+        self.send = send
+        self.cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._text = ''
+        if commands is not None:
+            threading.Thread(target=self._read_commands, args=(commands,),
+                             daemon=True).start()
+
+    def __repr__(self):
+        return '{}(stream={!r}, cancel={})'.format(
+                self.__class__.__name__, self.stream, self.cancel.is_set())
+
+    def _read_commands(self, commands):
+        for line in commands:
+            if line.strip() == 'cancel':
+                self.cancel.set()
+
+    def emit(self, event, info=None):
+        """Write ``event`` and its ``info`` dict as one json line."""
+        record = dict(info or {}, event=event)
+        with self._lock:
+            if self.send is not None:
+                self.send(record)
+                return
+            self.stream.write(json.dumps(record, default=str)+'\n')
+            self.stream.flush()
+        return
+
+    def write(self, text):
+        lines = (self._text+text).split('\n')
+        self._text = lines.pop()
+        for line in lines:
+            self.emit('log', {'text': line})
+        return len(text)
+
+    def flush(self):
+        return
+
 
 # General processing by file and sensor.
-def df_sensor_lines_only(df, id_substring, test_substring):
-    """Filter pd.DataFrame ``df`` lines by ``id_substring` and
-    ``test_substring``.
+def sensor_line_match(line, id_substring, test_substring):
+    """True if the line named ``line`` belongs to sensor ``id_substring`` and
+    test ``test_substring``.
 
     Parameters
     ----------
-    df : pd.DataFrame
+    line : str
     id_substring : str
     test_substring : str
 
     Returns
     -------
-    DataFrame : pd.Dataframe
+    bool : bool
     """
     if not id_substring:
         print('id_substring is empty.')
         sys.exit(2)
-    df = df.loc[df['Line'].str.contains(test_substring), :]
-    df = df.loc[df['Line'].str.contains(id_substring), :]
+    if not (re.search(test_substring, line) and re.search(id_substring, line)):
+        return False
     # Single sensor ids of length 1 must be second index in line name.
     if len(id_substring) == 1:
-        lprefix = "L"+id_substring
-        return df.loc[df['Line'].str.startswith(lprefix), :]
+        return line.startswith("L"+id_substring)
     # Check if id_substring is a towed array id.
     if id_substring in _towed_array_ids:
-        return df.loc[df['Line'].str.endswith(id_substring), :]
+        return line.endswith(id_substring)
+    return True
+
+class LineIndex(object):
+    """
+    Categorical index of a 'Line' column, built once per file or chunk. Line
+    names are factorized to integer codes in order of first appearance, so
+    tracks are taken as row slices and line metadata is computed once per
+    distinct name instead of with string operations over every row.
+
+    Parameters
+    ----------
+    lines : np.array
+        'Line' column values. Missing names become ''.
+    """
+    def __init__(self, lines):
+        codes, names = pd.factorize(lines, sort=False)
+        names = np.asarray(names, dtype=object)
+        if (codes < 0).any():
+            codes = np.where(codes < 0, len(names), codes)
+            names = np.append(names, '')
+        self.codes = codes
+        self.names = names
+        # Each run is a block of consecutive rows with the same line name.
+        self.run_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) \
+            if len(codes) else np.zeros(0, dtype=np.int64)
+        self.run_stops = np.r_[self.run_starts[1:], len(codes)]
+        self.contiguous = len(self.run_starts) == len(self.names)
+        self._order = None
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return "<LineIndex: %d lines, %d rows>"%(len(self.names),
+                                                 len(self.codes))
+
+    def runs(self):
+        """(line name, first row, stop row) of each run in row order."""
+        return zip(self.names[self.codes[self.run_starts]], self.run_starts,
+                   self.run_stops)
+
+    def rows(self, code):
+        """Rows of line ``names[code]``. A slice if lines are contiguous,
+        otherwise ascending row positions."""
+        if self.contiguous:
+            return slice(self.run_starts[code], self.run_stops[code])
+        if self._order is None:
+            self._order = np.argsort(self.codes, kind='mergesort')
+            self._offsets = np.r_[0, np.cumsum(np.bincount(
+                    self.codes, minlength=len(self.names)))]
+        return self._order[self._offsets[code]:self._offsets[code+1]]
+
+class LineOrderError(ValueError):
+    """A line name reappeared in a file after its track was complete."""
+
+def iter_line_tracks(ifile, chunk_rows=None, stream=None):
+    """
+    Read csv ``ifile`` in chunks of ``chunk_rows`` rows and yield the track of
+    each line as soon as it is complete, so memory is bounded by the longest
+    line rather than the file. Rows of a line must be contiguous, as exported
+    by DAT61MK2. Lines for which ``stream(name)`` is true are yielded piece
+    by piece as they are read instead, for long recordings.
+
+    Parameters
+    ----------
+    ifile : str
+    chunk_rows : int (default: CHUNK_ROWS)
+    stream : function (default: None)
+
+    Returns
+    -------
+    generator : (line name, pd.DataFrame of every row of the line, or of the
+        next piece of a streamed line), in file order.
+
+    Raises
+    ------
+    LineOrderError : if a line name appears again after its track ended.
+    """
+    def complete():
+        if line in finished:
+            raise LineOrderError('Line {} is not contiguous in {}.'
+                                 .format(line, os.path.basename(ifile)))
+        finished.add(line)
+        return line, parts[0] if len(parts) == 1 else pd.concat(parts)
+
+    finished = set()
+    line = None
+    parts = []  # Pieces of the line still being read.
+    streamed = {}  # Line name to ``stream(name)``.
+    reader = pd.read_csv(ifile, header=0, chunksize=chunk_rows or CHUNK_ROWS)
+    while True:
+        with run_stats.timer('read_csv'):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        run_stats.count('rows read', len(chunk.index))
+        index = LineIndex(chunk['Line'].values)
+        update_line_metadata(index.names)
+        for name, first, last in index.runs():
+            if parts and name != line:
+                yield complete()
+                parts = []
+            if stream is not None and name not in streamed:
+                streamed[name] = bool(stream(name))
+            if stream is not None and streamed[name]:
+                if name != line:
+                    if name in finished:
+                        raise LineOrderError(
+                                'Line {} is not contiguous in {}.'.format(
+                                        name, os.path.basename(ifile)))
+                    finished.add(name)
+                line = name
+                yield name, chunk.iloc[first:last]
+                continue
+            line = name
+            parts.append(chunk.iloc[first:last])
+    if parts:
+        yield complete()
+
+def read_data_file(ifile):
+    """Whole data file ``ifile`` as a DataFrame."""
+    with run_stats.timer('read_csv'):
+        df = pd.read_csv(ifile, header=0)
+    run_stats.count('rows read', len(df.index))
     return df
 
-def process_file_in_folder(ifile, sensors_list):
+def iter_file_line_tracks(df):
+    """Tracks of every line in DataFrame ``df`` in order of first appearance,
+    for files whose lines are not contiguous.
+
+    Returns
+    -------
+    generator : (line name, pd.DataFrame of every row of the line)
+    """
+    index = LineIndex(df['Line'].values)
+    update_line_metadata(index.names)
+    for code, line in enumerate(index.names):
+        yield line, df.iloc[index.rows(code)]
+
+def line_sensor_metadata(line, sensors_list):
+    """Sensor ids in ``sensors_list`` that the line named ``line`` belongs to.
+
+    Returns
+    -------
+    dict : sensor id to ``parse_line_name`` metadata.
+    """
+    return {sid: parse_line_name(line, sid) for sid in sensors_list if
+            sensor_line_match(line, sid, _jGUI.IvsID)}
+
+def test_line_metadata(line, sensors_list, datasets):
+    """Sensor ids in ``sensors_list`` that the line named ``line`` belongs
+    to as a test other than the IVS, for the first json test id it matches
+    in ``datasets``, e.g. ``STATIC_DATASETS``.
+
+    Returns
+    -------
+    dict : sensor id to ``parse_line_name`` metadata with 'TestID' set to the
+        test id and 'DatasetType' added.
+    """
+    for field, dataset in datasets:
+        test_id = getattr(_jGUI, field, '')
+        if not test_id:
+            continue
+        sensor_meta = {sid: parse_line_name(line, sid) for sid in
+                       sensors_list if sensor_line_match(line, sid, test_id)}
+        if sensor_meta:
+            # Line metadata for the static test id naming convention.
+            names = parse_line_names([line], line_name_patterns(test_id))
+            for meta in sensor_meta.values():
+                meta.update(TestID=test_id, DatasetType=dataset,
+                            AM_PM=names['AM_PM'][0], Date=names['Date'][0])
+            return sensor_meta
+    return {}
+
+def stream_line_metadata(line, sensors_list):
+    """``test_line_metadata`` of a background or cable shake line, see
+    ``STREAM_DATASETS``."""
+    return test_line_metadata(line, sensors_list, STREAM_DATASETS)
+
+def process_line_track(line, track, sensors_list, sensor_lines,
+                       static_lines=None, stream_lines=None):
+    """Match the line ``track`` named ``line`` to the sensor ids in
+    ``sensors_list`` and measure it against every seed item. Results are
+    appended per sensor to the lists in dict ``sensor_lines``. Lines of a
+    static test are measured with ``static_line_stats`` and appended to
+    ``static_lines`` instead, if given. Background and cable shake lines
+    update their ``StreamingChannelStats`` in dict ``stream_lines``, if
+    given, and may come in several pieces.
+
+    Parameters
+    ----------
+    line : str
+    track : pd.DataFrame
+        All rows of one line, or the next piece of a streamed line.
+    sensors_list : list
+    sensor_lines : dict
+    static_lines : list (default: None)
+    stream_lines : dict (default: None)
+        Line name to (sensor metadata, ``StreamingChannelStats``).
+
+    Returns
+    -------
+    None : None
+    """
+    if stream_lines is not None:
+        if line in stream_lines:
+            stream_lines[line][1].update(track)
+            return
+        stream_meta = stream_line_metadata(line, sensors_list)
+        if stream_meta:
+            run_stats.count('lines')
+            run_stats.count('stream lines')
+            stream_lines[line] = (stream_meta, StreamingChannelStats(
+                    data_channels(track)))
+            stream_lines[line][1].update(track)
+            return
+    run_stats.count('lines')
+    sensor_meta = line_sensor_metadata(line, sensors_list)
+    if not sensor_meta:
+        if static_lines is not None:
+            static_meta = test_line_metadata(line, sensors_list,
+                                             STATIC_DATASETS)
+            if static_meta:
+                run_stats.count('static lines')
+                line_stats = static_line_stats(
+                        track, [ch for _, ch in static_channels()])
+                static_lines.extend((meta, line_stats) for meta in
+                                    static_meta.values())
+        return
+    run_stats.count('lines matched')
+    lane = seeds_within_lanewidth(track, LANE_WIDTH/2)
+    peaks = line_peak_responses(track)
+    for sid, meta in sensor_meta.items():
+        sensor_lines[sid].append((meta, lane, peaks))
+    return
+
+def process_file_in_folder(ifile, sensors_list, chunk_rows=None, cache=None):
     """Process ``ifile`` in Data Folder for sensor ids in ``sensors_list``.
+    The file is streamed one line at a time, see ``iter_line_tracks``, unless
+    a ``cache`` is given. Then the parsed file is loaded from the cache, or
+    read whole and stored in it.
+
     Parameters
     ----------
     ifile : str
     sensors_list : list
+    chunk_rows : int (default: CHUNK_ROWS)
+    cache : FileFrameCache (default: None)
 
     Returns
     -------
-    None : None
+    int : rows of the file processed.
     """
-    df = pd.read_csv(ifile, header=0)
-    # Skip file if response channel is not in file header.
-    if _jGUI.ResponseChannel not in list(df):
+    run_stats.count('files')
+    df = None
+    if cache is not None:
+        with run_stats.timer('cache load'):
+            df = cache.load(ifile)
+        if df is not None:
+            run_stats.count('rows read', len(df.index))
+    header = df if df is not None else pd.read_csv(ifile, header=0, nrows=0)
+    # Skip file if a response channel is not in file header.
+    missing = [ch for ch in _responseChannels if ch not in list(header)]
+    if missing:
         print('Response Channel {} not in file header.'
-              .format(_jGUI.ResponseChannel))
-        return
+              .format(', '.join(missing)))
+        return 0
+    nrows = 0
+    sensor_lines = {sid: [] for sid in sensors_list}
+    static_lines = []
+    stream_lines = {}
+    if cache is not None and df is None:
+        df = read_data_file(ifile)
+        cache.store(ifile, df)
+    if df is not None:
+        for line, track in iter_file_line_tracks(df):
+            process_line_track(line, track, sensors_list, sensor_lines,
+                               static_lines, stream_lines)
+            nrows += len(track.index)
+    else:
+        # Background and cable shake lines are streamed in pieces.
+        stream = partial(stream_line_metadata, sensors_list=sensors_list)
+        try:
+            for line, track in iter_line_tracks(ifile, chunk_rows, stream):
+                process_line_track(line, track, sensors_list, sensor_lines,
+                                   static_lines, stream_lines)
+                nrows += len(track.index)
+        except LineOrderError as err:
+            print('Warning: {} Reading the whole file.'.format(err))
+            sensor_lines = {sid: [] for sid in sensors_list}
+            static_lines = []
+            stream_lines = {}
+            df = read_data_file(ifile)
+            nrows = len(df.index)
+            for line, track in iter_file_line_tracks(df):
+                process_line_track(line, track, sensors_list, sensor_lines,
+                                   static_lines, stream_lines)
     for sid in sensors_list:
-        # Process the current file lines
-        process_ivs_and_create_access_tables(sid, df.copy())
-    return
+        process_ivs_and_create_access_tables(sid, sensor_lines[sid])
+    process_static_repeatability(static_lines)
+    process_background_qc(stream_lines)
+    return nrows
 
-def process_ivs_and_create_access_tables(sid, df):
-    """Process sensor id ``sid`` data in pd.DataFrame ``df``. Creates folder
-    in parent directory of this file. See ``export_access_table`` for more.
+@run_stats.timed()
+def process_ivs_and_create_access_tables(sid, sensor_lines):
+    """Process sensor id ``sid`` lines ``sensor_lines`` from
+    ``process_line_track``. Rows are added to the run tables in
+    ``_accessTables``, see ``export_access_tables``.
 
     Parameters
     ----------
     sid : str
-    df : pd.DataFrame
+    sensor_lines : list
 
     Returns
     -------
     None : None
     """
-    # Filter lines that do not contain ivs string identifier.
-    df2 = df_sensor_lines_only(df, sid, _jGUI.IvsID)
-    lane_seed_list = seeds_within_lanewidth(df2, LANE_WIDTH/2)
+    # Seeds within the lane of any of the sensor lines.
+    lane = np.zeros(len(_csvSeedDF.index), dtype=bool)
+    for _, line_lane, _ in sensor_lines:
+        lane |= line_lane
+    lane_seed_list = list(_csvSeedDF.Test_Item_ID.values[lane])
     _seed_collector.append(lane_seed_list)
     # Skip file if no seed items within radius.
     if not lane_seed_list:
         return
     print('Test_Item_IDs active: {}'.format(lane_seed_list))
-    sensor_df = parse_line_name(df2, sid)
-    if df2.values[0].any():
-        print('DataFrame head:\n{}\n'.format(df2.head()))
-    if sensor_df is None:
-        print('Warning: No sensor lines identified after parsing line names.')
-        return
-
-    # Create "IVS_daily_result_Table".
-    ivs_table = pd.DataFrame(columns=_jAccessIVS.Columns)
-    for aseed in lane_seed_list:
-        aseed_df = _csvSeedDF.loc[
-            _csvSeedDF['Test_Item_ID'].str.contains(aseed)]
-        temp_table = process_dynamic_response(sensor_df, aseed_df)
-        ivs_table = ivs_table.append(temp_table, True, False)
-    export_access_table(ivs_table, _jAccess.IVSDailyResultsTable.TName)
-
-    # Create "Seed&Test_Item_Table".
+    report_progress('sensor', sensor=sid,
+                    seeds=[str(seed) for seed in lane_seed_list])
+
+    # Create "IVS_daily_result_Table", one row set per response channel.
+    seed_mask = lane & ~_csvSeedDF['Test_Item_ID'].duplicated().values
+    ivs_tables = [process_dynamic_response(sensor_lines, seed_mask, ch) for
+                  ch in _responseChannels]
+    for ivs_table in ivs_tables:
+        _accessTables[_jAccess.IVSDailyResultsTable.TName].append_rows(
+                ivs_table)
+
+    # Create "Seed&Test_Item_Table" from the first response channel.
+    ivs_table = ivs_tables[0]
     seed_table = pd.DataFrame()
     seed_table['Offset_distance'] = ivs_table['Comment']
     seed_table['Test_Item_ID'] = ivs_table['Test_Item_ID']
@@ -499,38 +2216,372 @@ def process_ivs_and_create_access_tables(sid, df):
     temp_seeds = _csvSeedDF.dropna(axis=1, inplace=False)
     seed_table = seed_table.merge(temp_seeds, on='Test_Item_ID', how='left')
     seed_table = set_ivs_seed_geometry(seed_table)
-    # Append table to empty table to retrive dropped cols.
-    tmp_cols = _jAccess.SeedTestItemTable.Columns
-    seed_table = pd.DataFrame(columns=tmp_cols).append(seed_table, True, False)
-    export_access_table(seed_table, _jAccess.SeedTestItemTable.TName)
-
-    # Create "IVS_Standard_Values_Table".
-    tmp_cols = _jAccess.IVSStandardValuesTable.Columns
-    std_values_table = pd.DataFrame(columns=tmp_cols)
-    agg_cols = ['Sensor_ID', 'Test_Item_ID']
-    ivs_tablegrp = ivs_table.groupby(by=agg_cols, as_index=False).mean()
-    std_values_table[agg_cols] = ivs_tablegrp[agg_cols]
-    std_values_table['Mean_Response_online'] = ivs_tablegrp['IVS_Response']
-    std_values_table['Mean_Response_online_offset'] = ivs_tablegrp['Comment']
-    export_access_table(std_values_table,
-                        _jAccess.IVSStandardValuesTable.TName)
+    _accessTables[_jAccess.SeedTestItemTable.TName].append_rows(seed_table)
+
+    # Create "IVS_Standard_Values_Table" of this run. The values exported
+    # are the running statistics, see ``standard_values_tables``.
+    agg_cols = ['Sensor_ID', 'Test_Item_ID', 'Primary_Analysis_Channel']
+    ivs_tablegrp = pd.concat(ivs_tables).groupby(by=agg_cols, as_index=False)[
+        ['IVS_Response', 'Comment']].mean()
+    _accessTables[_jAccess.IVSStandardValuesTable.TName].append_rows(
+        {'Sensor_ID': ivs_tablegrp['Sensor_ID'],
+         'Test_Item_ID': ivs_tablegrp['Test_Item_ID'],
+         'Primary_Analysis_Channel': ivs_tablegrp['Primary_Analysis_Channel'],
+         'Mean_Response_online': ivs_tablegrp['IVS_Response'],
+         'Mean_Response_offset': ivs_tablegrp['Comment']})
 
     print('Processed SensorID: {}\n'.format(sid))
     return
 
+def process_file_task(ifile, sensors_list, chunk_rows=None, cache=None,
+                      stats=False):
+    """Process ``ifile`` in a pool worker with fresh result tables, and
+    fresh ``run_stats`` if ``stats``.
+
+    Returns
+    -------
+    tuple : (dict of table name to pd.DataFrame, list of lane seed lists,
+        ``run_stats`` snapshot or None, rows of the file)
+        The file's rows and stats for the parent process to merge.
+    """
+    global _accessTables, _seed_collector
+    _accessTables = new_access_tables()
+    _seed_collector = []
+    run_stats.reset()
+    run_stats.enable(stats)
+    print('File: {}'.format(os.path.basename(ifile)))
+    nrows = process_file_in_folder(ifile, sensors_list, chunk_rows, cache)
+    tables = {name: builder.to_frame() for name, builder in
+              _accessTables.items() if len(builder)}
+    return (tables, _seed_collector,
+            run_stats.snapshot() if stats else None, nrows)
+
+def process_files_in_pool(file_list, sensors_list, workers, chunk_rows=None,
+                          cache=None):
+    """Process ``file_list`` across ``workers`` processes. Workers get the
+    parsed json and seed table once through the pool initializer. Results
+    are merged into ``_accessTables`` in ``file_list`` order, so the exported
+    tables match a serial run. Returns ``table_lengths`` after each file.
+    Cancelling stops between merged files, see ``set_progress``."""
+    from multiprocessing import Pool
+    file_stops = []
+    start = time.perf_counter()
+    task = partial(process_file_task, sensors_list=sensors_list,
+                   chunk_rows=chunk_rows, cache=cache,
+                   stats=run_stats.enabled)
+    with Pool(processes=workers, initializer=configure_run,
+              initargs=(_jsonDict, _csvSeedDF)) as pool:
+        for index, (tables, seed_lists, stats, nrows) in enumerate(
+                pool.imap(task, file_list)):
+            check_cancelled()
+            for atable_name, tbl_df in tables.items():
+                _accessTables[atable_name].append_rows(tbl_df)
+            _seed_collector.extend(seed_lists)
+            if stats:
+                run_stats.merge(stats)
+            file_stops.append(table_lengths(_accessTables))
+            # Files finish in order, so a file's time is since the last one.
+            report_file_done(index, file_list, nrows,
+                             time.perf_counter()-start)
+            start = time.perf_counter()
+    return file_stops
+
+def process_and_export(file_list, sensors_list, args, cache=None,
+                       manifest=None, hold=None):
+    """
+    Process the data files in ``file_list`` and export their rows to the
+    Access tables, as set by the command-line ``args``. With a
+    ``RunManifest`` only new or changed files are processed and the
+    manifest is saved. Result tables are reset first, so a watch can run it
+    again.
+
+    Parameters
+    ----------
+    file_list : list
+    sensors_list : list
+    args : argparse.Namespace
+    cache : FileFrameCache (default: None)
+    manifest : RunManifest (default: None)
+    hold : list (default: None)
+        Files left out of ``file_list`` that the manifest keeps as recorded,
+        see ``RunManifest.plan``.
+
+    Returns
+    -------
+    list : files processed.
+
+    Raises
+    ------
+    RunCancelled : if cancelled before the tables are exported, see
+        ``set_progress``.
+    """
+    global _accessTables, _seed_collector
+    _accessTables = new_access_tables()
+    _seed_collector = []
+    retract, restore = None, None
+    standard = standard_values_stats(args)
+    reference = static_reference(args)
+    if manifest is not None:
+        nfiles = len(file_list)
+        file_list, retract, restore = manifest.plan(file_list, hold)
+        print('Incremental run: {} of {} data files new or changed.'
+              .format(len(file_list), nfiles))
+
+    # Main loop on data folder.
+    report_progress('start', files=len(file_list))
+    if args.workers > 1 and len(file_list) > 1:
+        file_stops = process_files_in_pool(file_list, sensors_list,
+                                           min(args.workers, len(file_list)),
+                                           args.chunk_rows, cache)
+    else:
+        file_stops = []
+        for index, ifile in enumerate(file_list):
+            check_cancelled()
+            report_progress('file', index=index, files=len(file_list),
+                            name=os.path.basename(ifile))
+            start = time.perf_counter()
+            print('File: {}'.format(os.path.basename(ifile)))
+            nrows = process_file_in_folder(ifile, sensors_list,
+                                           args.chunk_rows, cache)
+            file_stops.append(table_lengths(_accessTables))
+            report_file_done(index, file_list, nrows,
+                             time.perf_counter()-start)
+    report_progress('export', tables=len(_accessTables))
+    static_repeatability_table(reference)
+    tables, drop = standard_values_tables(standard, retract, restore)
+    if args.sqlite is not None:
+        export_sqlite_tables(tables, args.sqlite)
+    else:
+        export_access_tables(tables, args.append_only, retract, restore,
+                             drop)
+    standard.save()
+    reference.save()
+    if manifest is not None:
+        manifest.record(file_list, file_stops, _accessTables)
+        manifest.save()
+
+    if manifest is not None and not file_list:
+        print('No new or changed data files.')
+    elif not _seed_collector:
+        print('No seed items found in data provided.')
+    report_progress('done', files=len(file_list))
+    return file_list
+
+def watch_data_folder(sensors_list, args, cache=None, manifest=None):
+    """
+    Process the data folder, then again each time csv files in it are added,
+    changed or removed, until interrupted. Only new or changed files are
+    processed, see ``RunManifest``. The json config, seed table, manifest,
+    cache and append-only table indexes stay loaded between runs.
+
+    Parameters
+    ----------
+    sensors_list : list
+    args : argparse.Namespace
+    cache : FileFrameCache (default: None)
+    manifest : RunManifest
+    """
+    watcher = FolderWatcher(_jGUI.DataFolder, '**/*.csv', args.poll_interval,
+                            args.settle)
+    process_and_export(collect_files_in_directory(), sensors_list, args,
+                       cache, manifest)
+    print('\nWatching {} for csv files. Press Ctrl+C to stop.'
+          .format(watcher))
+    try:
+        for ready, removed in watcher.changes():
+            print('\nChanged files: {} Removed files: {}'.format(
+                    [os.path.basename(f) for f in ready],
+                    [os.path.basename(f) for f in removed]))
+            # Files still being written wait for a later run, keeping the
+            # rows exported from them so far.
+            file_list = [f for f in collect_files_in_directory()
+                         if f not in watcher.pending]
+            process_and_export(file_list, sensors_list, args, cache, manifest,
+                               hold=list(watcher.pending))
+    except KeyboardInterrupt:
+        print('\nWatch stopped.')
+    finally:
+        watcher.close()
+    return
+
 
-def validate_json_fields():
-    """Checks ``IvsID`` and ``SurveyType`` fields in the json file."""
+def validate_json_fields(json_dict):
+    """Checks ``IvsID``, ``SurveyType`` and ``ResponseChannel`` fields in the
+    parsed json ``json_dict``, before the seed file is read."""
+    json_gui = json_dict.GUI
     # Check ivs test string identifier was populated.
-    if _jGUI.IvsID == "":
+    if json_gui.IvsID == "":
         print('IVS String Identifier was not defined.')
         sys.exit(2)
     # Check SingleCoilSensorID is populated for single-coil and mixed surveys.
-    if _jGUI.SurveyType != 'Towed Array' and not _jGUI.SingleCoilSensorID:
+    if json_gui.SurveyType != 'Towed Array' and \
+            not json_gui.SingleCoilSensorID:
         print('Sensor ID entries required for single-coil or mixed data.')
         sys.exit(2)
+    # Check at least one response channel was selected.
+    if not response_channels(json_gui.ResponseChannel):
+        print('Response Channel was not defined.')
+        sys.exit(2)
+    return
+
+def response_channels(entry):
+    """Response channels from the json ``ResponseChannel`` entry, a single
+    channel such as 'Ch1', a comma separated string or a list."""
+    if isinstance(entry, str):
+        entry = entry.split(',')
+    return [ch.strip() for ch in entry if ch.strip()]
+
+def run_sensor_ids():
+    """Sensor ids to process, from the survey type and the single coil sensor
+    id entry."""
+    sensor_id_list = []
+    if _jGUI.SingleCoilSensorID != "":
+        sensor_id_list = [i.strip() for i in
+                          _jGUI.SingleCoilSensorID.split(",")]
+    if 'Single' not in _jGUI.SurveyType:
+        sensor_id_list.extend(_towed_array_ids)
+    return sensor_id_list
+
+def configure_run(json_dict, seed_df):
+    """Set the module globals used by the processing functions from the
+    parsed json ``json_dict`` and the seed table ``seed_df``. Also the pool
+    initializer, so workers reuse the parent's parsed inputs."""
+    global _jsonDict, _jGUI, _jAccess, _jAccessIVS, _csvSeedDF
+    global LANE_WIDTH, MASK_RADIUS, _seedIndex, _accessTables
+    global _linePatterns, _lineMetadata, _responseChannels, _jAccessQC
+    _jsonDict = json_dict
+    _csvSeedDF = seed_df
+
+    # Shorten the names of more frequently used json fields.
+    _jGUI = _jsonDict.GUI
+    _jAccess = _jsonDict.AccessDatabase
+    _jAccessIVS = _jsonDict.AccessDatabase.IVSDailyResultsTable
+    _jAccessQC = getattr(_jAccess, 'BackgroundQCTable', None) or \
+        JsonDict(dict(_background_qc_table))
+    _responseChannels = response_channels(_jGUI.ResponseChannel)
+
+    # Import positioning params.
+    LANE_WIDTH = float(_jGUI.LaneWidthMask)
+    MASK_RADIUS = float(_jGUI.SeedRadiusMask)
+    if _jGUI.PositioningUnits == 'Feet':
+        LANE_WIDTH *= 3.28  # convert meters to feet
+        MASK_RADIUS *= 3.28  # convert meters to feet
+    # Spatial index of the seed items, queried once per sensor track.
+    _seedIndex = PointGridIndex(_csvSeedDF.TrueX.values,
+                                _csvSeedDF.TrueY.values, LANE_WIDTH/2)
+    # Line name conventions, parsed once per distinct line name.
+    _linePatterns = line_name_patterns(_jGUI.IvsID)
+    _lineMetadata = {}
+    # Result rows for the Access tables, exported once after the main loop.
+    _accessTables = new_access_tables()
     return
 
+def load_project_json(json_path):
+    """Parsed project json at ``json_path``. The parsed json is reused while
+    the file is unchanged."""
+    global _warmJson
+    key = file_signature(json_path)
+    if _warmJson is None or _warmJson[0] != key:
+        _warmJson = (key, json_config(jfile=json_path, jobj_hook=JsonDict))
+    return _warmJson[1]
+
+def configure_project(json_dict):
+    """``configure_run`` with the parsed json ``json_dict`` and its seed
+    table, unless neither changed since the last call. Returns True if the
+    run was configured again."""
+    global _warmProject
+    key = file_signature(json_dict.GUI.SeedFile)
+    if _warmProject is not None and _warmProject[0] is json_dict and \
+            _warmProject[1] == key:
+        return False
+    configure_run(json_dict, import_seed_data_csv(json_dict.GUI.SeedFile))
+    _warmProject = (json_dict, key)
+    return True
+
+def survey_cache(args):
+    """Cache of parsed data files for the command-line ``args``, or None.
+    The cache of the same arguments is reused between runs."""
+    key = (args.cache_dir, args.cache_max_mb, args.cache_hash,
+           args.memory_cache_mb)
+    if key not in _surveyCaches:
+        cache = None
+        if args.cache_dir:
+            cache = FileFrameCache(args.cache_dir,
+                                   int(args.cache_max_mb*2**20),
+                                   args.cache_hash)
+        if args.memory_cache_mb > 0:
+            cache = MemoryFrameCache(int(args.memory_cache_mb*2**20), cache)
+        _surveyCaches[key] = cache
+    return _surveyCaches[key]
+
+def parse_arguments(argv=None):
+    """Command-line arguments for the module."""
+    parser = argparse.ArgumentParser(
+            description='Desert Mirage IVS processing for EM61-MK2 data.')
+    parser.add_argument('json', nargs='?', default=None,
+                        help='Project json path (default: '
+                             'desert_mirage_config.json in the cwd).')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes for the data folder files '
+                             '(default: 1).')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='Rows read per chunk while streaming a data file '
+                             '(default: {}).'.format(CHUNK_ROWS))
+    parser.add_argument('--append-only', action='store_true',
+                        help='Append new unique rows to existing tables using '
+                             'a key index instead of rewriting them.')
+    parser.add_argument('--sqlite', nargs='?', const='', default=None,
+                        metavar='PATH',
+                        help='Write the tables to a SQLite database instead '
+                             'of csv files (default path: AccessTables/'
+                             '<AccessDatabaseName>.sqlite).')
+    parser.add_argument('--cache-dir', default=None, metavar='PATH',
+                        help='Cache parsed data files in PATH and load '
+                             'unchanged files from it on later runs.')
+    parser.add_argument('--cache-max-mb', type=float, default=1024.,
+                        help='Size cap of the cache folder in MB, least '
+                             'recently used files are removed (default: '
+                             '1024).')
+    parser.add_argument('--cache-hash', action='store_true',
+                        help='Also key cached files by an md5 of their '
+                             'content, not just size and mtime.')
+    parser.add_argument('--memory-cache-mb', type=float, default=0.,
+                        help='Keep up to this many MB of parsed data files '
+                             'in memory for later runs in the same process, '
+                             'e.g. the worker service (default: 0).')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Process only data files that are new or changed '
+                             'since the last incremental run, replacing the '
+                             'rows of changed files (csv tables only).')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and process new or changed csv '
+                             'files in the data folder as they arrive '
+                             '(implies --incremental).')
+    parser.add_argument('--poll-interval', type=float, default=1.,
+                        help='Seconds between data folder checks with '
+                             '--watch (default: 1).')
+    parser.add_argument('--settle', type=float, default=2.,
+                        help='Seconds a file must be unchanged before --watch '
+                             'processes it (default: 2).')
+    parser.add_argument('--report', default=None, metavar='PATH',
+                        help='Time the processing stages and write a json '
+                             'run report with timers and counters to PATH.')
+    parser.add_argument('--profile', default=None, metavar='PATH',
+                        help='Profile the whole run with cProfile and dump '
+                             'the stats to PATH (main process only).')
+    parser.add_argument('--check', action='store_true',
+                        help='Validate the json and list the data files, '
+                             'then exit without reading any data.')
+    parser.add_argument('--events', action='store_true',
+                        help='Write output and progress as json lines and '
+                             'cancel between files on a "cancel" line on '
+                             'stdin, for the Tk GUI.')
+    args = parser.parse_args(argv)
+    if (args.incremental or args.watch) and args.sqlite is not None:
+        parser.error('--incremental and --watch are not supported with '
+                     '--sqlite.')
+    return args
+
 # Define internal global parameters.
 _dir_path = os.path.dirname(os.path.realpath(__file__))
 # Access tables output to 'AccessTables' folder in parent directory.
@@ -539,55 +2590,139 @@ _access_folder = os.path.dirname(_dir_path)
 _seed_columns = ['Test_Item_ID', 'TrueX', 'TrueY']
 # Geonics Multi61 software output for towed array sensor coils ids.
 _towed_array_ids = ['01', '02', '03']
+# Default rows per chunk when streaming data files.
+CHUNK_ROWS = 100000
+# Static test json ids and their 'DatasetType' in 'Static_Repeatability'.
+STATIC_DATASETS = [('StaticID1', 'Static'), ('StaticID2', 'Static Response'),
+                   ('StaticID3', 'Static Recovery')]
+# Static spike detection and trimming in multiples of the line noise, and
+# the largest percent difference of a passing static response.
+STATIC_SPIKE_SIGMA = 10.
+STATIC_TRIM_SIGMA = 3.
+STATIC_RESPONSE_TOLERANCE = 20.
+# Background and cable shake json ids and their 'DatasetType' in
+# 'Background_QC', and the spike distance in channel standard deviations.
+STREAM_DATASETS = [('BackgroundID', 'Background'),
+                   ('CableShakeID', 'Cable Shake')]
+STREAM_SPIKE_SIGMA = 6.
+# 'Background_QC' table for project json files without one.
+_background_qc_table = {
+    'Columns': ['OID', 'Filename', 'DatasetType', 'Date', 'AM_PM',
+                'Sensor_ID', 'Channel', 'Samples', 'Mean', 'Variance',
+                'StdDev', 'Min', 'Max', 'P05', 'P50', 'P95', 'Spike_Count',
+                'QCStatus', 'Comment'],
+    'TName': 'Background_QC.csv'}
+# Samples per window of the line noise estimate.
+NOISE_WINDOW_ROWS = 20
+# Key columns of the standard values, and their halfwidth in sample
+# standard deviations of the daily results.
+STANDARD_KEY_COLS = ['Test_Item_ID', 'Sensor_ID', 'Primary_Analysis_Channel']
+STANDARD_HALFWIDTH_SIGMA = 2.
 
 # Default json file name (implied path is os.cwd()).
-_json_path = os.path.abspath("desert_mirage_config.json")
+_json_file = "desert_mirage_config.json"
 
 _seed_collector = []
+# Append-only table indexes by table name, kept between watch runs.
+_tableIndexes = {}
+# Progress callback and cancel check of the run, see ``set_progress``.
+_progress = None
+_cancelled = None
+# Inputs and caches kept between runs in one process, see ``main``.
+_warmJson = None
+_warmProject = None
+_surveyCaches = {}
+
+def main(argv=None):
+    """
+    Command-line run of the module with arguments ``argv`` (default:
+    ``sys.argv[1:]``). Parsed inputs and caches are kept in the module
+    between calls in one process, see ``load_project_json``,
+    ``configure_project`` and ``survey_cache``.
 
-if __name__ == "__main__":
+    Returns
+    -------
+    int : exit code, 3 if the run was cancelled.
+    """
+    args = parse_arguments(argv)
+    if args.events:
+        events = EventStream(sys.stdout, sys.stdin)
+        sys.stdout = events
+        # Pool workers close sys.stdin when they start, which would wait on
+        # the buffer lock held by the thread reading commands from it.
+        sys.stdin = open(os.devnull)
+        set_progress(events.emit, events.cancel.is_set)
     print('----Desert Mirage Begin----\n')
-    print('Arguments: ', [i for i in sys.argv])
-    if len(sys.argv) > 1:
-        _json_path = os.path.abspath(sys.argv[1])
-        print("json file path: {}".format(_json_path))
+    print('Arguments: ', sys.argv if argv is None else list(argv))
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    run_stats.reset()
+    run_stats.enable(args.report is not None)
+    run_start = (time.time(), time.perf_counter(), time.process_time())
+    json_path = os.path.abspath(args.json or _json_file)
+    if args.json:
+        print("json file path: {}".format(json_path))
 
     # Create dictionary-like object from json.
-    _jsonDict = json_config(jfile=_json_path, jobj_hook=JsonDict)
+    json_dict = load_project_json(json_path)
+    validate_json_fields(json_dict)
+    if args.check:
+        # Neither numpy nor pandas is loaded up to here.
+        collect_files_in_directory(dfolder=json_dict.GUI.DataFolder,
+                                   fpattern='**/*.csv')
+        print('json fields valid.')
+        return 0
+    set_display_options()
     # Create dataframe of seed csv file.
-    _csvSeedDF = import_seed_data_csv(_jsonDict.GUI.SeedFile)
-
-    # Shorten the names of more frequently used json fields.
-    _jGUI = _jsonDict.GUI
-    _jAccess = _jsonDict.AccessDatabase
-    _jAccessIVS = _jsonDict.AccessDatabase.IVSDailyResultsTable
-    validate_json_fields()
+    configure_project(json_dict)
 
-    # Import positioning params.
-    LANE_WIDTH = float(_jGUI.LaneWidthMask)
-    MASK_RADIUS = float(_jGUI.SeedRadiusMask)
-    if _jGUI.PositioningUnits == 'Feet':
-        LANE_WIDTH *= 3.28  # convert meters to feet
-        MASK_RADIUS *= 3.28  # convert meters to feet
-
-    # Collect sensor ids using survey type and single coil sensor id entry.
-    sensor_id_list = []
-    if _jGUI.SingleCoilSensorID != "":
-        sensor_id_list = [i.strip() for i in
-                          _jGUI.SingleCoilSensorID.split(",")]
-    if 'Single' not in _jGUI.SurveyType:
-        sensor_id_list.extend(_towed_array_ids)
+    sensor_id_list = run_sensor_ids()
     print('Sensor ID List: ', sensor_id_list)
 
-    # Collect IVS data files to process.
-    _fileList = collect_files_in_directory(dfolder=_jGUI.DataFolder,
-                                           fpattern='**/*.csv')
-
-    # Main loop on data folder.
-    for _ in _fileList:
-        print('File: {}'.format(os.path.basename(_)))
-        process_file_in_folder(_, sensor_id_list)
-
-    if not _seed_collector:
-        print('No seed items found in data provided.')
+    # Cache of parsed data files.
+    cache = survey_cache(args)
+
+    # Skip data files already exported with the same config and seeds.
+    manifest = None
+    if args.incremental or args.watch:
+        manifest = RunManifest(
+                access_table_dir(),
+                hashlib.md5(json.dumps(_jsonDict, default=vars,
+                                       sort_keys=True).encode()).hexdigest(),
+                file_md5(_jGUI.SeedFile))
+
+    try:
+        if args.watch:
+            watch_data_folder(sensor_id_list, args, cache, manifest)
+        else:
+            # Collect IVS data files to process.
+            file_list = collect_files_in_directory(dfolder=_jGUI.DataFolder,
+                                                   fpattern='**/*.csv')
+            process_and_export(file_list, sensor_id_list, args, cache,
+                               manifest)
+    except RunCancelled:
+        print('Run cancelled, no tables were written.')
+        report_progress('cancelled')
+        return 3
+
+    if args.report:
+        run_stats.write_report(
+                args.report, argv=sys.argv if argv is None else list(argv),
+                json=json_path,
+                start=time.strftime('%Y-%m-%dT%H:%M:%S',
+                                    time.localtime(run_start[0])),
+                wall_s=time.perf_counter()-run_start[1],
+                cpu_s=time.process_time()-run_start[2],
+                workers=args.workers)
+        print('Run report: {}'.format(args.report))
+    if args.profile:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print('Profile stats: {}'.format(args.profile))
     print('\n----Desert Mirage End----')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
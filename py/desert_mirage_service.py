@@ -0,0 +1,592 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+desert_mirage_service.py:
+Long-lived worker for repeated runs of desert_mirage_main.py. Between runs
+the service keeps numpy and pandas imported, the parsed json and seed table,
+the survey caches and the append-only table indexes. It takes JSON-RPC 2.0
+requests, one json object per line, on a localhost socket or on
+stdin/stdout.
+
+As a thin client it takes the arguments of desert_mirage_main.py, starts the
+service if none is running, streams the run output and exits with the exit
+code of the run:
+    python desert_mirage_service.py config.json [--workers 3 ...]
+
+Methods: 'run' (params 'argv', 'cwd'), 'cancel', 'status' and 'shutdown'.
+Output and progress of a run are sent as 'event' notifications whose params
+are the events of ``set_progress`` in desert_mirage_main.py. Requests on the
+socket carry the 'token' of the service file in their params.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import contextlib
+import itertools
+import secrets
+import signal
+import socket
+import socketserver
+import subprocess
+import threading
+import traceback
+
+# Service file with the port, pid and token of the running service.
+SERVICE_DIR = os.path.join(os.path.expanduser('~'), '.desert_mirage')
+SERVICE_FILE = os.path.join(SERVICE_DIR, 'service.json')
+SERVICE_LOG = os.path.join(SERVICE_DIR, 'service.log')
+# Seconds without requests before the service exits, and MB of parsed data
+# files kept in memory between runs (``--memory-cache-mb`` of the runs).
+IDLE_TIMEOUT = 1800.
+MEMORY_CACHE_MB = 512.
+# Seconds the client waits for a new service to start.
+START_TIMEOUT = 30.
+# Arguments of desert_mirage_main.py the service does not take.
+_unsupported_args = ['--watch', '--events']
+# Sources of the service, a running service is stale once one changes.
+_dir_path = os.path.dirname(os.path.realpath(__file__))
+_sources = ['desert_mirage_service.py', 'desert_mirage_main.py',
+            'desert_mirage_lib.py', 'desert_mirage_base.py']
+
+class ServiceError(Exception):
+    """JSON-RPC error response of the service, with its ``code``."""
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+def source_signature():
+    """Size and mtime of the service sources, see ``_sources``."""
+    signature = []
+    for name in _sources:
+        stat = os.stat(os.path.join(_dir_path, name))
+        signature.append([name, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+def read_service_file():
+    """Contents of ``SERVICE_FILE``, or None without a readable one."""
+    try:
+        with open(SERVICE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_service_file(info):
+    """Write ``info`` to ``SERVICE_FILE``, readable by the user only."""
+    os.makedirs(SERVICE_DIR, mode=0o700, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(SERVICE_FILE, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(info, f)
+    os.replace(tmp, SERVICE_FILE)
+    return
+
+def remove_service_file(pid):
+    """Remove ``SERVICE_FILE`` if it is the one of process ``pid``."""
+    info = read_service_file()
+    if info is not None and info.get('pid') == pid:
+        with contextlib.suppress(OSError):
+            os.remove(SERVICE_FILE)
+    return
+
+# Service
+class RunService(object):
+    """
+    Runs of desert_mirage_main.py in this process, one at a time, for the
+    connections of the service. Runs share the module state of
+    desert_mirage_main, so its parsed inputs and caches stay warm.
+
+    Parameters
+    ----------
+    memory_cache_mb : float (default: MEMORY_CACHE_MB)
+    token : str (default: None)
+        Token every request must carry, None for stdin/stdout.
+    """
+    def __init__(self, memory_cache_mb=MEMORY_CACHE_MB, token=None):
+        import desert_mirage_main
+        self.dm = desert_mirage_main
+        self.memory_cache_mb = memory_cache_mb
+        self.token = token
+        self.started = time.time()
+        self.last_active = time.time()
+        self.runs = 0
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        # Import numpy and pandas now rather than in the first run.
+        self.dm.set_display_options()
+
+    def __repr__(self):
+        return "<RunService: pid %d, %d runs%s>"%(
+            os.getpid(), self.runs, ', running' if self.running() else '')
+
+    def running(self):
+        return self._lock.locked()
+
+    def wait(self):
+        """Wait for the active run, if any, to finish."""
+        with self._lock:
+            return
+
+    def idle(self):
+        """Seconds since the last request or run, 0 during a run."""
+        return 0. if self.running() else time.time()-self.last_active
+
+    def status(self):
+        warm_json = self.dm._warmJson
+        return {'pid': os.getpid(), 'python': sys.executable,
+                'uptime_s': round(time.time()-self.started, 1),
+                'runs': self.runs, 'running': self.running(),
+                'json': warm_json[0][0] if warm_json else None,
+                'caches': [repr(cache) for cache in
+                           self.dm._surveyCaches.values() if cache]}
+
+    def run(self, argv, cwd, events):
+        """
+        Run desert_mirage_main.py with arguments ``argv`` in folder ``cwd``,
+        waiting for the run of another connection to finish. Output and
+        progress go to EventStream ``events``, and setting its ``cancel``
+        stops the run between files.
+
+        Returns
+        -------
+        int : exit code of the run.
+
+        Raises
+        ------
+        ValueError : if ``argv`` has an argument the service does not take.
+        """
+        unsupported = [arg for arg in argv if arg in _unsupported_args]
+        if unsupported:
+            raise ValueError('Not supported by the service: {}.'.format(
+                    ', '.join(unsupported)))
+        argv = ['--memory-cache-mb', str(self.memory_cache_mb)]+list(argv)
+        if not self._lock.acquire(blocking=False):
+            events.emit('log', {'text': 'Waiting for another run to finish.'})
+            self._lock.acquire()
+        folder = os.getcwd()
+        try:
+            self.runs += 1
+            with contextlib.redirect_stdout(events):
+                self.dm.set_progress(events.emit, events.cancel.is_set)
+                try:
+                    os.chdir(cwd or folder)
+                    code = self.dm.main(argv)
+                except SystemExit as err:
+                    code = err.code
+                    if not isinstance(code, int):
+                        if code is not None:
+                            print(code)
+                        code = 0 if code is None else 1
+                except Exception:
+                    print(traceback.format_exc())
+                    code = 1
+                finally:
+                    self.dm.set_progress()
+                    os.chdir(folder)
+        finally:
+            self.last_active = time.time()
+            self._lock.release()
+        return code
+
+class ServiceConnection(object):
+    """
+    JSON-RPC 2.0 on the text file pair ``rfile`` and ``wfile``, one json
+    object per line, for ``service``. A connection runs one request at a
+    time. Its run is cancelled when the connection closes.
+
+    Parameters
+    ----------
+    service : RunService
+    rfile : file
+    wfile : file
+    """
+    def __init__(self, service, rfile, wfile):
+        self.service = service
+        self.rfile = rfile
+        self.wfile = wfile
+        self.events = None  # EventStream of the active run.
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ServiceConnection: %s%s>"%(
+            self.service, ', run active' if self.active() else '')
+
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def send(self, message):
+        with self._lock:
+            try:
+                self.wfile.write(json.dumps(message, default=str)+'\n')
+                self.wfile.flush()
+            except (OSError, ValueError):
+                pass  # Client gone, the run is cancelled on EOF.
+        return
+
+    def respond(self, request_id, result=None, code=None, message=None):
+        if code is None:
+            self.send({'jsonrpc': '2.0', 'id': request_id, 'result': result})
+        else:
+            self.send({'jsonrpc': '2.0', 'id': request_id,
+                       'error': {'code': code, 'message': message}})
+        return
+
+    def serve(self):
+        """Handle requests until end of file or 'shutdown', then wait for the
+        active run, cancelled."""
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.respond(None, code=-32700, message='Parse error.')
+                continue
+            self.handle(request)
+            if self.service.stop.is_set():
+                break
+        if self.active():
+            self.events.cancel.set()
+            self._thread.join()
+        return
+
+    def handle(self, request):
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' \
+                or not isinstance(request.get('method'), str):
+            self.respond(None, code=-32600, message='Invalid request.')
+            return
+        self.service.last_active = time.time()
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            self.respond(request_id, code=-32602, message='Invalid params.')
+        elif self.service.token is not None and \
+                params.get('token') != self.service.token:
+            self.respond(request_id, code=-32001, message='Invalid token.')
+        elif method == 'run':
+            self.start_run(request_id, params)
+        elif method == 'cancel':
+            cancelled = self.active()
+            if cancelled:
+                self.events.cancel.set()
+            self.respond(request_id, {'cancelled': cancelled})
+        elif method == 'status':
+            self.respond(request_id, self.service.status())
+        elif method == 'shutdown':
+            self.service.stop.set()
+            self.respond(request_id, {})
+        else:
+            self.respond(request_id, code=-32601,
+                         message='Method not found: {}.'.format(method))
+        return
+
+    def start_run(self, request_id, params):
+        argv = params.get('argv', [])
+        if not isinstance(argv, list) or \
+                not all(isinstance(arg, str) for arg in argv):
+            self.respond(request_id, code=-32602,
+                         message="'argv' must be a list of strings.")
+            return
+        if self.active():
+            self.respond(request_id, code=-32002,
+                         message='A run is already active on this '
+                                 'connection.')
+            return
+        self.events = self.service.dm.EventStream(
+                None, send=lambda record: self.send(
+                        {'jsonrpc': '2.0', 'method': 'event',
+                         'params': record}))
+        self._thread = threading.Thread(
+                target=self.run, args=(request_id, argv, params.get('cwd'),
+                                       self.events),
+                daemon=True)
+        self._thread.start()
+        return
+
+    def run(self, request_id, argv, cwd, events):
+        start = time.perf_counter()
+        try:
+            code = self.service.run(argv, cwd, events)
+        except (ValueError, OSError) as err:
+            self.respond(request_id, code=-32602, message=str(err))
+            return
+        self.respond(request_id, {'exit_code': code, 'seconds': round(
+                time.perf_counter()-start, 3)})
+        return
+
+class ServiceRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        rfile = self.request.makefile('r', encoding='utf-8')
+        wfile = self.request.makefile('w', encoding='utf-8')
+        ServiceConnection(self.server.service, rfile, wfile).serve()
+        return
+
+class ServiceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+def serve_socket(port=0, idle_timeout=IDLE_TIMEOUT,
+                 memory_cache_mb=MEMORY_CACHE_MB):
+    """
+    Serve on localhost ``port`` (default: any free port) until 'shutdown',
+    Ctrl+C or ``idle_timeout`` seconds without requests. The port, pid and a
+    new token are written to ``SERVICE_FILE`` for clients.
+    """
+    service = RunService(memory_cache_mb, secrets.token_hex(16))
+    server = ServiceServer(('127.0.0.1', port), ServiceRequestHandler)
+    server.service = service
+    write_service_file({'port': server.server_address[1],
+                        'pid': os.getpid(), 'token': service.token,
+                        'python': sys.executable,
+                        'sources': source_signature()})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print('Serving {} on 127.0.0.1:{}'.format(service,
+                                              server.server_address[1]))
+    sys.stdout.flush()
+    try:
+        while not service.stop.wait(1.):
+            if service.idle() > idle_timeout:
+                print('Idle for {:.0f} s, stopping.'.format(idle_timeout))
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remove_service_file(os.getpid())
+        server.shutdown()
+        service.wait()
+        server.server_close()
+    return
+
+def serve_stdio(memory_cache_mb=MEMORY_CACHE_MB):
+    """Serve one connection on stdin/stdout until end of file or
+    'shutdown'. Stray output goes to stderr."""
+    rfile, wfile = sys.stdin, sys.stdout
+    sys.stdout = sys.stderr
+    # Pool workers close sys.stdin when they start, see ``main`` in
+    # desert_mirage_main.py.
+    sys.stdin = open(os.devnull)
+    ServiceConnection(RunService(memory_cache_mb), rfile, wfile).serve()
+    return
+
+# Client
+class ServiceClient(object):
+    """
+    JSON-RPC client of the service in ``info``, the contents of the service
+    file.
+
+    Parameters
+    ----------
+    info : dict
+    timeout : float (default: 5.)
+        Seconds to connect.
+    """
+    def __init__(self, info, timeout=5.):
+        self.info = info
+        self.sock = socket.create_connection(('127.0.0.1', info['port']),
+                                             timeout)
+        self.sock.settimeout(None)
+        self.rfile = self.sock.makefile('r', encoding='utf-8')
+        self.wfile = self.sock.makefile('w', encoding='utf-8')
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ServiceClient: 127.0.0.1:%d, pid %d>"%(self.info['port'],
+                                                        self.info['pid'])
+
+    def send(self, method, params=None):
+        """Send request ``method`` and return its id."""
+        params = dict(params or {}, token=self.info['token'])
+        with self._lock:
+            request_id = next(self._ids)
+            self.wfile.write(json.dumps({'jsonrpc': '2.0', 'id': request_id,
+                                         'method': method,
+                                         'params': params})+'\n')
+            self.wfile.flush()
+        return request_id
+
+    def call(self, method, params=None, notify=None):
+        """
+        Result of request ``method``. Notifications received meanwhile are
+        passed to ``notify(method, params)``.
+
+        Raises
+        ------
+        ServiceError : on an error response or if the connection closes.
+        """
+        request_id = self.send(method, params)
+        for line in self.rfile:
+            message = json.loads(line)
+            if message.get('id') == request_id and 'method' not in message:
+                if 'error' in message:
+                    raise ServiceError(message['error'].get('code'),
+                                       message['error'].get('message'))
+                return message.get('result')
+            if 'method' in message and notify is not None:
+                notify(message['method'], message.get('params') or {})
+        raise ServiceError(-32000, 'The service closed the connection.')
+
+    def close(self):
+        self.sock.close()
+        return
+
+def start_service(idle_timeout=IDLE_TIMEOUT, memory_cache_mb=MEMORY_CACHE_MB):
+    """Start a detached service process, logging to ``SERVICE_LOG``."""
+    os.makedirs(SERVICE_DIR, mode=0o700, exist_ok=True)
+    kwargs = {'start_new_session': True}
+    if os.name == 'nt':
+        kwargs = {'creationflags': subprocess.DETACHED_PROCESS |
+                  subprocess.CREATE_NEW_PROCESS_GROUP}
+    with open(SERVICE_LOG, 'a') as log:
+        return subprocess.Popen(
+                [sys.executable, os.path.realpath(__file__), '--serve',
+                 '--idle-timeout', str(idle_timeout),
+                 '--service-cache-mb', str(memory_cache_mb)],
+                stdin=subprocess.DEVNULL, stdout=log,
+                stderr=subprocess.STDOUT, cwd=_dir_path, **kwargs)
+
+def connect_service(start=True, idle_timeout=IDLE_TIMEOUT,
+                    memory_cache_mb=MEMORY_CACHE_MB):
+    """
+    Client of the running service. A service started before its sources
+    changed is stopped. With ``start``, a new service is started if none is
+    running.
+
+    Returns
+    -------
+    ServiceClient or None : None if no service could be reached.
+    """
+    info = read_service_file()
+    if info is not None:
+        try:
+            client = ServiceClient(info)
+        except OSError:
+            client = None
+        if client is not None and info.get('sources') == source_signature():
+            return client
+        if client is not None:
+            with contextlib.suppress(OSError, ServiceError):
+                client.call('shutdown')
+            client.close()
+    if not start:
+        return None
+    proc = start_service(idle_timeout, memory_cache_mb)
+    deadline = time.time()+START_TIMEOUT
+    while time.time() < deadline and proc.poll() is None:
+        info = read_service_file()
+        if info is not None and info.get('pid') == proc.pid:
+            with contextlib.suppress(OSError):
+                return ServiceClient(info)
+        time.sleep(.05)
+    print('The service did not start, see {}.'.format(SERVICE_LOG))
+    return None
+
+def run_client(argv, events=False, start=True, idle_timeout=IDLE_TIMEOUT,
+               memory_cache_mb=MEMORY_CACHE_MB):
+    """
+    Run desert_mirage_main.py with arguments ``argv`` in the service and
+    print its output, or write its events as json lines with ``events``,
+    like desert_mirage_main.py --events. Ctrl+C, or a 'cancel' line on stdin
+    with ``events``, cancels the run between files. Without a service the
+    module runs in a new process.
+
+    Returns
+    -------
+    int : exit code of the run.
+    """
+    client = connect_service(start, idle_timeout, memory_cache_mb)
+    if client is None:
+        return subprocess.call([sys.executable, os.path.join(
+                _dir_path, 'desert_mirage_main.py')]+list(argv)+(
+                ['--events'] if events else []))
+
+    def show(method, params):
+        if method != 'event':
+            return
+        if events:
+            sys.stdout.write(json.dumps(params)+'\n')
+            sys.stdout.flush()
+        elif params.get('event') == 'log':
+            print(params.get('text', ''), flush=True)
+
+    def cancel(*args):
+        with contextlib.suppress(OSError):
+            client.send('cancel')
+        # A second Ctrl+C stops the client.
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    def read_commands():
+        for line in sys.stdin:
+            if line.strip() == 'cancel':
+                cancel()
+
+    if events:
+        threading.Thread(target=read_commands, daemon=True).start()
+    signal.signal(signal.SIGINT, cancel)
+    try:
+        result = client.call('run', {'argv': list(argv), 'cwd': os.getcwd()},
+                             show)
+    except ServiceError as err:
+        print('Service error: {}'.format(err))
+        return 1
+    finally:
+        client.close()
+    return result['exit_code']
+
+def parse_arguments(argv=None):
+    """Arguments of the service and client. Other arguments are passed to
+    desert_mirage_main.py."""
+    parser = argparse.ArgumentParser(
+            allow_abbrev=False,
+            description='Desert Mirage worker service. Arguments other than '
+                        'these are run by desert_mirage_main.py in the '
+                        'service, which is started if needed.')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run the service in this process.')
+    parser.add_argument('--stdio', action='store_true',
+                        help='With --serve, take requests on stdin and '
+                             'answer on stdout instead of a socket.')
+    parser.add_argument('--port', type=int, default=0,
+                        help='Localhost port to serve on (default: any free '
+                             'port, written to {}).'.format(SERVICE_FILE))
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='Seconds without requests before the service '
+                             'stops (default: {:.0f}).'.format(IDLE_TIMEOUT))
+    parser.add_argument('--service-cache-mb', type=float,
+                        default=MEMORY_CACHE_MB,
+                        help='MB of parsed data files the service keeps in '
+                             'memory between runs (default: {:.0f}).'
+                             .format(MEMORY_CACHE_MB))
+    parser.add_argument('--no-start', action='store_true',
+                        help='Do not start a service, run in a new process '
+                             'if none is running.')
+    parser.add_argument('--events', action='store_true',
+                        help='Write the run output and progress as json '
+                             'lines, see desert_mirage_main.py --events.')
+    parser.add_argument('--status', action='store_true',
+                        help='Print the status of the running service.')
+    parser.add_argument('--stop', action='store_true',
+                        help='Stop the running service.')
+    return parser.parse_known_args(argv)
+
+
+if __name__ == '__main__':
+    _args, _runArgv = parse_arguments()
+    if _args.serve and _args.stdio:
+        serve_stdio(_args.service_cache_mb)
+    elif _args.serve:
+        serve_socket(_args.port, _args.idle_timeout, _args.service_cache_mb)
+    elif _args.status or _args.stop:
+        _client = connect_service(start=False)
+        if _client is None:
+            print('No service running.')
+            sys.exit(1)
+        print(json.dumps(_client.call('shutdown' if _args.stop else 'status'),
+                         indent=4))
+        _client.close()
+    else:
+        sys.exit(run_client(_runArgv, _args.events, not _args.no_start,
+                            _args.idle_timeout, _args.service_cache_mb))
@@ -8,7 +8,11 @@ Copyright (c) Jan 2017 Nicholas Valentour
 """
 
 from os import path, getcwd
-import desert_mirage_lib as dem
+import sys
+import subprocess
+import threading
+import queue
+import desert_mirage_base as dem
 from tkinter import *
 from tkinter import ttk, filedialog
 import json
@@ -119,7 +123,7 @@ def commit():
     global _commitpressed
     _commitpressed = True
     save_form_data()
-    _root.destroy()
+    close_gui()
 
 def save_form_data():
     """
@@ -162,6 +166,133 @@ def save_form_data():
         json.dump(data, f, sort_keys=True, indent=4)
     return
 
+def run_pipeline():
+    """
+    Runs desert_mirage_main.py on the selected project json in a worker
+    process, so the window stays responsive. The worker is the client of
+    the warm worker service, see desert_mirage_service.py. Its json lines
+    events are read on a thread into ``_events`` and shown by
+    ``poll_events``.
+    """
+    global _worker
+    if _worker is not None and _worker.poll() is None:
+        return
+    if not path.isfile(_jsonVar.get()):
+        log_line('Select a project json to run.')
+        return
+    _log.configure(state=NORMAL)
+    _log.delete('1.0', END)
+    _log.configure(state=DISABLED)
+    _progressBar.configure(value=0, maximum=1)
+    _statusVar.set('Starting...')
+    _rateVar.set('')
+    _worker = subprocess.Popen([sys.executable, '-u', _run_script,
+                                _jsonVar.get(), '--events'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               universal_newlines=True)
+    threading.Thread(target=read_worker_events, args=(_worker.stdout,),
+                     daemon=True).start()
+    _runButton.configure(state=DISABLED)
+    _cancelButton.configure(state=NORMAL)
+    _root.after(POLL_MS, poll_events)
+    return
+
+def read_worker_events(stream):
+    """Puts each json line of the worker ``stream`` in ``_events``, other
+    lines (tracebacks) as 'log' events, then an 'exit' event."""
+    for line in stream:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            event = {'event': 'log', 'text': line.rstrip('\n')}
+        _events.put(event)
+    _events.put({'event': 'exit'})
+    return
+
+def poll_events():
+    """Shows the worker events queued since the last poll, every
+    ``POLL_MS`` ms until the worker exits."""
+    while True:
+        try:
+            event = _events.get_nowait()
+        except queue.Empty:
+            break
+        if event['event'] == 'exit':
+            finish_run()
+            return
+        show_event(event)
+    _root.after(POLL_MS, poll_events)
+    return
+
+def show_event(event):
+    kind = event.get('event')
+    if kind == 'log':
+        log_line(event.get('text', ''))
+    elif kind == 'start':
+        _progressBar.configure(value=0, maximum=max(event['files'], 1))
+        _statusVar.set('{} data files to process.'.format(event['files']))
+    elif kind == 'file':
+        _statusVar.set('File {} of {}: {}'.format(
+                event['index']+1, event['files'], event['name']))
+    elif kind == 'sensor':
+        _statusVar.set('Sensor {}: {} seeds'.format(event['sensor'],
+                                                    len(event['seeds'])))
+    elif kind == 'file done':
+        _progressBar.configure(value=event['index']+1)
+        _rateVar.set('{}: {} rows, {} rows/s'.format(
+                event['name'], event['rows'], event['rows_per_s']))
+    elif kind == 'export':
+        _statusVar.set('Exporting tables...')
+    elif kind == 'done':
+        _statusVar.set('Done, {} data files processed.'.format(event['files']))
+    elif kind == 'cancelled':
+        _statusVar.set('Cancelled, no tables were written.')
+    return
+
+def finish_run():
+    global _worker
+    code = _worker.wait()
+    if code not in (0, 3):
+        _statusVar.set('Failed with exit code {}, see the log.'.format(code))
+    _worker = None
+    _runButton.configure(state=NORMAL)
+    _cancelButton.configure(state=DISABLED)
+    return
+
+def cancel_run():
+    """Asks the worker to stop before its next data file."""
+    if _worker is None or _worker.poll() is not None:
+        return
+    try:
+        _worker.stdin.write('cancel\n')
+        _worker.stdin.flush()
+    except OSError:
+        return
+    _cancelButton.configure(state=DISABLED)
+    _statusVar.set('Cancelling after the current file...')
+    return
+
+def log_line(text):
+    _log.configure(state=NORMAL)
+    _log.insert(END, text+'\n')
+    # Keep the last LOG_MAX_LINES lines.
+    extra = int(_log.index('end-1c').split('.')[0])-LOG_MAX_LINES
+    if extra > 0:
+        _log.delete('1.0', '{}.0'.format(extra+1))
+    _log.configure(state=DISABLED)
+    _log.see(END)
+    return
+
+def close_gui():
+    """Stops a running worker, which writes no tables, and closes."""
+    if _worker is not None and _worker.poll() is None:
+        _worker.terminate()
+    _root.destroy()
+    return
+
 def run_gui(trig=False):
     if not trig:
         return False
@@ -181,12 +312,20 @@ _abt_bg2b = '#005000' # dark green
 _fg1 = 'black'
 _frame_bg1 = '#f8f1e7'  # Cream
 _frame_bg2 = '#f8f1e7'  # Cream
+# Pipeline run in a worker process, and its events for the Tk loop.
+_run_script = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                        'desert_mirage_service.py')
+_worker = None
+_events = queue.Queue()
+POLL_MS = 100
+LOG_MAX_LINES = 5000
 
 # Setup _root frame.
 _root = Tk()
 _root.title("Desert Mirage v0.0.1")
 _root.configure(background='#170a00')
 _root.resizable(width=False, height=False)
+_root.protocol('WM_DELETE_WINDOW', close_gui)
 
 # Setup top frame.
 _frame1 = ttk.Frame(_root, padding="10", relief='sunken')
@@ -403,6 +542,35 @@ ttk.Label(_frame2, textvariable=_tableFolderVar, style='Bot.TLabel') \
 for child in _frame2.winfo_children():
     child.grid_configure(padx=1, pady=1)
 
+# Run frame processes the selected project json and shows its progress.
+_row += 5
+_frame3 = ttk.Frame(_root, padding="4", relief='sunken', style='Bot.TFrame')
+_frame3.columnconfigure(2, weight=1)
+_frame3.grid(column=0, row=_row, sticky='news')
+_runButton = Button(_frame3, text='Run', command=run_pipeline,
+                    **_commit_bkwargs)
+_runButton.grid(column=0, row=0, sticky=EW)
+_cancelButton = Button(_frame3, text='Cancel', command=cancel_run,
+                       state=DISABLED, **_bkwargs)
+_cancelButton.grid(column=1, row=0, sticky=EW)
+_progressBar = ttk.Progressbar(_frame3, orient=HORIZONTAL, mode='determinate')
+_progressBar.grid(column=2, columnspan=2, row=0, sticky=EW)
+_statusVar = StringVar()
+_rateVar = StringVar()
+ttk.Label(_frame3, textvariable=_statusVar, style='Bot.TLabel') \
+    .grid(column=0, columnspan=3, row=1, sticky=W)
+ttk.Label(_frame3, textvariable=_rateVar, style='Bot.TLabel') \
+    .grid(column=2, columnspan=2, row=1, sticky=E)
+_log = Text(_frame3, height=10, width=80, state=DISABLED,
+            font=('Courier', 8))
+_log.grid(column=0, columnspan=3, row=2, sticky='news')
+_logScroll = ttk.Scrollbar(_frame3, orient=VERTICAL, command=_log.yview)
+_logScroll.grid(column=3, row=2, sticky=NS)
+_log['yscrollcommand'] = _logScroll.set
+
+for child in _frame3.winfo_children():
+    child.grid_configure(padx=1, pady=1)
+
 run_gui()
 
 if __name__ == '__main__':